@@ -1,22 +1,70 @@
+import argparse
+import asyncio
 import json
+import metrics
+import secrets
 import sys
+import webbrowser
+from collections import Counter
 from typing import Dict
 from colorama import init, Fore, Style
 from config import config
 from auth import TikTokAuth
+from oauth_callback import OAuthCallbackServer
+from token_store import TokenStore
+from session_store import SessionStore
 from tiktok_api import TikTokAPI
-from validators import AdValidator
-from prompts import PromptTemplates
-from nvidia_client import NVIDIAAIClient
+from retry import submission_scheduler
+from prompts import PromptTemplates, PromptBuilder
+from nvidia_client import NVIDIAAIClient, AsyncNVIDIAAIClient, TokenUsageTracker
+from engine import ConversationEngine
+from validators import AdValidator, COLLECTED_DATA_FIELDS
+from fast_path import FastPathParser, fallback_response
+from cache import LLMResponseCache
+from json_utils import JSONStringFieldScanner, parse_json_object
+
+metrics.histogram("llm_turn_seconds", "Time to produce an agent turn, by source")
+metrics.histogram("json_extract_seconds", "Time to recover the turn JSON from LLM output")
+LLM_FALLBACKS = metrics.counter("llm_fallbacks_total", "Turns answered by the rule-based fallback, by reason")
 
 init(autoreset=True)
 
+# Terminal colour for each engine message level
+LEVEL_COLORS = {
+    "info": Fore.CYAN,
+    "status": Fore.BLUE,
+    "success": Fore.GREEN,
+    "error": Fore.RED,
+    "warning": Fore.YELLOW,
+    "progress": Fore.MAGENTA,
+    "plain": "",
+}
+
 class TikTokAdAgent:
-    def __init__(self):
+    def __init__(self, client: NVIDIAAIClient = None, async_client: AsyncNVIDIAAIClient = None,
+                 response_cache: LLMResponseCache = None):
         # Initialize NVIDIA OpenAI client
-        self.client = NVIDIAAIClient()
-        self.auth = TikTokAuth()
+        self.client = client or NVIDIAAIClient()
+        # Async client is created lazily so the agent can be built outside an event loop
+        self.async_client = async_client
+        self.prompt_builder = PromptBuilder()
+        # Token usage for this agent's session; the clients also keep process-wide totals
+        self.token_usage = TokenUsageTracker()
+        # Guided decoding sends the shared turn schema with every LLM call
+        self.turn_schema = AdValidator.turn_schema() if config.LLM_GUIDED_JSON else None
+        # llm_turns / invalid_turns, to track the invalid-JSON rate
+        self.turn_stats = Counter()
+        self.fast_path = FastPathParser() if config.FAST_PATH_ENABLED else None
+        if response_cache is None and config.LLM_CACHE_ENABLED:
+            response_cache = LLMResponseCache()
+        self.response_cache = response_cache
+        self.auth = TikTokAuth(token_store=TokenStore() if config.TOKEN_STORE_ENABLED else None)
         self.api = None
+        # Checkpoints of the current conversation, opened by run()
+        self.session_store = None
+        self.session_id = None
+        self._session_state = None
+        self._streamed_text = ""
         print(Fore.CYAN + f"Using NVIDIA Model: {config.NVIDIA_MODEL}")
         
     def initialize_authentication(self):
@@ -25,20 +73,26 @@ class TikTokAdAgent:
         print(Fore.CYAN + "TikTok Ads Authentication")
         print(Fore.CYAN + "="*50)
         
-        print("\n1. Redirecting to TikTok for authentication...")
-        auth_url = self.auth.get_authorization_url()
-        print(f"   Auth URL: {auth_url}")
-        
-        print("\n2. Please enter the authorization code from the callback URL:")
-        print("   (Use 'valid_code' for success, 'invalid_client' for error, 'no_permission' for scope error)")
+        if self.auth.restore_session():
+            print(Fore.GREEN + "\n✓ Reusing saved TikTok session")
+            self.api = TikTokAPI(auth=self.auth)
+            return True
         
-        auth_code = input(Fore.YELLOW + "   Authorization code: " + Style.RESET_ALL).strip()
+        auth_code = self._capture_auth_code() if config.OAUTH_CALLBACK_ENABLED else None
+        if auth_code is None:
+            print("\n1. Redirecting to TikTok for authentication...")
+            print(f"   Auth URL: {self.auth.get_authorization_url()}")
+            
+            print("\n2. Please enter the authorization code from the callback URL:")
+            print("   (Use 'valid_code' for success, 'invalid_client' for error, 'no_permission' for scope error)")
+            
+            auth_code = input(Fore.YELLOW + "   Authorization code: " + Style.RESET_ALL).strip()
         
         success, message = self.auth.handle_oauth_callback(auth_code)
         
         if success:
             print(Fore.GREEN + f"\n✓ {message}")
-            self.api = TikTokAPI(self.auth.access_token)
+            self.api = TikTokAPI(auth=self.auth)
             return True
         else:
             print(Fore.RED + f"\n✗ {message}")
@@ -52,295 +106,271 @@ class TikTokAdAgent:
                 
             return False
     
-     # Update the get_llm_response method in app.py
-    def get_llm_response(self, user_input: str, collected_data: Dict) -> Dict:
-        """Get structured response from NVIDIA LLM"""
-        # Build conversation context
-        context = f"Current collected data: {json.dumps(collected_data, indent=2)}"
+    def _capture_auth_code(self):
+        """Open the auth URL and wait for the redirect to REDIRECT_URI.
         
-        # For first message, use the structured CONVERSATION_START
-        if not any(collected_data.values()) and user_input == "":
-            return PromptTemplates.CONVERSATION_START
-        
-        user_prompt = f"{context}\n\nUser says: {user_input}"
+        Returns None (fall back to manual entry) if the listener cannot bind,
+        the wait times out or the user presses Ctrl+C.
+        """
+        state = secrets.token_urlsafe(16)
+        try:
+            listener = OAuthCallbackServer(state=state)
+        except OSError as e:
+            print(Fore.YELLOW + f"\nCould not listen on {config.REDIRECT_URI} ({e}); enter the code manually.")
+            return None
         
+        auth_url = self.auth.get_authorization_url(state)
+        listener.start()
+        print("\n1. Opening TikTok in your browser for authentication...")
+        print(f"   Auth URL: {auth_url}")
+        webbrowser.open(auth_url)
+        print(f"\n2. Waiting for the redirect to {config.REDIRECT_URI} (Ctrl+C to enter the code manually)...")
         try:
-            response_text = self.client.chat_completion(
-                messages=[
-                    {"role": "system", "content": PromptTemplates.SYSTEM_PROMPT},
-                    {"role": "user", "content": user_prompt}
-                ]
-            )
-            
-            # Parse JSON response
-            try:
-                response_data = json.loads(response_text)
-                
-                # Validate the response has required fields
-                required_fields = ["user_message", "internal_reasoning", "collected_data", "next_step"]
-                if not all(field in response_data for field in required_fields):
-                    raise json.JSONDecodeError("Missing required fields", "", 0)
-                
-                return response_data
-                
-            except json.JSONDecodeError as e:
-                print(Fore.YELLOW + f"Warning: LLM returned invalid JSON, attempting to fix...")
-                print(Fore.YELLOW + f"Raw response: {response_text[:200]}...")
-                
-                # Try to extract JSON from text
-                import re
-                json_match = re.search(r'\{.*\}', response_text, re.DOTALL)
-                if json_match:
-                    try:
-                        response_data = json.loads(json_match.group())
-                        if all(field in response_data for field in required_fields):
-                            return response_data
-                    except:
-                        pass
-                
-                # Fallback to rule-based response
-                return self._get_fallback_response(user_input, collected_data)
-                
-        except Exception as e:
-            print(Fore.RED + f"LLM Error: {str(e)}")
-            return self._get_fallback_response(user_input, collected_data)
-
-    def _get_fallback_response(self, user_input: str, collected_data: Dict) -> Dict:
-        """Fallback response when LLM fails"""
-        # Simple rule-based fallback
-        if not collected_data.get("campaign_name"):
-            return {
-                "user_message": "Let's start with your campaign name. What would you like to name it?",
-                "internal_reasoning": "Fallback: Asking for campaign name",
-                "collected_data": {"campaign_name": user_input} if user_input else collected_data,
-                "next_step": "campaign_name" if not user_input else "objective"
-            }
-        elif not collected_data.get("objective"):
-            return {
-                "user_message": "Great! Now what's your campaign objective? (Choose: TRAFFIC or CONVERSIONS)",
-                "internal_reasoning": f"Fallback: User provided campaign name '{user_input if user_input else collected_data.get('campaign_name')}'. Need objective.",
-                "collected_data": {**collected_data, "objective": user_input.upper() if user_input else ""},
-                "next_step": "objective" if not user_input else "ad_text"
-            }
-        elif not collected_data.get("ad_text"):
-            return {
-                "user_message": f"Objective set. Now please write your ad text (max 100 characters):",
-                "internal_reasoning": f"Fallback: Objective collected. Need ad text.",
-                "collected_data": {**collected_data, "ad_text": user_input if user_input else ""},
-                "next_step": "ad_text" if not user_input else "cta"
-            }
-        elif not collected_data.get("cta"):
-            return {
-                "user_message": "Now what call-to-action would you like? (e.g., 'Shop Now', 'Learn More', 'Sign Up'):",
-                "internal_reasoning": "Fallback: Ad text collected. Need CTA.",
-                "collected_data": {**collected_data, "cta": user_input if user_input else ""},
-                "next_step": "cta" if not user_input else "music"
-            }
-        elif not collected_data.get("music_option"):
-            # Determine if music is required
-            objective = collected_data.get("objective", "").upper()
-            if objective == "CONVERSIONS":
-                return {
-                    "user_message": "For CONVERSIONS objective, music is required. Choose: 1) Use existing TikTok music, 2) Upload custom music",
-                    "internal_reasoning": "Fallback: Music required for CONVERSIONS. Need music option.",
-                    "collected_data": collected_data,
-                    "next_step": "music"
-                }
-            else:
-                return {
-                    "user_message": "For music, choose: 1) Use existing TikTok music, 2) Upload custom music, 3) No music",
-                    "internal_reasoning": "Fallback: Music optional for TRAFFIC. Need music option.",
-                    "collected_data": collected_data,
-                    "next_step": "music"
-                }
-        else:
-            # All fields collected, ready for validation
-            return {
-                "user_message": "Perfect! I have all the information. Let me validate everything.",
-                "internal_reasoning": "Fallback: All fields collected. Ready for validation.",
-                "collected_data": collected_data,
-                "next_step": "validation"
+            code, error = listener.wait(config.OAUTH_CALLBACK_TIMEOUT)
+        except KeyboardInterrupt:
+            code, error = None, None
+        finally:
+            listener.stop()
+        
+        if error:
+            print(Fore.RED + f"   Authorization failed: {error}")
+        elif code:
+            print(Fore.GREEN + "   Authorization code received")
+        return code
+    
+    def _build_messages(self, user_input: str, collected_data: Dict) -> list:
+        """Build the chat messages for one conversation turn"""
+        return self.prompt_builder.build_messages(user_input, collected_data)
+    
+    def _cache_key(self, messages: list) -> str:
+        """Response cache key for a prompt, or None when caching is off"""
+        if self.response_cache is None:
+            return None
+        return LLMResponseCache.make_key(messages, self.client.model, config.LLM_TEMPERATURE, self.turn_schema)
+    
+    def _get_cached_response(self, cache_key: str) -> Dict:
+        if cache_key is None:
+            return None
+        return self.response_cache.get(cache_key)
+    
+    def _parse_llm_response(self, response_text: str, user_input: str, collected_data: Dict,
+                            cache_key: str = None) -> Dict:
+        """Parse the LLM JSON reply, falling back to rule-based response"""
+        with metrics.timer("json_extract_seconds"):
+            response_data, repair = parse_json_object(response_text)
+        self.turn_stats["llm_turns"] += 1
+        
+        # Validate the response against the turn schema
+        is_valid, error = AdValidator.validate_turn(response_data, strict=self.turn_schema is not None)
+        if is_valid:
+            # Nulls and unknown keys mean "not collected" and are dropped before the turn is used
+            response_data["collected_data"] = {
+                field: value for field, value in response_data["collected_data"].items()
+                if field in COLLECTED_DATA_FIELDS and value is not None
             }
+            # A truncated reply is only good for this turn; retrying may complete it
+            if cache_key is not None and repair != "truncated":
+                self.response_cache.set(cache_key, response_data)
+            return response_data
         
-    def collect_ad_inputs(self) -> Dict:
-        """Guide user through conversational ad creation"""
-        print(Fore.CYAN + "\n" + "="*50)
-        print(Fore.CYAN + "TikTok Ad Creation")
-        print(Fore.CYAN + "="*50)
+        self.turn_stats["invalid_turns"] += 1
+        LLM_FALLBACKS.inc(reason="invalid_turn")
+        print(Fore.YELLOW + f"Warning: LLM returned an invalid turn ({error}), using fallback response")
+        print(Fore.YELLOW + f"Raw response: {(response_text or '')[:200]}...")
         
-        collected_data = {
-            "campaign_name": "",
-            "objective": "",
-            "ad_text": "",
-            "cta": "",
-            "music_option": "",
-            "music_id": ""
-        }
+        # Fallback to rule-based response
+        return self._get_fallback_response(user_input, collected_data)
+    
+    def get_llm_response(self, user_input: str, collected_data: Dict, on_token=None,
+                         usage_tracker: TokenUsageTracker = None) -> Dict:
+        """Get structured response from NVIDIA LLM
         
-        print(Fore.GREEN + "\n" + PromptTemplates.CONVERSATION_START["user_message"])
+        When on_token is given and streaming is enabled, the user_message field
+        is passed to on_token piece by piece as the model generates it. Tokens
+        are counted into usage_tracker (default: this agent's token_usage).
+        """
+        usage_tracker = usage_tracker or self.token_usage
+        # For first message, use the structured CONVERSATION_START
+        if not any(collected_data.values()) and user_input == "":
+            return PromptTemplates.CONVERSATION_START
         
-        while True:
-            user_input = input(Fore.YELLOW + "\nYou: " + Style.RESET_ALL).strip()
+        with metrics.timer("llm_turn_seconds", source="fast_path") as turn:
+            # Unambiguous slot fills are resolved locally
+            fast_response = self._resolve_fast_path(user_input, collected_data)
+            if fast_response:
+                return fast_response
             
-            if user_input.lower() in ['quit', 'exit', 'cancel']:
-                print(Fore.YELLOW + "Ad creation cancelled.")
-                return None
+            turn.labels["source"] = "cache"
+            messages = self._build_messages(user_input, collected_data)
+            cache_key = self._cache_key(messages)
+            cached_response = self._get_cached_response(cache_key)
+            if cached_response:
+                return cached_response
             
-            # Get structured response from LLM
-            llm_response = self.get_llm_response(user_input, collected_data)
-            
-            # Update collected data
-            if llm_response.get("collected_data"):
-                collected_data.update(llm_response["collected_data"])
-            
-            # Print agent response
-            print(Fore.BLUE + f"\nAssistant: {llm_response.get('user_message', '')}")
-            
-            # Handle special cases
-            next_step = llm_response.get("next_step", "").lower()
-            
-            if next_step == "validation":
-                return self.validate_and_process(collected_data)
-            elif next_step == "ask_music_id":
-                self.handle_music_id_input(collected_data)
-            elif next_step == "ask_custom_music":
-                self.handle_custom_music(collected_data)
-            
-            # Show current progress
-            self.show_progress(collected_data)
+            turn.labels["source"] = "llm"
+            try:
+                if on_token is not None and config.LLM_STREAMING:
+                    response_text = self._stream_llm_response(messages, on_token, usage_tracker)
+                else:
+                    response_text = self.client.chat_completion(messages=messages, usage_tracker=usage_tracker,
+                                                                json_schema=self.turn_schema)
+                return self._parse_llm_response(response_text, user_input, collected_data, cache_key)
+                    
+            except Exception as e:
+                print(Fore.RED + f"LLM Error: {str(e)}")
+                turn.labels["source"] = "fallback"
+                LLM_FALLBACKS.inc(reason="error")
+                return self._get_fallback_response(user_input, collected_data)
     
-    def handle_music_id_input(self, collected_data: Dict):
-        """Handle existing music ID validation"""
-        print(Fore.CYAN + "\nPlease enter the TikTok Music ID:")
-        music_id = input(Fore.YELLOW + "Music ID: " + Style.RESET_ALL).strip()
+    def _stream_llm_response(self, messages: list, on_token, usage_tracker: TokenUsageTracker) -> str:
+        """Stream a completion, forwarding user_message text as it arrives"""
+        scanner = JSONStringFieldScanner("user_message")
         
-        if music_id:
-            print(Fore.BLUE + "\nValidating music ID with TikTok API...")
-            is_valid, status, details = self.api.validate_music_id(music_id)
-            
-            if is_valid:
-                print(Fore.GREEN + f"✓ Music ID validated: {details.get('title', 'Unknown Track')}")
-                collected_data['music_id'] = music_id
-                collected_data['music_option'] = 'EXISTING'
-            else:
-                print(Fore.RED + f"✗ Music validation failed: {status}")
-                print(Fore.YELLOW + f"   Details: {details.get('message', 'Unknown error')}")
-                
-                print(Fore.CYAN + "\nWhat would you like to do?")
-                print("1. Try a different Music ID")
-                print("2. Upload custom music")
-                print("3. Skip music (if allowed)")
-                
-                choice = input(Fore.YELLOW + "Choice (1-3): " + Style.RESET_ALL).strip()
-                
-                if choice == "1":
-                    self.handle_music_id_input(collected_data)
-                elif choice == "2":
-                    self.handle_custom_music(collected_data)
-                elif choice == "3":
-                    is_allowed, message = AdValidator.validate_music_logic(
-                        collected_data.get('objective', ''),
-                        'NO_MUSIC'
-                    )
-                    if is_allowed:
-                        collected_data['music_option'] = 'NO_MUSIC'
-                        print(Fore.GREEN + "✓ Music skipped (allowed for Traffic objective)")
-                    else:
-                        print(Fore.RED + f"✗ Cannot skip music: {message}")
-                        self.handle_music_id_input(collected_data)
-    
-    def handle_custom_music(self, collected_data: Dict):
-        """Handle custom music upload"""
-        print(Fore.CYAN + "\nCustom Music Upload")
-        print("For this demo, we'll simulate the upload process.")
+        def on_delta(delta: str):
+            text = scanner.feed(delta)
+            if text:
+                on_token(text)
         
-        confirm = input(Fore.YELLOW + "Upload custom music file? (yes/no): " + Style.RESET_ALL).strip().lower()
+        return self.client.chat_completion(messages=messages, stream=True, on_delta=on_delta,
+                                           usage_tracker=usage_tracker, json_schema=self.turn_schema)
+    
+    async def aget_llm_response(self, user_input: str, collected_data: Dict,
+                                usage_tracker: TokenUsageTracker = None) -> Dict:
+        """Async variant of get_llm_response with a per-call deadline"""
+        usage_tracker = usage_tracker or self.token_usage
+        if not any(collected_data.values()) and user_input == "":
+            return PromptTemplates.CONVERSATION_START
         
-        if confirm == 'yes':
-            file_path = input(Fore.YELLOW + "Enter music file path (simulated): " + Style.RESET_ALL).strip()
+        with metrics.timer("llm_turn_seconds", source="fast_path") as turn:
+            fast_response = self._resolve_fast_path(user_input, collected_data)
+            if fast_response:
+                return fast_response
             
-            print(Fore.BLUE + "\nUploading music to TikTok...")
-            success, status, music_id = self.api.upload_custom_music(file_path)
+            turn.labels["source"] = "cache"
+            messages = self._build_messages(user_input, collected_data)
+            cache_key = self._cache_key(messages)
+            cached_response = self._get_cached_response(cache_key)
+            if cached_response:
+                return cached_response
             
-            if success and music_id:
-                print(Fore.GREEN + f"✓ Music uploaded successfully! Music ID: {music_id}")
-                collected_data['music_id'] = music_id
-                collected_data['music_option'] = 'CUSTOM'
-            else:
-                print(Fore.RED + f"✗ Upload failed: {status}")
-                
-                print(Fore.CYAN + "\nOptions:")
-                print("1. Try uploading again")
-                print("2. Use existing music instead")
-                print("3. Skip music (if allowed)")
-                
-                choice = input(Fore.YELLOW + "Choice (1-3): " + Style.RESET_ALL).strip()
+            if self.async_client is None:
+                self.async_client = AsyncNVIDIAAIClient()
+            
+            turn.labels["source"] = "llm"
+            try:
+                response_text = await self.async_client.chat_completion(messages=messages,
+                                                                        usage_tracker=usage_tracker,
+                                                                        json_schema=self.turn_schema)
+                return self._parse_llm_response(response_text, user_input, collected_data, cache_key)
                 
-                if choice == "1":
-                    self.handle_custom_music(collected_data)
-                elif choice == "2":
-                    self.handle_music_id_input(collected_data)
-                elif choice == "3":
-                    is_allowed, message = AdValidator.validate_music_logic(
-                        collected_data.get('objective', ''),
-                        'NO_MUSIC'
-                    )
-                    if is_allowed:
-                        collected_data['music_option'] = 'NO_MUSIC'
-                        print(Fore.GREEN + "✓ Proceeding without music")
-                    else:
-                        print(Fore.RED + f"✗ Cannot proceed: {message}")
-                        self.handle_custom_music(collected_data)
-        else:
-            print(Fore.BLUE + "\nLet's explore other music options...")
-            self.handle_music_id_input(collected_data)
+            except asyncio.TimeoutError:
+                print(Fore.YELLOW + f"Warning: LLM missed its {self.async_client.deadline}s deadline, using fallback")
+                turn.labels["source"] = "fallback"
+                LLM_FALLBACKS.inc(reason="timeout")
+                return self._get_fallback_response(user_input, collected_data)
+            except Exception as e:
+                print(Fore.RED + f"LLM Error: {str(e)}")
+                turn.labels["source"] = "fallback"
+                LLM_FALLBACKS.inc(reason="error")
+                return self._get_fallback_response(user_input, collected_data)
+
+    def _resolve_fast_path(self, user_input: str, collected_data: Dict) -> Dict:
+        """Try the rule-based fast path before calling the LLM"""
+        if self.fast_path is None:
+            return None
+        return self.fast_path.resolve(user_input, collected_data)
+
+    def _get_fallback_response(self, user_input: str, collected_data: Dict) -> Dict:
+        """Fallback response when LLM fails"""
+        return fallback_response(user_input, collected_data)
     
-    def validate_and_process(self, collected_data: Dict) -> Dict:
-        """Validate collected data and prepare for submission"""
-        print(Fore.CYAN + "\n" + "="*50)
-        print(Fore.CYAN + "Validation & Submission")
-        print(Fore.CYAN + "="*50)
-        
-        is_valid, errors = AdValidator.validate_all_fields(collected_data)
+    def collect_ad_inputs(self, resume_id: str = None) -> Dict:
+        """Guide user through conversational ad creation
         
-        if not is_valid:
-            print(Fore.RED + "\n✗ Validation Errors Found:")
-            for field, error in errors.items():
-                print(Fore.RED + f"   • {field}: {error}")
-            
-            print(Fore.YELLOW + "\nPlease correct the errors above.")
-            return None
+        With a session store, every turn is checkpointed and resume_id picks
+        up a previous conversation where it stopped.
+        """
+        engine = ConversationEngine(self.get_llm_response, self.api)
+        store = self.session_store
+        state = store.load(resume_id) if store and resume_id else None
         
-        print(Fore.GREEN + "\n✓ All validations passed!")
+        if state is not None:
+            if state.get("submitted"):
+                print(Fore.YELLOW + f"\nSession {resume_id} was already submitted (campaign {state['submitted']}).")
+                return None
+            if state.get("submitting"):
+                print(Fore.YELLOW + f"\nSession {resume_id} stopped while its campaign was being submitted, so it "
+                      f"may already exist. Check TikTok Ads Manager before creating it again.")
+                return None
+            self.session_id = resume_id
+            output = engine.resume_session(state)
+        else:
+            if resume_id:
+                print(Fore.YELLOW + f"\nNo saved session {resume_id}; starting a new one.")
+            state, output = engine.new_session()
+            self.session_id = store.create(state) if store else None
         
-        print(Fore.CYAN + "\nFinal Ad Configuration:")
-        print(Fore.CYAN + "-" * 30)
-        for key, value in collected_data.items():
-            if value:
-                print(f"{key.replace('_', ' ').title()}: {value}")
+        if self.session_id:
+            print(Fore.MAGENTA + f"[Session {self.session_id} - resume with: python app.py --resume {self.session_id}]")
+        self.render_output(output)
         
-        print(Fore.CYAN + "\n" + "-" * 30)
-        confirm = input(Fore.YELLOW + "Submit this ad campaign? (yes/no): " + Style.RESET_ALL).strip().lower()
+        while not output["finished"]:
+            user_input = input(Fore.YELLOW + output["prompt"] + Style.RESET_ALL).strip()
+            state, output = engine.step(state, user_input, on_token=self._print_token)
+            if store:
+                store.checkpoint(self.session_id, state)
+            self.render_output(output)
         
-        if confirm == 'yes':
-            return collected_data
-        else:
-            print(Fore.YELLOW + "Submission cancelled.")
-            return None
+        self._session_state = state
+        return state["ad_payload"]
+    
+    def _print_token(self, text: str):
+        """Print streamed assistant text as soon as it arrives"""
+        if not self._streamed_text:
+            print(Fore.BLUE + "\nAssistant: ", end="")
+        print(Fore.BLUE + text, end="", flush=True)
+        self._streamed_text += text
+    
+    def render_output(self, output: Dict):
+        """Print the messages produced by one engine step"""
+        for message in output["messages"]:
+            if message["level"] == "assistant":
+                if self._streamed_text and self._streamed_text == message['text']:
+                    print()
+                elif self._streamed_text:
+                    # Streamed reply was replaced (e.g. by the fallback)
+                    print(Fore.BLUE + f"\n\nAssistant: {message['text']}")
+                else:
+                    print(Fore.BLUE + f"\nAssistant: {message['text']}")
+                self._streamed_text = ""
+            else:
+                print(LEVEL_COLORS.get(message["level"], "") + message["text"])
     
     def submit_ad_campaign(self, ad_payload: Dict):
         """Submit ad campaign and handle API responses"""
-        print(Fore.BLUE + "\nSubmitting ad campaign to TikTok API...")
+        scheduler = submission_scheduler(self.auth)
+        # Transient errors are retried automatically on the first submission only;
+        # a retry the user confirms is a single attempt
+        max_attempts = None
         
-        success, response = self.api.create_ad_campaign(ad_payload)
-        
-        if success:
-            print(Fore.GREEN + "\n✓ Ad campaign submitted successfully!")
-            print(Fore.GREEN + f"   Campaign ID: {response['data']['campaign_id']}")
-            print(Fore.GREEN + f"   Status: {response['data']['status']}")
-            print(Fore.GREEN + f"   Estimated Review: {response['data']['estimated_review_time']}")
-        else:
-            print(Fore.RED + "\n✗ Submission failed!")
+        while True:
+            print(Fore.BLUE + "\nSubmitting ad campaign to TikTok API...")
+            # Marked in flight first, so a resume after a crash here doesn't submit again
+            self._checkpoint_submission(submitting=True)
+            success, response, attempts = scheduler.submit(self.api, ad_payload, on_retry=self._print_retry,
+                                                           max_attempts=max_attempts)
+            
+            if success:
+                print(Fore.GREEN + "\n✓ Ad campaign submitted successfully!")
+                print(Fore.GREEN + f"   Campaign ID: {response['data']['campaign_id']}")
+                print(Fore.GREEN + f"   Status: {response['data']['status']}")
+                print(Fore.GREEN + f"   Estimated Review: {response['data']['estimated_review_time']}")
+                # Resuming a submitted session must not create the campaign twice
+                self._checkpoint_submission(submitting=False, submitted=response['data']['campaign_id'])
+                return
+            
+            self._checkpoint_submission(submitting=False)
+            print(Fore.RED + f"\n✗ Submission failed after {attempts} attempt{'s' if attempts != 1 else ''}!")
             
             error_interpretation = self.api.interpret_api_error(response)
             
@@ -348,37 +378,30 @@ class TikTokAdAgent:
             print(Fore.YELLOW + f"   • What happened: {error_interpretation['explanation']}")
             print(Fore.YELLOW + f"   • Action needed: {error_interpretation['action']}")
             
-            if error_interpretation['can_retry']:
-                print(Fore.YELLOW + f"   • Retry suggestion: {error_interpretation['retry_suggestion']}")
-                
-                retry = input(Fore.YELLOW + "\nRetry submission? (yes/no): " + Style.RESET_ALL).strip().lower()
-                if retry == 'yes':
-                    if response.get('code') == 40003:
-                        print(Fore.BLUE + "\nRefreshing access token...")
-                        if self.auth.refresh_access_token():
-                            self.api = TikTokAPI(self.auth.access_token)
-                            print(Fore.GREEN + "✓ Token refreshed, retrying...")
-                            self.submit_ad_campaign(ad_payload)
-                        else:
-                            print(Fore.RED + "✗ Token refresh failed. Please re-authenticate.")
-                    else:
-                        self.submit_ad_campaign(ad_payload)
-            else:
+            if not error_interpretation['can_retry']:
                 print(Fore.RED + "\n❌ This error cannot be retried automatically.")
                 print(Fore.RED + "   Please fix the issue and try creating a new campaign.")
+                return
+            
+            print(Fore.YELLOW + f"   • Retry suggestion: {error_interpretation['retry_suggestion']}")
+            retry = input(Fore.YELLOW + "\nRetry submission? (yes/no): " + Style.RESET_ALL).strip().lower()
+            if retry != 'yes':
+                return
+            max_attempts = 1
     
-    def show_progress(self, collected_data: Dict):
-        """Show current progress in data collection"""
-        completed = sum(1 for v in collected_data.values() if v)
-        total = len(collected_data)
-        
-        print(Fore.MAGENTA + f"\n[Progress: {completed}/{total} fields collected]")
-        
-        missing = [k.replace('_', ' ').title() for k, v in collected_data.items() if not v]
-        if missing:
-            print(Fore.MAGENTA + f"  Still needed: {', '.join(missing)}")
+    def _checkpoint_submission(self, **fields):
+        if self.session_store and self.session_id:
+            self._session_state = {**self._session_state, **fields}
+            self.session_store.checkpoint(self.session_id, self._session_state)
     
-    def run(self):
+    def _print_retry(self, attempt: int, response: Dict, interpretation: Dict, delay: float):
+        if response.get('code') == 40003:
+            print(Fore.BLUE + "Access token refreshed, retrying...")
+        else:
+            print(Fore.YELLOW + f"Attempt {attempt} failed ({response.get('message', 'unknown error')}), "
+                  f"retrying in {delay:.1f}s...")
+    
+    def run(self, resume_id: str = None):
         """Main execution flow"""
         print(Fore.CYAN + "="*60)
         print(Fore.CYAN + f"TikTok AI Ad Creation Agent")
@@ -389,22 +412,47 @@ class TikTokAdAgent:
             print(Fore.RED + "\nAuthentication failed. Exiting...")
             return
         
-        ad_payload = self.collect_ad_inputs()
-        
-        if not ad_payload:
-            print(Fore.YELLOW + "\nAd creation incomplete. Exiting...")
-            return
+        if config.SESSION_STORE_ENABLED:
+            self.session_store = SessionStore()
+            self.session_store.start_compactor()
+        try:
+            ad_payload = self.collect_ad_inputs(resume_id)
+            
+            if not ad_payload:
+                print(Fore.YELLOW + "\nAd creation incomplete. Exiting...")
+                return
+            
+            self.submit_ad_campaign(ad_payload)
+        finally:
+            if self.session_store:
+                self.session_store.close()
         
-        self.submit_ad_campaign(ad_payload)
+        if self.fast_path:
+            stats = self.fast_path.stats()
+            print(Fore.MAGENTA + f"\n[LLM fast path: {stats['hits']}/{stats['hits'] + stats['misses']} turns resolved locally ({stats['hit_rate']:.0%})]")
+        if self.response_cache:
+            stats = self.response_cache.stats()
+            print(Fore.MAGENTA + f"[LLM response cache: {stats['hits']} hits, {stats['misses']} misses, {stats['evictions']} evictions]")
+        if self.turn_stats["llm_turns"]:
+            print(Fore.MAGENTA + f"[LLM invalid turns: {self.turn_stats['invalid_turns']}/{self.turn_stats['llm_turns']}"
+                  f"{' (guided JSON)' if self.turn_schema else ''}]")
+        usage = self.token_usage.totals()
+        print(Fore.MAGENTA + f"[LLM tokens ({self.prompt_builder.mode} prompts): {usage['prompt_tokens']} prompt, "
+              f"{usage['completion_tokens']} completion over {usage['turns']} calls]")
         
         print(Fore.CYAN + "\n" + "="*60)
         print(Fore.CYAN + "Process Complete!")
         print(Fore.CYAN + "="*60)
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Create a TikTok ad campaign conversationally")
+    parser.add_argument("--resume", metavar="SESSION_ID", help="Continue a checkpointed conversation")
+    args = parser.parse_args()
+    if config.METRICS_PORT:
+        metrics.serve()
     try:
         agent = TikTokAdAgent()
-        agent.run()
+        agent.run(resume_id=args.resume)
     except KeyboardInterrupt:
         print(Fore.YELLOW + "\n\nProcess interrupted by user. Exiting...")
         sys.exit(0)
@@ -413,3 +461,6 @@ if __name__ == "__main__":
         import traceback
         traceback.print_exc()
         sys.exit(1)
+    finally:
+        if config.METRICS_FILE:
+            metrics.write_file()
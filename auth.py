@@ -1,21 +1,45 @@
 import requests
 import json
+import threading
+import time
 from config import config
+from metrics import histogram, timer
+from transport import HTTPTransport, get_transport
 from typing import Dict, Optional, Tuple
 
+histogram("token_refresh_seconds", "OAuth token refresh latency, by outcome")
+
 class TikTokAuth:
-    def __init__(self):
+    # OAuth endpoints relative to TIKTOK_API_BASE_URL, used in "http" mode
+    ACCESS_TOKEN_PATH = "/oauth2/access_token/"
+    REFRESH_TOKEN_PATH = "/oauth2/refresh_token/"
+    
+    # Lifetime assumed for mock tokens, matching the mock server's expires_in
+    MOCK_EXPIRES_IN = 86400
+    
+    def __init__(self, transport: HTTPTransport = None, auto_refresh: bool = None, token_store=None):
         self.access_token = None
         self.refresh_token = None
+        self.expires_at = None  # epoch seconds, None when unknown
+        self.mode = config.TIKTOK_API_MODE
+        self.transport = transport or get_transport()
+        # Refresh on a background timer TOKEN_REFRESH_MARGIN seconds before expiry
+        self.auto_refresh = config.TOKEN_AUTO_REFRESH if auto_refresh is None else auto_refresh
+        self._refresh_lock = threading.Lock()
+        self._refresh_generation = 0
+        self._last_refresh_ok = False
+        self._timer = None
+        # Optional TokenStore; tokens are saved on every exchange or refresh
+        self.token_store = token_store
         
-    def get_authorization_url(self) -> str:
+    def get_authorization_url(self, state: str = None) -> str:
         """Generate TikTok OAuth authorization URL"""
         params = {
             'client_key': config.CLIENT_ID,
             'redirect_uri': config.REDIRECT_URI,
             'response_type': 'code',
             'scope': 'ads.manage',
-            'state': 'tiktok_auth_state'
+            'state': state or 'tiktok_auth_state'
         }
         
         # In a real implementation, this would construct the actual TikTok URL
@@ -24,11 +48,13 @@ class TikTokAuth:
     
     def handle_oauth_callback(self, auth_code: str) -> Tuple[bool, str]:
         """Exchange authorization code for access token"""
+        if self.mode == "http":
+            return self._exchange_code_http(auth_code)
+        
         try:
             # Mocked OAuth flow for assignment
             if auth_code == "valid_code":
-                self.access_token = "mock_access_token_12345"
-                self.refresh_token = "mock_refresh_token_67890"
+                self._set_tokens("mock_access_token_12345", "mock_refresh_token_67890", self.MOCK_EXPIRES_IN)
                 return True, "Authentication successful"
             elif auth_code == "invalid_client":
                 return False, "Invalid client ID or secret. Please check your TikTok App credentials."
@@ -40,23 +66,149 @@ class TikTokAuth:
         except Exception as e:
             return False, f"Authentication error: {str(e)}"
     
+    def _exchange_code_http(self, auth_code: str) -> Tuple[bool, str]:
+        body = self.transport.post(
+            config.TIKTOK_API_BASE_URL + self.ACCESS_TOKEN_PATH,
+            json_body={
+                'app_id': config.CLIENT_ID,
+                'secret': config.CLIENT_SECRET,
+                'auth_code': auth_code
+            }
+        )
+        
+        if body.get('code') == 0:
+            data = body.get('data', {})
+            self._set_tokens(data.get('access_token'), data.get('refresh_token'), data.get('expires_in'))
+            return True, "Authentication successful"
+        
+        if body.get('code') == 40001:
+            return False, "Invalid client ID or secret. Please check your TikTok App credentials."
+        elif body.get('code') == 40002:
+            return False, "Missing Ads permission scope. Please ensure your TikTok App has ads.manage scope."
+        elif body.get('code') in (50000, 50001):
+            return False, f"Authentication error: {body.get('message', 'TikTok API unavailable')}"
+        return False, "Invalid authorization code"
+    
     def is_token_valid(self) -> bool:
         """Check if token is valid (mocked implementation)"""
         if not self.access_token:
             return False
+        if self.expires_at is not None and time.time() >= self.expires_at:
+            return False
             
         # Simulate token validation
         return self.access_token != "expired_token"
     
+    def needs_refresh(self) -> bool:
+        """True once the token is within TOKEN_REFRESH_MARGIN of expiring"""
+        return self.expires_at is not None and time.time() >= self.expires_at - config.TOKEN_REFRESH_MARGIN
+    
+    def ensure_fresh(self) -> str:
+        """Access token, refreshed first if it is about to expire"""
+        if self.refresh_token and self.needs_refresh():
+            self.refresh_access_token()
+        return self.access_token
+    
     def refresh_access_token(self) -> bool:
-        """Refresh expired access token"""
+        """Refresh expired access token.
+        
+        Single-flight: callers that arrive while a refresh is in progress
+        wait for it and share its result instead of refreshing again.
+        """
+        generation = self._refresh_generation
+        with self._refresh_lock:
+            if self._refresh_generation != generation:
+                return self._last_refresh_ok
+            with timer("token_refresh_seconds") as refresh:
+                self._last_refresh_ok = self._refresh()
+                refresh.labels["outcome"] = "ok" if self._last_refresh_ok else "failed"
+            self._refresh_generation += 1
+            return self._last_refresh_ok
+    
+    def _refresh(self) -> bool:
         if not self.refresh_token:
             return False
+        
+        if self.mode == "http":
+            body = self.transport.post(
+                config.TIKTOK_API_BASE_URL + self.REFRESH_TOKEN_PATH,
+                json_body={
+                    'app_id': config.CLIENT_ID,
+                    'secret': config.CLIENT_SECRET,
+                    'refresh_token': self.refresh_token
+                }
+            )
+            if body.get('code') != 0:
+                return False
+            data = body.get('data', {})
+            self._set_tokens(data.get('access_token'), data.get('refresh_token', self.refresh_token),
+                             data.get('expires_in'))
+            return True
             
         # Mock token refresh
-        self.access_token = "refreshed_mock_token_12345"
+        self._set_tokens("refreshed_mock_token_12345", self.refresh_token, self.MOCK_EXPIRES_IN)
         return True
     
+    def _set_tokens(self, access_token: str, refresh_token: str, expires_in: Optional[float]):
+        self.access_token = access_token
+        self.refresh_token = refresh_token
+        self.expires_at = time.time() + float(expires_in) if expires_in else None
+        self._schedule_refresh()
+        if self.token_store:
+            # Persistence only saves a later OAuth flow; a failed write must not fail the login
+            try:
+                self.token_store.save({
+                    'access_token': self.access_token,
+                    'refresh_token': self.refresh_token,
+                    'expires_at': self.expires_at,
+                    'mode': self.mode,
+                    'base_url': config.TIKTOK_API_BASE_URL
+                })
+            except OSError as e:
+                print(f"Warning: could not save tokens to {self.token_store.path}: {e}")
+    
+    def restore_session(self) -> bool:
+        """Reuse tokens from the token store, refreshing them if they expired.
+        
+        Tokens saved for a different API mode or base URL are ignored.
+        """
+        record = self.token_store.load() if self.token_store else None
+        if not record or record.get('mode') != self.mode or record.get('base_url') != config.TIKTOK_API_BASE_URL:
+            return False
+        
+        self.access_token = record.get('access_token')
+        self.refresh_token = record.get('refresh_token')
+        self.expires_at = record.get('expires_at')
+        if self.needs_refresh() or not self.is_token_valid():
+            return self.refresh_access_token()
+        self._schedule_refresh()
+        return bool(self.access_token)
+    
+    def _schedule_refresh(self, delay: float = None):
+        """(Re)arm the background refresh timer"""
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+        if not self.auto_refresh or self.expires_at is None or not self.refresh_token:
+            return
+        if delay is None:
+            delay = max(0.0, self.expires_at - config.TOKEN_REFRESH_MARGIN - time.time())
+        self._timer = threading.Timer(delay, self._background_refresh)
+        self._timer.daemon = True
+        self._timer.start()
+    
+    def _background_refresh(self):
+        if not self.refresh_access_token() and self.expires_at and time.time() < self.expires_at:
+            # Keep trying until the token actually expires
+            self._schedule_refresh(config.TOKEN_REFRESH_RETRY)
+    
+    def close(self):
+        """Stop the background refresh timer"""
+        self.auto_refresh = False
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+    
     def _build_query_params(self, params: Dict) -> str:
         """Helper to build query parameter string"""
         return '&'.join([f"{k}={v}" for k, v in params.items()])
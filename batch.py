@@ -0,0 +1,157 @@
+"""Non-interactive batch campaign creation.
+
+Streams campaign specs from a JSONL file, validates each one, resolves its
+music and submits it with a bounded pool of concurrent workers. Results are
+written as JSONL in completion order; at most ``2 * concurrency`` specs are
+held in memory at once, whatever the input size.
+
+    python batch.py campaigns.jsonl -o results.jsonl --concurrency 32
+
+Each input line is an object with the collected_data fields
+(campaign_name, objective, ad_text, cta, music_option, music_id), an
+optional "id" and, for CUSTOM music without a music_id, a "music_file".
+"""
+import argparse
+import json
+import sys
+import time
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Iterator, TextIO, Tuple
+from auth import TikTokAuth
+from retry import RetryScheduler, submission_scheduler
+from tiktok_api import TikTokAPI
+from validators import AdValidator, COLLECTED_DATA_FIELDS
+
+DEFAULT_CONCURRENCY = 16
+
+
+def iter_specs(lines: Iterator[str]) -> Iterator[Tuple[int, Dict]]:
+    """Yield (line number, spec) pairs; unparsable lines yield an error spec"""
+    for line_no, line in enumerate(lines, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            spec = json.loads(line)
+        except ValueError as e:
+            spec = {"_error": f"Invalid JSON: {e}"}
+        if not isinstance(spec, dict):
+            spec = {"_error": "Spec must be a JSON object"}
+        yield line_no, spec
+
+
+def process_spec(api: TikTokAPI, line_no: int, spec: Dict, scheduler: RetryScheduler = None,
+                 before_submit: Callable[[], bool] = None) -> Dict:
+    """Validate, resolve music for and submit one campaign spec.
+
+    Submissions go through ``scheduler`` (retries and rate limiting) when
+    one is given, else they are attempted once. If ``before_submit`` returns
+    False the campaign is not submitted and the status is "skipped".
+    """
+    result = {"line": line_no, "id": spec.get("id", line_no)}
+    if "_error" in spec:
+        return {**result, "status": "error", "error": spec["_error"]}
+
+    ad_data = {field: str(spec.get(field) or "") for field in COLLECTED_DATA_FIELDS}
+    ad_data["objective"] = ad_data["objective"].upper()
+    ad_data["music_option"] = ad_data["music_option"].upper()
+
+    is_valid, errors = AdValidator.validate_all_fields(ad_data)
+    if not is_valid:
+        return {**result, "status": "invalid", "errors": errors}
+
+    if ad_data["music_option"] == "EXISTING":
+        is_valid, status, details = api.validate_music_id(ad_data["music_id"])
+        if not is_valid:
+            return {**result, "status": "music_failed", "music_status": status,
+                    "code": (details or {}).get("code")}
+    elif ad_data["music_option"] == "CUSTOM" and not ad_data["music_id"]:
+        success, status, music_id = api.upload_custom_music(spec.get("music_file", ""))
+        if not success or not music_id:
+            return {**result, "status": "music_failed", "music_status": status}
+        ad_data["music_id"] = music_id
+
+    if before_submit is not None and not before_submit():
+        return {**result, "status": "skipped"}
+    if scheduler is None:
+        (success, response), attempts = api.create_ad_campaign(ad_data), 1
+    else:
+        success, response, attempts = scheduler.submit(api, ad_data)
+    if success:
+        return {**result, "status": "submitted", "campaign_id": response["data"]["campaign_id"],
+                "music_id": ad_data["music_id"], "attempts": attempts}
+    return {**result, "status": "failed", "code": response.get("code"), "message": response.get("message"),
+            "attempts": attempts}
+
+
+class BatchRunner:
+    """Runs process_spec over a stream of specs with bounded concurrency"""
+
+    def __init__(self, api: TikTokAPI, concurrency: int = DEFAULT_CONCURRENCY, scheduler: RetryScheduler = None):
+        self.api = api
+        self.scheduler = scheduler
+        self.concurrency = concurrency
+        self.window = 2 * concurrency  # max specs submitted but not yet written
+
+    def run(self, lines: Iterator[str], output: TextIO) -> Dict:
+        counts = Counter()
+        started = time.perf_counter()
+
+        def drain(futures: set, block_until: int) -> set:
+            while len(futures) > block_until:
+                done, futures = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    record = future.result()
+                    counts[record["status"]] += 1
+                    output.write(json.dumps(record) + "\n")
+            return futures
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            futures = set()
+            for line_no, spec in iter_specs(lines):
+                futures = drain(futures, self.window - 1)
+                futures.add(pool.submit(process_spec, self.api, line_no, spec, self.scheduler))
+            drain(futures, 0)
+
+        elapsed = time.perf_counter() - started
+        total = sum(counts.values())
+        return {
+            "total": total,
+            "by_status": dict(counts),
+            "seconds": round(elapsed, 3),
+            "specs_per_sec": round(total / elapsed, 2) if elapsed else 0.0,
+            "concurrency": self.concurrency,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Create TikTok ad campaigns in bulk from a JSONL file")
+    parser.add_argument("input", help="JSONL file of campaign specs ('-' for stdin)")
+    parser.add_argument("-o", "--output", default="-", help="JSONL results file ('-' for stdout)")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY)
+    parser.add_argument("--auth-code", default="valid_code", help="OAuth authorization code to exchange")
+    args = parser.parse_args()
+
+    auth = TikTokAuth()
+    success, message = auth.handle_oauth_callback(args.auth_code)
+    if not success:
+        print(f"Authentication failed: {message}", file=sys.stderr)
+        sys.exit(1)
+    runner = BatchRunner(TikTokAPI(auth=auth), args.concurrency, submission_scheduler(auth))
+
+    source = sys.stdin if args.input == "-" else open(args.input)
+    sink = sys.stdout if args.output == "-" else open(args.output, "w")
+    try:
+        summary = runner.run(source, sink)
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if sink is not sys.stdout:
+            sink.close()
+
+    print(json.dumps(summary), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""Micro-benchmark: LLM JSON extraction over a corpus of real-world outputs.
+
+Compares the old greedy-regex recovery with json_utils.extract_json_object.
+
+    python -m benchmarks.bench_json_extract [--number 2000]
+"""
+import argparse
+import json
+import os
+import re
+import timeit
+from json_utils import extract_json_object, parse_json_object
+
+CORPUS_PATH = os.path.join(os.path.dirname(__file__), "corpus", "llm_responses.jsonl")
+
+
+def load_corpus(path: str = CORPUS_PATH) -> list:
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def legacy_extract(text: str):
+    """The previous recovery: json.loads, then greedy regex + json.loads"""
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        match = re.search(r'\{.*\}', text, re.DOTALL)
+        if match:
+            try:
+                return json.loads(match.group())
+            except json.JSONDecodeError:
+                pass
+    return None
+
+
+def run(number: int) -> dict:
+    corpus = load_corpus()
+    results = {}
+    for record in corpus:
+        text = record["text"]
+        legacy_us = timeit.timeit(lambda: legacy_extract(text), number=number) / number * 1e6
+        new_us = timeit.timeit(lambda: extract_json_object(text), number=number) / number * 1e6
+        path = parse_json_object(text)[1]
+        results[record["name"]] = {
+            "bytes": len(text),
+            "legacy_us": round(legacy_us, 2),
+            "legacy_recovered": legacy_extract(text) is not None,
+            "extract_us": round(new_us, 2),
+            "extract_path": path,
+        }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--number", type=int, default=2000, help="iterations per corpus entry")
+    args = parser.parse_args()
+
+    results = run(args.number)
+    print(f"{'case':<28}{'bytes':>7}{'legacy µs':>11}{'ok':>5}{'extract µs':>12}  path")
+    for name, r in results.items():
+        print(f"{name:<28}{r['bytes']:>7}{r['legacy_us']:>11}{'y' if r['legacy_recovered'] else 'n':>5}"
+              f"{r['extract_us']:>12}  {r['extract_path']}")
+    recovered = sum(1 for r in results.values() if r["extract_path"] != "failed")
+    legacy = sum(1 for r in results.values() if r["legacy_recovered"])
+    print(f"\nRecovered: legacy {legacy}/{len(results)}, extract_json_object {recovered}/{len(results)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Benchmark: pooled HTTPTransport vs a new connection per request.
+
+Runs against a local keep-alive stub server and reports throughput and
+how many TCP connections the server accepted.
+
+    python -m benchmarks.bench_transport [--requests 2000] [--threads 16]
+"""
+import argparse
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import requests
+from transport import HTTPTransport
+
+RESPONSE_BODY = json.dumps({"code": 0, "message": "OK", "data": {"campaign_id": "CMP0000000001"}}).encode()
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+    disable_nagle_algorithm = True  # headers and body are separate writes
+    connections = 0
+    lock = threading.Lock()
+
+    def setup(self):
+        super().setup()
+        with StubHandler.lock:
+            StubHandler.connections += 1
+
+    def _reply(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            self.rfile.read(length)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(RESPONSE_BODY)))
+        self.end_headers()
+        self.wfile.write(RESPONSE_BODY)
+
+    do_GET = _reply
+    do_POST = _reply
+
+    def log_message(self, *args):
+        pass
+
+
+def run_case(name: str, send, total: int, threads: int) -> dict:
+    StubHandler.connections = 0
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(lambda _: send(), range(total)))
+    elapsed = time.perf_counter() - start
+    return {
+        "case": name,
+        "requests": total,
+        "seconds": round(elapsed, 3),
+        "req_per_sec": round(total / elapsed, 1),
+        "connections": StubHandler.connections,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--threads", type=int, default=16)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/campaign/create/"
+    payload = {"campaign_name": "Summer Sale", "objective": "TRAFFIC"}
+
+    transport = HTTPTransport(pool_maxsize=args.threads)
+    results = [
+        run_case("new connection per request",
+                 lambda: requests.post(url, json=payload, timeout=10).json(), args.requests, args.threads),
+        run_case("pooled HTTPTransport",
+                 lambda: transport.post(url, json_body=payload), args.requests, args.threads),
+    ]
+    transport.close()
+    server.shutdown()
+
+    for r in results:
+        print(f"{r['case']:<28} {r['req_per_sec']:>9} req/s  {r['seconds']:>7}s  {r['connections']:>5} connections")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""Benchmark: per-row AdValidator.validate_all_fields vs columnar validate_batch.
+
+Generates a seeded campaign sheet with a realistic mix of valid and invalid
+rows, checks that both paths report identical errors, then times them.
+
+    python -m benchmarks.bench_validation [--rows 100000 1000000] [--repeat 3]
+"""
+import argparse
+import json
+import random
+import time
+from config import config
+from validators import AdValidator, np
+
+OBJECTIVES = ["TRAFFIC", "CONVERSIONS", "traffic", "Conversions", "AWARENESS", ""]
+MUSIC_OPTIONS = ["EXISTING", "CUSTOM", "NO_MUSIC", "no_music", "SOMETHING", ""]
+
+
+def make_sheet(rows: int, seed: int = 0) -> dict:
+    rng = random.Random(seed)
+    columns = {field: [] for field in ("campaign_name", "objective", "ad_text", "cta", "music_option", "music_id")}
+    for _ in range(rows):
+        columns["campaign_name"].append(rng.choice(["Summer Sale", "Q4", "  ab ", "Launch 2025", ""]))
+        columns["objective"].append(rng.choice(OBJECTIVES))
+        columns["ad_text"].append("x" * rng.choice([0, 20, 60, config.MAX_AD_TEXT_LENGTH, 140]))
+        columns["cta"].append(rng.choice(["Shop Now", "Learn More", "", None]))
+        columns["music_option"].append(rng.choice(MUSIC_OPTIONS))
+        columns["music_id"].append(rng.choice(["M123456789", "", None]))
+    return columns
+
+
+def per_row(columns: dict) -> list:
+    rows = zip(*(columns[field] for field in columns))
+    return [
+        AdValidator.validate_all_fields({
+            "campaign_name": name, "objective": objective, "ad_text": text, "cta": cta,
+            "music_option": option, "music_id": music_id,
+        })
+        for name, objective, text, cta, option, music_id in rows
+    ]
+
+
+def columnar(columns: dict, use_numpy: bool):
+    return AdValidator.validate_batch(
+        columns["campaign_name"], columns["objective"], columns["ad_text"], columns["cta"],
+        columns["music_option"], columns["music_id"], use_numpy=use_numpy
+    )
+
+
+def best_of(repeat: int, fn) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def check_agreement(columns: dict, use_numpy: bool):
+    expected = per_row(columns)
+    result = columnar(columns, use_numpy)
+    for row, (_, errors) in enumerate(expected):
+        if result.errors(row) != errors:
+            raise AssertionError(f"Row {row} differs: {result.errors(row)} != {errors}")
+
+
+def run(sizes: list, repeat: int) -> dict:
+    modes = [False] + ([True] if np is not None else [])
+    check_sheet = make_sheet(5000, seed=1)
+    for use_numpy in modes:
+        check_agreement(check_sheet, use_numpy)
+
+    results = {}
+    for rows in sizes:
+        columns = make_sheet(rows)
+        entry = {"per_row_s": round(best_of(repeat, lambda: per_row(columns)), 4)}
+        entry["batch_lists_s"] = round(best_of(repeat, lambda: columnar(columns, False)), 4)
+        if np is not None:
+            arrays = {field: np.array([v or "" for v in values], dtype=str) for field, values in columns.items()}
+            entry["batch_numpy_s"] = round(best_of(repeat, lambda: columnar(arrays, True)), 4)
+        entry["speedup"] = round(entry["per_row_s"] / min(v for k, v in entry.items() if k.startswith("batch")), 1)
+        results[rows] = entry
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[100_000, 1_000_000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    print(json.dumps(run(args.rows, args.repeat), indent=2))
+
+
+if __name__ == "__main__":
+    main()
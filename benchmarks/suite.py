@@ -0,0 +1,188 @@
+"""Micro-benchmark suite for the agent's per-turn hot paths.
+
+Times validation, the LLM JSON parse/repair path (over the recorded corpus in
+benchmarks/corpus), the rule-based fallback, prompt construction and API
+error interpretation. Results are saved as JSON, keyed by commit, so runs
+from different commits can be compared.
+
+    python -m benchmarks.suite                          # saves benchmarks/results/<commit>.json
+    python -m benchmarks.suite --compare benchmarks/results/abc1234.json
+    python -m benchmarks.suite --filter prompt --time 0.5
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import timeit
+from typing import Callable, Dict, List, Tuple
+from app import TikTokAdAgent
+from benchmarks.bench_json_extract import load_corpus
+from engine import new_collected_data
+from json_utils import extract_json_object
+from prompts import PromptBuilder
+from tiktok_api import TikTokAPI
+from validators import AdValidator
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+VALID_AD = {
+    "campaign_name": "Summer Sale 2025", "objective": "CONVERSIONS", "ad_text": "Up to 50% off everything",
+    "cta": "Shop Now", "music_option": "EXISTING", "music_id": "M123456789",
+}
+INVALID_AD = {
+    "campaign_name": "ab", "objective": "AWARENESS", "ad_text": "x" * 140,
+    "cta": "", "music_option": "NO_MUSIC", "music_id": "",
+}
+HALF_FILLED = {**new_collected_data(), "campaign_name": "Summer Sale 2025", "objective": "TRAFFIC",
+               "ad_text": "Up to 50% off everything"}
+API_ERRORS = [{"code": code, "message": "error"} for code in (40001, 40002, 40003, 40004, 40100, 50000, 99999)]
+
+
+class CorpusClient:
+    """Stands in for the NIM client, replaying recorded LLM outputs in turn"""
+
+    model = "corpus"
+
+    def __init__(self, texts: List[str]):
+        self.texts = texts
+        self.index = 0
+
+    def chat_completion(self, messages: list, **kwargs) -> str:
+        text = self.texts[self.index % len(self.texts)]
+        self.index += 1
+        return text
+
+
+def _fallback_states() -> List[Tuple[str, Dict]]:
+    """(user input, collected data) at every point of the collection flow"""
+    states = []
+    collected = new_collected_data()
+    for field, value in VALID_AD.items():
+        states.append((value, dict(collected)))
+        collected[field] = value
+    return states
+
+
+def build_cases(corpus: List[Dict]) -> Dict[str, Callable[[], object]]:
+    """Benchmark name -> zero-argument callable, one call per operation"""
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        agent = TikTokAdAgent(client=CorpusClient([r["text"] for r in corpus]))
+    # Every call must reach the parser, not the fast path or the response cache
+    agent.fast_path = None
+    agent.response_cache = None
+    api = TikTokAPI(access_token="bench")
+    full, compact = PromptBuilder("full"), PromptBuilder("compact")
+    fallback_states = _fallback_states()
+
+    cases = {
+        "validate_all_fields.valid": lambda: AdValidator.validate_all_fields(VALID_AD),
+        "validate_all_fields.invalid": lambda: AdValidator.validate_all_fields(INVALID_AD),
+        "get_llm_response.corpus": lambda: agent.get_llm_response("Summer Sale", HALF_FILLED),
+        "fallback_response.all_stages": lambda: [agent._get_fallback_response(text, data)
+                                                 for text, data in fallback_states],
+        "prompt.full": lambda: full.build_messages("Shop Now", HALF_FILLED),
+        "prompt.compact": lambda: compact.build_messages("Shop Now", HALF_FILLED),
+        "interpret_api_error.all_codes": lambda: [api.interpret_api_error(e) for e in API_ERRORS],
+    }
+    for record in corpus:
+        text = record["text"]
+        cases[f"llm_parse.{record['name']}"] = (
+            lambda text=text: AdValidator.validate_turn(extract_json_object(text))
+        )
+    return cases
+
+
+def measure(fn: Callable[[], object], min_time: float, rounds: int) -> Dict:
+    """Per-call timings in microseconds over several rounds of a calibrated loop"""
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    per_round = max(1, int(number * min_time / 0.2 / rounds))
+    samples = [t / per_round * 1e6 for t in timer.repeat(repeat=rounds, number=per_round)]
+    return {
+        "mean_us": round(statistics.fmean(samples), 3),
+        "median_us": round(statistics.median(samples), 3),
+        "min_us": round(min(samples), 3),
+        "stdev_us": round(statistics.stdev(samples), 3) if len(samples) > 1 else 0.0,
+        "rounds": rounds,
+        "calls_per_round": per_round,
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True, cwd=os.path.dirname(__file__)).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def run(name_filter: str = None, min_time: float = 0.2, rounds: int = 7) -> Dict:
+    cases = build_cases(load_corpus())
+    results = {}
+    # LLM fallback warnings would otherwise flood the terminal
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        for name, fn in cases.items():
+            if name_filter and name_filter not in name:
+                continue
+            results[name] = measure(fn, min_time, rounds)
+    return {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results,
+    }
+
+
+def print_report(report: Dict, baseline: Dict = None):
+    base = (baseline or {}).get("results", {})
+    header = f"{'benchmark':<44}{'median µs':>12}{'min µs':>10}{'stdev':>9}"
+    if baseline:
+        header += f"{'base µs':>11}{'change':>9}"
+    print(header)
+    for name, r in report["results"].items():
+        line = f"{name:<44}{r['median_us']:>12.2f}{r['min_us']:>10.2f}{r['stdev_us']:>9.2f}"
+        if baseline:
+            previous = base.get(name)
+            if previous:
+                change = r["median_us"] / previous["median_us"] - 1
+                line += f"{previous['median_us']:>11.2f}{change:>+9.1%}"
+            else:
+                line += f"{'-':>11}{'new':>9}"
+        print(line)
+    if baseline:
+        print(f"\nBaseline: commit {baseline.get('commit')} ({baseline.get('timestamp')})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--filter", help="only run benchmarks whose name contains this")
+    parser.add_argument("--time", type=float, default=0.2, help="approximate seconds per benchmark")
+    parser.add_argument("--rounds", type=int, default=7)
+    parser.add_argument("--save", help="results file (default: benchmarks/results/<commit>.json)")
+    parser.add_argument("--no-save", action="store_true")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    args = parser.parse_args()
+
+    report = run(args.filter, args.time, args.rounds)
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+
+    if not args.no_save:
+        path = args.save or os.path.join(RESULTS_DIR, f"{report['commit']}.json")
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nSaved {path}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
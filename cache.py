@@ -0,0 +1,160 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+from config import config
+
+_MISSING = object()
+
+
+class LRUCache:
+    """Thread-safe in-memory LRU cache with size and TTL eviction"""
+
+    def __init__(self, max_entries: int, ttl: Optional[float] = None, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.clock = clock
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key, _MISSING)
+            if entry is _MISSING:
+                self.misses += 1
+                return default
+
+            expires_at, value = entry
+            if expires_at is not None and expires_at <= self.clock():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl: Optional[float] = None):
+        """Store a value; ttl overrides the cache default for this entry"""
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = self.clock() + ttl if ttl is not None else None
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict:
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+class LLMResponseCache:
+    """Two-tier cache for structured LLM turns.
+
+    Keys are a canonical hash of the prompt messages, model and temperature.
+    The first tier is an in-memory LRU; the optional second tier is a sqlite
+    file that survives restarts. Disk hits are promoted to memory.
+    """
+
+    def __init__(self, max_entries: int = None, ttl: float = None, db_path: str = None):
+        self.ttl = ttl or config.LLM_CACHE_TTL_SECONDS
+        self.memory = LRUCache(max_entries or config.LLM_CACHE_MAX_ENTRIES, self.ttl)
+        self.db_path = db_path or config.LLM_CACHE_DB_PATH
+        self.disk_hits = 0
+        self.disk_writes = 0
+        self._db = None
+        self._db_lock = threading.Lock()
+        if self.db_path:
+            self._db = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                "key TEXT PRIMARY KEY, response TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+            self._db.commit()
+
+    @staticmethod
+    def make_key(messages: list, model: str, temperature: float, schema: Dict = None) -> str:
+        """Canonical hash of everything that determines the LLM output.
+
+        ``schema`` is the guided decoding schema, or None when it is off; it
+        also decides how strictly a cached turn was validated.
+        """
+        payload = json.dumps(
+            {"model": model, "temperature": temperature, "schema": schema, "messages": messages},
+            sort_keys=True, separators=(',', ':'), ensure_ascii=False
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict]:
+        raw = self.memory.get(key)
+        if raw is None and self._db is not None:
+            raw = self._get_from_disk(key)
+            if raw is not None:
+                self.disk_hits += 1
+                self.memory.set(key, raw)
+        # Stored as JSON text so callers can't mutate the cached turn
+        return json.loads(raw) if raw is not None else None
+
+    def set(self, key: str, response: Dict):
+        raw = json.dumps(response, separators=(',', ':'), ensure_ascii=False)
+        self.memory.set(key, raw)
+        if self._db is not None:
+            with self._db_lock:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO llm_cache (key, response, created_at) VALUES (?, ?, ?)",
+                    (key, raw, time.time())
+                )
+                self._db.commit()
+            self.disk_writes += 1
+
+    def _get_from_disk(self, key: str) -> Optional[str]:
+        with self._db_lock:
+            row = self._db.execute(
+                "SELECT response, created_at FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            response, created_at = row
+            if created_at + self.ttl <= time.time():
+                self._db.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                self._db.commit()
+                return None
+            return response
+
+    def stats(self) -> Dict:
+        return {
+            **self.memory.stats(),
+            "disk_hits": self.disk_hits,
+            "disk_writes": self.disk_writes,
+        }
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
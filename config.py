@@ -16,25 +16,115 @@ class Config:
     NVIDIA_MODEL = os.getenv("NVIDIA_MODEL", "meta/llama-3.1-8b-instruct")
     
     # TikTok API Configuration (Mocked for this assignment)
-    TIKTOK_API_BASE_URL = "https://ads.tiktok.com/open_api/v1.3"
+    TIKTOK_API_BASE_URL = os.getenv("TIKTOK_API_BASE_URL", "https://ads.tiktok.com/open_api/v1.3")
     TIKTOK_OAUTH_URL = "https://ads.tiktok.com/marketing_api/auth"
+    # "mock" simulates the API in-process; "http" calls TIKTOK_API_BASE_URL
+    TIKTOK_API_MODE = os.getenv("TIKTOK_API_MODE", "mock")
+
+    # Proactive OAuth token refresh: seconds before expiry, and retry interval on failure
+    TOKEN_AUTO_REFRESH = os.getenv("TOKEN_AUTO_REFRESH", "true").lower() == "true"
+    TOKEN_REFRESH_MARGIN = float(os.getenv("TOKEN_REFRESH_MARGIN", "300"))
+    TOKEN_REFRESH_RETRY = float(os.getenv("TOKEN_REFRESH_RETRY", "30"))
+
+    # Persist tokens between runs (0600 file, Fernet-encrypted when TOKEN_STORE_KEY is set)
+    TOKEN_STORE_ENABLED = os.getenv("TOKEN_STORE_ENABLED", "true").lower() == "true"
+    TOKEN_STORE_PATH = os.getenv("TOKEN_STORE_PATH", "~/.tiktok_ads_agent/tokens.json")
+    TOKEN_STORE_KEY = os.getenv("TOKEN_STORE_KEY", "")
+
+    # Conversation checkpoints for resuming sessions (sqlite, WAL); compaction
+    # interval and how long idle sessions are kept, in seconds
+    SESSION_STORE_ENABLED = os.getenv("SESSION_STORE_ENABLED", "true").lower() == "true"
+    SESSION_STORE_PATH = os.getenv("SESSION_STORE_PATH", "~/.tiktok_ads_agent/sessions.db")
+    SESSION_COMPACT_INTERVAL = float(os.getenv("SESSION_COMPACT_INTERVAL", "300"))
+    SESSION_RETENTION = float(os.getenv("SESSION_RETENTION", str(7 * 24 * 3600)))
+
+    # Simulation mode: mocks advance a virtual clock instead of sleeping and draw
+    # outcomes from a seeded RNG
+    SIMULATION_MODE = os.getenv("SIMULATION_MODE", "false").lower() == "true"
+    SIMULATION_SEED = int(os.getenv("SIMULATION_SEED", "0"))
+    
+    # Shared HTTP transport (connection pool size and connect/read timeouts in seconds)
+    HTTP_POOL_CONNECTIONS = int(os.getenv("HTTP_POOL_CONNECTIONS", "4"))
+    HTTP_POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", "32"))
+    HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "3.05"))
+    HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "10"))
     
     # App Configuration
     CLIENT_ID = os.getenv("TIKTOK_CLIENT_ID", "mock_client_id")
     CLIENT_SECRET = os.getenv("TIKTOK_CLIENT_SECRET", "mock_client_secret")
     REDIRECT_URI = "http://localhost:8000/callback"
+    # Capture the authorization code from the REDIRECT_URI redirect instead of asking for it.
+    # Off by default in mock mode, where no real authorization page redirects back.
+    OAUTH_CALLBACK_ENABLED = os.getenv(
+        "OAUTH_CALLBACK_ENABLED", "true" if TIKTOK_API_MODE == "http" else "false"
+    ).lower() == "true"
+    OAUTH_CALLBACK_TIMEOUT = float(os.getenv("OAUTH_CALLBACK_TIMEOUT", "180"))
     
     # Business Rules
     MIN_CAMPAIGN_NAME_LENGTH = 3
     MAX_AD_TEXT_LENGTH = 100
     ALLOWED_OBJECTIVES = ["TRAFFIC", "CONVERSIONS"]
+    MUSIC_ID_PATTERN = r"^M\d{9}$"
     
     # Mock API Responses
     MOCK_MUSIC_IDS = ["M123456789", "M987654321", "M555555555"]
     INVALID_MUSIC_IDS = ["M000000000", "M999999999"]
     
+    # Music metadata cache (found / not-found TTLs in seconds) and batch validation
+    MUSIC_CACHE_POSITIVE_TTL = float(os.getenv("MUSIC_CACHE_POSITIVE_TTL", "3600"))
+    MUSIC_CACHE_NEGATIVE_TTL = float(os.getenv("MUSIC_CACHE_NEGATIVE_TTL", "300"))
+    MUSIC_CACHE_MAX_ENTRIES = int(os.getenv("MUSIC_CACHE_MAX_ENTRIES", "10000"))
+    MUSIC_BATCH_MAX_WORKERS = int(os.getenv("MUSIC_BATCH_MAX_WORKERS", "16"))
+
+    # Campaign submission retries (exponential backoff with full jitter, seconds)
+    RETRY_MAX_ATTEMPTS = int(os.getenv("RETRY_MAX_ATTEMPTS", "5"))
+    RETRY_BASE_DELAY = float(os.getenv("RETRY_BASE_DELAY", "0.5"))
+    RETRY_MAX_DELAY = float(os.getenv("RETRY_MAX_DELAY", "30"))
+    RETRY_MAX_ELAPSED = float(os.getenv("RETRY_MAX_ELAPSED", "120"))
+    # Process-wide submission rate limit (TikTok QPS quota); 0 disables it
+    SUBMIT_QPS = float(os.getenv("SUBMIT_QPS", "10"))
+    SUBMIT_BURST = float(os.getenv("SUBMIT_BURST", "0"))
+    
     # LLM Settings
     LLM_TEMPERATURE = 0.3
     LLM_MAX_TOKENS = 1024
+    # Stream LLM output so user_message renders as it is generated
+    LLM_STREAMING = os.getenv("LLM_STREAMING", "true").lower() == "true"
+    # "full" resends the complete system prompt; "compact" sends a trimmed, prefix-stable one
+    PROMPT_MODE = os.getenv("PROMPT_MODE", "full")
+    # Send the turn JSON schema to NIM guided decoding (nvext.guided_json)
+    LLM_GUIDED_JSON = os.getenv("LLM_GUIDED_JSON", "false").lower() == "true"
+    
+    # Async LLM client: max in-flight requests and per-call deadline (seconds)
+    LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "32"))
+    LLM_CALL_DEADLINE = float(os.getenv("LLM_CALL_DEADLINE", "20"))
+    
+    # Resolve unambiguous slot-fill turns locally instead of calling the LLM
+    FAST_PATH_ENABLED = os.getenv("FAST_PATH_ENABLED", "true").lower() == "true"
+    
+    # LLM response cache (in-memory LRU, optional sqlite tier that survives restarts)
+    LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+    LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "1024"))
+    LLM_CACHE_TTL_SECONDS = float(os.getenv("LLM_CACHE_TTL_SECONDS", "3600"))
+    LLM_CACHE_DB_PATH = os.getenv("LLM_CACHE_DB_PATH")
+    
+    # Multi-session server (server.py): active session cap, waiting queue size,
+    # idle eviction (seconds) and worker threads for blocking calls
+    SERVER_HOST = os.getenv("SERVER_HOST", "127.0.0.1")
+    SERVER_PORT = int(os.getenv("SERVER_PORT", "8081"))
+    SERVER_MAX_SESSIONS = int(os.getenv("SERVER_MAX_SESSIONS", "200"))
+    SERVER_MAX_QUEUED = int(os.getenv("SERVER_MAX_QUEUED", "1000"))
+    SERVER_IDLE_TIMEOUT = float(os.getenv("SERVER_IDLE_TIMEOUT", "900"))
+    SERVER_SWEEP_INTERVAL = float(os.getenv("SERVER_SWEEP_INTERVAL", "30"))
+    SERVER_WORKER_THREADS = int(os.getenv("SERVER_WORKER_THREADS", "64"))
+    
+    # Latency metrics: Prometheus text written to METRICS_FILE on exit and/or
+    # served on METRICS_PORT at /metrics (0 disables the endpoint)
+    METRICS_FILE = os.getenv("METRICS_FILE", "")
+    METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+    
+    # Append every LLM request/response pair to this JSONL corpus for
+    # llm_replay.py (empty disables recording)
+    LLM_RECORD_PATH = os.getenv("LLM_RECORD_PATH", "")
     
 config = Config()
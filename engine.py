@@ -0,0 +1,363 @@
+import asyncio
+import functools
+from typing import Awaitable, Callable, Dict, Generator, List, Tuple
+from validators import AdValidator, COLLECTED_DATA_FIELDS
+from prompts import PromptTemplates
+
+# Conversation stages
+STAGE_COLLECT = "collect"
+STAGE_MUSIC_ID = "music_id"
+STAGE_MUSIC_ID_RECOVERY = "music_id_recovery"
+STAGE_CUSTOM_MUSIC_CONFIRM = "custom_music_confirm"
+STAGE_CUSTOM_MUSIC_PATH = "custom_music_path"
+STAGE_CUSTOM_MUSIC_RECOVERY = "custom_music_recovery"
+STAGE_CONFIRM_SUBMIT = "confirm_submit"
+STAGE_DONE = "done"
+
+# Input prompt shown to the user while the session waits in a stage
+STAGE_PROMPTS = {
+    STAGE_COLLECT: "\nYou: ",
+    STAGE_MUSIC_ID: "Music ID: ",
+    STAGE_MUSIC_ID_RECOVERY: "Choice (1-3): ",
+    STAGE_CUSTOM_MUSIC_CONFIRM: "Upload custom music file? (yes/no): ",
+    STAGE_CUSTOM_MUSIC_PATH: "Enter music file path (simulated): ",
+    STAGE_CUSTOM_MUSIC_RECOVERY: "Choice (1-3): ",
+    STAGE_CONFIRM_SUBMIT: "Submit this ad campaign? (yes/no): ",
+}
+
+# Session outcomes once the stage reaches STAGE_DONE
+OUTCOME_READY = "ready"
+OUTCOME_CANCELLED = "cancelled"
+OUTCOME_INVALID = "invalid"
+
+CANCEL_WORDS = ('quit', 'exit', 'cancel')
+
+
+def new_collected_data() -> Dict:
+    """Empty collected_data dict in collection order"""
+    return {field: "" for field in COLLECTED_DATA_FIELDS}
+
+
+class EngineOutput:
+    """Accumulates the messages produced by a single step"""
+
+    def __init__(self):
+        self.messages: List[Dict] = []
+
+    def add(self, level: str, text: str):
+        self.messages.append({"level": level, "text": text})
+
+    def header(self, title: str):
+        self.add("info", "\n" + "=" * 50)
+        self.add("info", title)
+        self.add("info", "=" * 50)
+
+    def render(self, state: Dict) -> Dict:
+        return {
+            "messages": self.messages,
+            "prompt": STAGE_PROMPTS.get(state["stage"], ""),
+            "finished": state["stage"] == STAGE_DONE,
+        }
+
+
+class ConversationEngine:
+    """Headless state machine behind the ad-creation conversation.
+
+    ``step(state, user_input)`` returns ``(new_state, output)`` and never reads
+    stdin or writes stdout, so one process can drive any number of sessions.
+    Stage handlers are generators that yield the external calls they need
+    (LLM turn, music validation, music upload) and receive the results back,
+    which keeps the transition logic independent of how those calls run.
+    """
+
+    def __init__(self, responder: Callable[[str, Dict], Dict], api,
+                 aresponder: Callable[[str, Dict], Awaitable[Dict]] = None):
+        # responder(user_input, collected_data) -> structured LLM turn
+        self.responder = responder
+        self.api = api
+        # Optional coroutine form of responder, used by astep for non-streamed turns
+        self.aresponder = aresponder
+
+    def new_session(self) -> Tuple[Dict, Dict]:
+        """Create a fresh session state and the greeting output"""
+        state = {
+            "stage": STAGE_COLLECT,
+            "collected_data": new_collected_data(),
+            "ad_payload": None,
+            "outcome": None,
+        }
+        out = EngineOutput()
+        out.header("TikTok Ad Creation")
+        out.add("success", "\n" + PromptTemplates.CONVERSATION_START["user_message"])
+        return state, out.render(state)
+
+    def resume_session(self, state: Dict) -> Dict:
+        """Output re-introducing a checkpointed session where it left off"""
+        out = EngineOutput()
+        out.header("TikTok Ad Creation (resumed)")
+        if state["stage"] != STAGE_DONE:
+            self._show_progress(state, out)
+        return out.render(state)
+
+    def step(self, state: Dict, user_input: str, on_token: Callable[[str], None] = None) -> Tuple[Dict, Dict]:
+        """Advance a session by one user input
+
+        on_token, if given, receives the assistant message incrementally while
+        the LLM is still generating it.
+        """
+        transition = self.transition(state, user_input)
+        result = None
+        try:
+            while True:
+                call = transition.send(result)
+                result = self.perform(call, on_token)
+        except StopIteration as stop:
+            return stop.value
+
+    async def astep(self, state: Dict, user_input: str, on_token: Callable[[str], None] = None,
+                    executor=None) -> Tuple[Dict, Dict]:
+        """Async step for serving many sessions from one event loop
+
+        Non-streamed LLM turns await aresponder; everything else blocks, so it
+        runs in executor. on_token is then called from a worker thread.
+        """
+        transition = self.transition(state, user_input)
+        result = None
+        try:
+            while True:
+                call = transition.send(result)
+                result = await self.aperform(call, on_token, executor)
+        except StopIteration as stop:
+            return stop.value
+
+    async def aperform(self, call: Tuple, on_token: Callable[[str], None] = None, executor=None) -> object:
+        if call[0] == "llm" and on_token is None and self.aresponder is not None:
+            return await self.aresponder(*call[1:])
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, functools.partial(self.perform, call, on_token))
+
+    def perform(self, call: Tuple, on_token: Callable[[str], None] = None) -> object:
+        """Execute an external call requested by a stage handler"""
+        kind, args = call[0], call[1:]
+        if kind == "llm":
+            if on_token is not None:
+                return self.responder(*args, on_token=on_token)
+            return self.responder(*args)
+        if kind == "validate_music_id":
+            return self.api.validate_music_id(*args)
+        if kind == "upload_custom_music":
+            return self.api.upload_custom_music(*args)
+        raise ValueError(f"Unknown engine call: {kind}")
+
+    def transition(self, state: Dict, user_input: str) -> Generator[Tuple, object, Tuple[Dict, Dict]]:
+        """Pure transition: yields external calls, returns (new_state, output)"""
+        state = {**state, "collected_data": dict(state["collected_data"])}
+        out = EngineOutput()
+        user_input = (user_input or "").strip()
+
+        if state["stage"] == STAGE_DONE:
+            return state, out.render(state)
+
+        handler = getattr(self, f"_on_{state['stage']}")
+        effects = handler(state, user_input, out)
+        if effects is not None:
+            yield from effects
+
+        return state, out.render(state)
+
+    # ----- stage handlers -------------------------------------------------
+
+    def _on_collect(self, state: Dict, user_input: str, out: EngineOutput):
+        if user_input.lower() in CANCEL_WORDS:
+            out.add("warning", "Ad creation cancelled.")
+            self._finish(state, OUTCOME_CANCELLED)
+            return
+
+        collected_data = state["collected_data"]
+        llm_response = yield ("llm", user_input, dict(collected_data))
+
+        if llm_response.get("collected_data"):
+            collected_data.update(llm_response["collected_data"])
+
+        out.add("assistant", llm_response.get('user_message', ''))
+
+        next_step = (llm_response.get("next_step") or "").lower()
+
+        # "submission" still goes through validation and the user's confirmation
+        if next_step in ("validation", "submission"):
+            self._validate(state, out)
+            return
+        elif next_step == "ask_music_id":
+            # Music ID already given in the turn: validate it without re-asking
+            music_id = collected_data.get('music_id', '')
+            if AdValidator.validate_music_id_format(music_id)[0]:
+                yield from self._check_music_id(state, music_id, out)
+            else:
+                self._enter(state, STAGE_MUSIC_ID, out)
+            return
+        elif next_step == "ask_custom_music":
+            self._enter(state, STAGE_CUSTOM_MUSIC_CONFIRM, out)
+            return
+
+        self._show_progress(state, out)
+
+    def _on_music_id(self, state: Dict, user_input: str, out: EngineOutput):
+        if not user_input:
+            self._back_to_collect(state, out)
+            return
+
+        yield from self._check_music_id(state, user_input, out)
+
+    def _check_music_id(self, state: Dict, music_id: str, out: EngineOutput):
+        out.add("status", "\nValidating music ID with TikTok API...")
+        is_valid, status, details = yield ("validate_music_id", music_id)
+        details = details or {}
+
+        if is_valid:
+            out.add("success", f"✓ Music ID validated: {details.get('title', 'Unknown Track')}")
+            state["collected_data"]['music_id'] = music_id
+            state["collected_data"]['music_option'] = 'EXISTING'
+            self._back_to_collect(state, out)
+        else:
+            state["collected_data"]['music_id'] = ''
+            out.add("error", f"✗ Music validation failed: {status}")
+            out.add("warning", f"   Details: {details.get('message', 'Unknown error')}")
+            out.add("info", "\nWhat would you like to do?")
+            out.add("plain", "1. Try a different Music ID")
+            out.add("plain", "2. Upload custom music")
+            out.add("plain", "3. Skip music (if allowed)")
+            state["stage"] = STAGE_MUSIC_ID_RECOVERY
+
+    def _on_music_id_recovery(self, state: Dict, user_input: str, out: EngineOutput):
+        if user_input == "1":
+            self._enter(state, STAGE_MUSIC_ID, out)
+        elif user_input == "2":
+            self._enter(state, STAGE_CUSTOM_MUSIC_CONFIRM, out)
+        elif user_input == "3":
+            if self._skip_music(state):
+                out.add("success", "✓ Music skipped")
+                self._back_to_collect(state, out)
+            else:
+                out.add("error", f"✗ Cannot skip music: {self._skip_music_message(state)}")
+                self._enter(state, STAGE_MUSIC_ID, out)
+        else:
+            self._back_to_collect(state, out)
+
+    def _on_custom_music_confirm(self, state: Dict, user_input: str, out: EngineOutput):
+        if user_input.lower() == 'yes':
+            state["stage"] = STAGE_CUSTOM_MUSIC_PATH
+        else:
+            out.add("status", "\nLet's explore other music options...")
+            self._enter(state, STAGE_MUSIC_ID, out)
+
+    def _on_custom_music_path(self, state: Dict, user_input: str, out: EngineOutput):
+        out.add("status", "\nUploading music to TikTok...")
+        success, status, music_id = yield ("upload_custom_music", user_input)
+
+        if success and music_id:
+            out.add("success", f"✓ Music uploaded successfully! Music ID: {music_id}")
+            state["collected_data"]['music_id'] = music_id
+            state["collected_data"]['music_option'] = 'CUSTOM'
+            self._back_to_collect(state, out)
+        else:
+            out.add("error", f"✗ Upload failed: {status}")
+            out.add("info", "\nOptions:")
+            out.add("plain", "1. Try uploading again")
+            out.add("plain", "2. Use existing music instead")
+            out.add("plain", "3. Skip music (if allowed)")
+            state["stage"] = STAGE_CUSTOM_MUSIC_RECOVERY
+
+    def _on_custom_music_recovery(self, state: Dict, user_input: str, out: EngineOutput):
+        if user_input == "1":
+            self._enter(state, STAGE_CUSTOM_MUSIC_CONFIRM, out)
+        elif user_input == "2":
+            self._enter(state, STAGE_MUSIC_ID, out)
+        elif user_input == "3":
+            if self._skip_music(state):
+                out.add("success", "✓ Proceeding without music")
+                self._back_to_collect(state, out)
+            else:
+                out.add("error", f"✗ Cannot proceed: {self._skip_music_message(state)}")
+                self._enter(state, STAGE_CUSTOM_MUSIC_CONFIRM, out)
+        else:
+            self._back_to_collect(state, out)
+
+    def _on_confirm_submit(self, state: Dict, user_input: str, out: EngineOutput):
+        if user_input.lower() == 'yes':
+            state["ad_payload"] = dict(state["collected_data"])
+            self._finish(state, OUTCOME_READY)
+        else:
+            out.add("warning", "Submission cancelled.")
+            self._finish(state, OUTCOME_CANCELLED)
+
+    # ----- helpers ----------------------------------------------------------
+
+    def _enter(self, state: Dict, stage: str, out: EngineOutput):
+        """Move to a sub-flow stage and emit its introduction"""
+        state["stage"] = stage
+        if stage == STAGE_MUSIC_ID:
+            out.add("info", "\nPlease enter the TikTok Music ID:")
+        elif stage == STAGE_CUSTOM_MUSIC_CONFIRM:
+            out.add("info", "\nCustom Music Upload")
+            out.add("plain", "For this demo, we'll simulate the upload process.")
+
+    def _back_to_collect(self, state: Dict, out: EngineOutput):
+        state["stage"] = STAGE_COLLECT
+        self._show_progress(state, out)
+
+    def _finish(self, state: Dict, outcome: str):
+        state["stage"] = STAGE_DONE
+        state["outcome"] = outcome
+
+    def _skip_music(self, state: Dict) -> bool:
+        """Select NO_MUSIC if the objective allows it"""
+        is_allowed, _ = AdValidator.validate_music_logic(
+            state["collected_data"].get('objective', ''),
+            'NO_MUSIC'
+        )
+        if is_allowed:
+            state["collected_data"]['music_option'] = 'NO_MUSIC'
+        return is_allowed
+
+    def _skip_music_message(self, state: Dict) -> str:
+        _, message = AdValidator.validate_music_logic(
+            state["collected_data"].get('objective', ''),
+            'NO_MUSIC'
+        )
+        return message
+
+    def _validate(self, state: Dict, out: EngineOutput):
+        """Validate collected data and ask for submission confirmation"""
+        collected_data = state["collected_data"]
+        out.header("Validation & Submission")
+
+        is_valid, errors = AdValidator.validate_all_fields(collected_data)
+
+        if not is_valid:
+            out.add("error", "\n✗ Validation Errors Found:")
+            for field, error in errors.items():
+                out.add("error", f"   • {field}: {error}")
+            out.add("warning", "\nPlease correct the errors above.")
+            self._finish(state, OUTCOME_INVALID)
+            return
+
+        out.add("success", "\n✓ All validations passed!")
+        out.add("info", "\nFinal Ad Configuration:")
+        out.add("info", "-" * 30)
+        for key, value in collected_data.items():
+            if value:
+                out.add("plain", f"{key.replace('_', ' ').title()}: {value}")
+        out.add("info", "\n" + "-" * 30)
+        state["stage"] = STAGE_CONFIRM_SUBMIT
+
+    def _show_progress(self, state: Dict, out: EngineOutput):
+        """Show current progress in data collection"""
+        collected_data = state["collected_data"]
+        completed = sum(1 for v in collected_data.values() if v)
+        total = len(collected_data)
+
+        out.add("progress", f"\n[Progress: {completed}/{total} fields collected]")
+
+        missing = [k.replace('_', ' ').title() for k, v in collected_data.items() if not v]
+        if missing:
+            out.add("progress", f"  Still needed: {', '.join(missing)}")
@@ -0,0 +1,299 @@
+import re
+from typing import Dict, Optional
+from config import config
+from validators import AdValidator
+
+# Inputs that look like chit-chat rather than a slot value
+CONVERSATIONAL_INPUTS = {
+    "hi", "hello", "hey", "help", "yes", "no", "ok", "okay", "thanks",
+    "thank you", "why", "what", "how", "back", "undo", "start over",
+}
+
+# Greetings and acknowledgements: input opening with one is chit-chat, not a value
+GREETING_PHRASES = (
+    "hi", "hello", "hey", "hiya", "howdy", "yo", "greetings", "good morning", "good afternoon",
+    "good evening", "good day", "thanks", "thank you", "thx", "ty", "cheers", "ok", "okay", "alright",
+    "yeah", "yep",
+)
+
+# Words that mark a free-text answer as a sentence about the ad, not the value itself
+CONVERSATIONAL_WORDS = {
+    "i", "i'm", "im", "i'd", "i'll", "i've", "me", "my", "we", "we'd", "we're", "let's", "lets",
+    "want", "need", "please", "know", "think", "maybe", "not", "no", "don't", "dont", "can't",
+    "cant", "won't", "wont", "never", "idk",
+}
+QUESTION_WORDS = {"what", "how", "why", "which", "who", "can", "could", "should", "would", "is", "are", "do", "does"}
+
+# Explicit "field: value" answers for the free-text slots
+EXPLICIT_FIELD = re.compile(r"^\s*(campaign[ _]name|name|ad[ _]text|text|cta|call[ -]to[ -]action)\s*[:=]\s*(.+)$",
+                            re.IGNORECASE | re.DOTALL)
+EXPLICIT_FIELD_NAMES = {
+    "campaign name": "campaign_name", "campaign_name": "campaign_name", "name": "campaign_name",
+    "ad text": "ad_text", "ad_text": "ad_text", "text": "ad_text",
+    "cta": "cta", "call to action": "cta", "call-to-action": "cta",
+}
+
+MAX_CAMPAIGN_NAME_WORDS = 6
+MAX_CTA_WORDS = 4
+MAX_CTA_LENGTH = 30
+
+EXISTING_MUSIC_INPUTS = {"1", "existing", "existing music", "use existing music"}
+CUSTOM_MUSIC_INPUTS = {"2", "custom", "custom music", "upload", "upload custom music"}
+NO_MUSIC_INPUTS = {"3", "no music", "no_music", "none", "skip", "skip music"}
+# Confirmations that move a fully collected ad on to validation
+READY_INPUTS = {"done", "yes", "ok", "okay", "submit", "continue", "next", "looks good", "that's all"}
+
+
+class FastPathParser:
+    """Resolve unambiguous slot-fill turns locally, without an LLM call.
+
+    Follows the collection order from the system prompt (campaign_name,
+    objective, ad_text, cta, music) and the AdValidator rules. Returns a turn
+    in the same shape as the LLM response, or None when the input is
+    ambiguous and the LLM should handle it.
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self) -> Dict:
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hit_rate}
+
+    def resolve(self, user_input: str, collected_data: Dict) -> Optional[Dict]:
+        """Return a structured turn for unambiguous input, else None"""
+        response = self._resolve(user_input.strip(), collected_data)
+        if response is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return response
+
+    def _resolve(self, text: str, collected_data: Dict) -> Optional[Dict]:
+        if text.lower() in READY_INPUTS and _is_complete(collected_data):
+            return _turn(
+                "Perfect! I have all the information. Let me validate everything.",
+                "Fast path: All fields collected. Ready for validation.",
+                collected_data,
+                "validation"
+            )
+        if not text or "?" in text or _normalise(text) in CONVERSATIONAL_INPUTS or _is_greeting(text):
+            return None
+
+        # Free-text slots take any wording, so only plain values or "field: value" are safe
+        field, value = _explicit_field(text)
+        if field is None and _is_conversational(text):
+            value = None
+
+        if not collected_data.get("campaign_name"):
+            return self._campaign_name(value, collected_data) if field in (None, "campaign_name") and value else None
+        elif not collected_data.get("objective"):
+            return self._objective(text, collected_data)
+        elif not collected_data.get("ad_text"):
+            return self._ad_text(value, collected_data) if field in (None, "ad_text") and value else None
+        elif not collected_data.get("cta"):
+            return self._cta(value, collected_data) if field in (None, "cta") and value else None
+        elif not collected_data.get("music_option"):
+            return self._music(text, collected_data)
+        return None
+
+    def _campaign_name(self, text: str, collected_data: Dict) -> Optional[Dict]:
+        is_valid, _ = AdValidator.validate_campaign_name(text)
+        if not is_valid or len(text.split()) > MAX_CAMPAIGN_NAME_WORDS:
+            return None
+        return _turn(
+            "Great! Now what's your campaign objective? (Choose: TRAFFIC or CONVERSIONS)",
+            f"Fast path: '{text}' accepted as campaign name. Need objective.",
+            {**collected_data, "campaign_name": text},
+            "objective"
+        )
+
+    def _objective(self, text: str, collected_data: Dict) -> Optional[Dict]:
+        objective = text.upper()
+        is_valid, _ = AdValidator.validate_objective(objective)
+        if not is_valid:
+            return None
+        return _turn(
+            f"Objective set to {objective}. Now please write your ad text (max {config.MAX_AD_TEXT_LENGTH} characters):",
+            f"Fast path: Objective {objective} collected. Need ad text.",
+            {**collected_data, "objective": objective},
+            "ad_text"
+        )
+
+    def _ad_text(self, text: str, collected_data: Dict) -> Optional[Dict]:
+        is_valid, _ = AdValidator.validate_ad_text(text)
+        if not is_valid:
+            return None
+        return _turn(
+            "Now what call-to-action would you like? (e.g., 'Shop Now', 'Learn More', 'Sign Up'):",
+            "Fast path: Ad text collected. Need CTA.",
+            {**collected_data, "ad_text": text},
+            "cta"
+        )
+
+    def _cta(self, text: str, collected_data: Dict) -> Optional[Dict]:
+        if len(text) > MAX_CTA_LENGTH or len(text.split()) > MAX_CTA_WORDS:
+            return None
+        collected_data = {**collected_data, "cta": text}
+        return _turn(
+            _music_question(collected_data),
+            "Fast path: CTA collected. Need music option.",
+            collected_data,
+            "music"
+        )
+
+    def _music(self, text: str, collected_data: Dict) -> Optional[Dict]:
+        choice = text.lower()
+        objective = collected_data.get("objective", "").upper()
+
+        is_music_id, _ = AdValidator.validate_music_id_format(text.upper())
+        if is_music_id:
+            return _turn(
+                "Got it, let me check that Music ID with TikTok.",
+                "Fast path: User provided an existing Music ID directly.",
+                {**collected_data, "music_option": "EXISTING", "music_id": text.upper()},
+                "ask_music_id"
+            )
+        if choice in EXISTING_MUSIC_INPUTS:
+            return _turn(
+                "Great, let's use existing TikTok music.",
+                "Fast path: User chose existing music. Need Music ID.",
+                {**collected_data, "music_option": "EXISTING"},
+                "ask_music_id"
+            )
+        if choice in CUSTOM_MUSIC_INPUTS:
+            return _turn(
+                "Great, let's upload your custom music.",
+                "Fast path: User chose custom music upload.",
+                {**collected_data, "music_option": "CUSTOM"},
+                "ask_custom_music"
+            )
+        if choice in NO_MUSIC_INPUTS:
+            is_allowed, message = AdValidator.validate_music_logic(objective, "NO_MUSIC")
+            if not is_allowed:
+                return _turn(
+                    f"{message}. Choose: 1) Use existing TikTok music, 2) Upload custom music",
+                    f"Fast path: No music rejected for {objective} objective.",
+                    collected_data,
+                    "music"
+                )
+            return _turn(
+                "Perfect! I have all the information. Let me validate everything.",
+                f"Fast path: No music allowed for {objective or 'this'} objective. Ready for validation.",
+                {**collected_data, "music_option": "NO_MUSIC"},
+                "validation"
+            )
+        return None
+
+
+def _explicit_field(text: str):
+    """(field, value) for a "field: value" answer, else (None, text)"""
+    match = EXPLICIT_FIELD.match(text)
+    if not match:
+        return None, text
+    name = re.sub(r"\s+", " ", match.group(1).lower())
+    return EXPLICIT_FIELD_NAMES[name], match.group(2).strip()
+
+
+def _normalise(text: str) -> str:
+    """Lower-cased words, with punctuation dropped"""
+    return " ".join(re.findall(r"[a-z0-9']+", text.lower().replace("’", "'")))
+
+
+def _is_greeting(text: str) -> bool:
+    """Input that opens with a greeting or acknowledgement, like "hello there" or "Thanks!" """
+    normalised = _normalise(text)
+    return any(normalised == phrase or normalised.startswith(phrase + " ") for phrase in GREETING_PHRASES)
+
+
+def _is_conversational(text: str) -> bool:
+    """Questions, first-person phrasing and negations, which need the LLM to interpret"""
+    words = re.findall(r"[a-z']+", text.lower().replace("’", "'"))
+    if not words:
+        return False
+    return words[0].split("'")[0] in QUESTION_WORDS or any(word in CONVERSATIONAL_WORDS for word in words)
+
+
+def _is_complete(collected_data: Dict) -> bool:
+    """Every field collected, with a music ID unless music was skipped"""
+    required = ("campaign_name", "objective", "ad_text", "cta", "music_option")
+    if not all(collected_data.get(field) for field in required):
+        return False
+    return collected_data["music_option"].upper() == "NO_MUSIC" or bool(collected_data.get("music_id"))
+
+
+def _music_question(collected_data: Dict) -> str:
+    if collected_data.get("objective", "").upper() == "CONVERSIONS":
+        return "For CONVERSIONS objective, music is required. Choose: 1) Use existing TikTok music, 2) Upload custom music"
+    return "For music, choose: 1) Use existing TikTok music, 2) Upload custom music, 3) No music"
+
+
+def _turn(user_message: str, internal_reasoning: str, collected_data: Dict, next_step: str) -> Dict:
+    return {
+        "user_message": user_message,
+        "internal_reasoning": internal_reasoning,
+        "collected_data": collected_data,
+        "next_step": next_step
+    }
+
+
+def fallback_response(user_input: str, collected_data: Dict) -> Dict:
+    """Rule-based turn used when the LLM fails"""
+    if not collected_data.get("campaign_name"):
+        return {
+            "user_message": "Let's start with your campaign name. What would you like to name it?",
+            "internal_reasoning": "Fallback: Asking for campaign name",
+            "collected_data": {"campaign_name": user_input} if user_input else collected_data,
+            "next_step": "campaign_name" if not user_input else "objective"
+        }
+    elif not collected_data.get("objective"):
+        return {
+            "user_message": "Great! Now what's your campaign objective? (Choose: TRAFFIC or CONVERSIONS)",
+            "internal_reasoning": f"Fallback: User provided campaign name '{user_input if user_input else collected_data.get('campaign_name')}'. Need objective.",
+            "collected_data": {**collected_data, "objective": user_input.upper() if user_input else ""},
+            "next_step": "objective" if not user_input else "ad_text"
+        }
+    elif not collected_data.get("ad_text"):
+        return {
+            "user_message": f"Objective set. Now please write your ad text (max 100 characters):",
+            "internal_reasoning": f"Fallback: Objective collected. Need ad text.",
+            "collected_data": {**collected_data, "ad_text": user_input if user_input else ""},
+            "next_step": "ad_text" if not user_input else "cta"
+        }
+    elif not collected_data.get("cta"):
+        return {
+            "user_message": "Now what call-to-action would you like? (e.g., 'Shop Now', 'Learn More', 'Sign Up'):",
+            "internal_reasoning": "Fallback: Ad text collected. Need CTA.",
+            "collected_data": {**collected_data, "cta": user_input if user_input else ""},
+            "next_step": "cta" if not user_input else "music"
+        }
+    elif not collected_data.get("music_option"):
+        # Determine if music is required
+        objective = collected_data.get("objective", "").upper()
+        if objective == "CONVERSIONS":
+            return {
+                "user_message": "For CONVERSIONS objective, music is required. Choose: 1) Use existing TikTok music, 2) Upload custom music",
+                "internal_reasoning": "Fallback: Music required for CONVERSIONS. Need music option.",
+                "collected_data": collected_data,
+                "next_step": "music"
+            }
+        else:
+            return {
+                "user_message": "For music, choose: 1) Use existing TikTok music, 2) Upload custom music, 3) No music",
+                "internal_reasoning": "Fallback: Music optional for TRAFFIC. Need music option.",
+                "collected_data": collected_data,
+                "next_step": "music"
+            }
+    else:
+        # All fields collected, ready for validation
+        return {
+            "user_message": "Perfect! I have all the information. Let me validate everything.",
+            "internal_reasoning": "Fallback: All fields collected. Ready for validation.",
+            "collected_data": collected_data,
+            "next_step": "validation"
+        }
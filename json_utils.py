@@ -0,0 +1,263 @@
+import json
+from typing import Dict, List, Optional, Tuple
+from metrics import counter
+
+# extract_json_object calls by the last path tried ("kind") and whether it
+# produced an object ("outcome": recovered or failed):
+#   direct    - the whole text was one JSON object
+#   embedded  - first complete object found inside surrounding prose/fences
+#   truncated - unterminated object cut back to its last complete member
+#               (e.g. cut off by LLM_MAX_TOKENS)
+#   none      - empty text or no "{" at all
+JSON_REPAIRS = counter("json_repairs_total", "LLM JSON extraction attempts, by repair kind and outcome")
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = ' \t\n\r'
+
+# JSON string escape sequences (other than \uXXXX)
+_ESCAPES = {'"': '"', '\\': '\\', '/': '/', 'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t'}
+
+
+class JSONStringFieldScanner:
+    """Incrementally extract one top-level string field from streamed JSON.
+
+    Feed raw text chunks as they arrive; ``feed`` returns the newly decoded
+    characters of the field value, so the caller can render it before the
+    rest of the object has been generated. Braces and quotes inside other
+    strings are tracked, so nested objects and prose don't confuse it.
+    """
+
+    def __init__(self, field: str):
+        self.field = field
+        self.value = ""
+        self.done = False
+        self._depth = 0
+        self._at_key = False
+        self._last_key = None
+        self._in_string = False
+        self._role = None  # "key", "capture" or None for the current string
+        self._key_chars: List[str] = []
+        self._escape = False
+        self._unicode = None  # hex digits of a pending \uXXXX escape
+        self._high_surrogate = None
+        self._emitted: List[str] = []
+
+    def feed(self, chunk: str) -> str:
+        """Consume a chunk and return newly decoded field characters"""
+        self._emitted = []
+        for ch in chunk:
+            if self.done:
+                break
+            if self._in_string:
+                self._string_char(ch)
+            elif ch == '"':
+                self._start_string()
+            elif ch in '{[':
+                self._depth += 1
+                self._at_key = self._depth == 1 and ch == '{'
+            elif ch in '}]':
+                self._depth -= 1
+            elif self._depth == 1 and ch == ':':
+                self._at_key = False
+            elif self._depth == 1 and ch == ',':
+                self._at_key = True
+
+        text = "".join(self._emitted)
+        self.value += text
+        return text
+
+    def _start_string(self):
+        self._in_string = True
+        if self._depth != 1:
+            self._role = None
+        elif self._at_key:
+            self._role = "key"
+            self._key_chars = []
+        elif self._last_key == self.field:
+            self._role = "capture"
+        else:
+            self._role = None
+
+    def _string_char(self, ch: str):
+        if self._unicode is not None:
+            self._unicode += ch
+            if len(self._unicode) == 4:
+                try:
+                    code = int(self._unicode, 16)
+                except ValueError:
+                    code = 0xFFFD
+                self._unicode = None
+                self._code_point(code)
+            return
+        if self._escape:
+            self._escape = False
+            if ch == 'u':
+                self._unicode = ""
+            else:
+                self._append(_ESCAPES.get(ch, ch))
+            return
+        if ch == '\\':
+            self._escape = True
+        elif ch == '"':
+            self._end_string()
+        else:
+            self._append(ch)
+
+    def _code_point(self, code: int):
+        if 0xD800 <= code <= 0xDBFF:
+            self._high_surrogate = code
+            return
+        if self._high_surrogate is not None and 0xDC00 <= code <= 0xDFFF:
+            code = 0x10000 + ((self._high_surrogate - 0xD800) << 10) + (code - 0xDC00)
+        self._high_surrogate = None
+        self._append(chr(code))
+
+    def _append(self, text: str):
+        if self._role == "key":
+            self._key_chars.append(text)
+        elif self._role == "capture":
+            self._emitted.append(text)
+
+    def _end_string(self):
+        self._in_string = False
+        if self._role == "key":
+            self._last_key = "".join(self._key_chars)
+        elif self._role == "capture":
+            self.done = True
+        self._role = None
+
+
+def extract_json_object(text: str) -> Optional[Dict]:
+    """Recover the first JSON object from LLM output in a single pass.
+
+    Braces are matched while respecting string literals; every balanced
+    top-level candidate is handed to ``raw_decode`` and the first that parses
+    to a dict wins. If the text ends inside an object, it is cut back to the
+    last complete member and the open brackets are closed.
+    """
+    return parse_json_object(text)[0]
+
+
+def parse_json_object(text: str) -> Tuple[Optional[Dict], str]:
+    """extract_json_object plus the path that recovered the object.
+
+    The path is "direct", "embedded", "truncated" or "failed". A truncated
+    object is missing members the model never finished, so callers should
+    not cache it.
+    """
+    obj, kind = _parse(text)
+    if obj is None:
+        JSON_REPAIRS.inc(kind=kind, outcome="failed")
+        return None, "failed"
+    JSON_REPAIRS.inc(kind=kind, outcome="recovered")
+    return obj, kind
+
+
+def _parse(text: str) -> Tuple[Optional[Dict], str]:
+    if not text:
+        return None, "none"
+
+    stripped = text.strip(_WHITESPACE)
+    if stripped.startswith('{'):
+        try:
+            obj = json.loads(stripped)
+            if isinstance(obj, dict):
+                return obj, "direct"
+        except ValueError:
+            pass
+
+    # Common case: prose or a code fence around one complete object
+    first = text.find('{')
+    if first == -1:
+        return None, "none"
+    try:
+        obj, _ = _decoder.raw_decode(text, first)
+        if isinstance(obj, dict):
+            return obj, "embedded"
+    except ValueError:
+        pass
+
+    return _scan(text, first)
+
+
+def _scan(text: str, begin: int) -> Tuple[Optional[Dict], str]:
+    stack: List[str] = []  # expected closers for the open brackets
+    start = -1
+    in_string = False
+    escape = False
+    string_is_key = False
+    last_sig = ''
+    # (position, closers) after the last complete top-level member
+    cut_point = None
+
+    for i in range(begin, len(text)):
+        ch = text[i]
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == '\\':
+                escape = True
+            elif ch == '"':
+                in_string = False
+                last_sig = '"'
+                # A closed value string completes a top-level member
+                if not string_is_key and len(stack) == 1:
+                    cut_point = (i + 1, '}')
+            continue
+
+        if not stack:
+            if ch == '{':
+                start = i
+                stack.append('}')
+                last_sig = '{'
+                cut_point = (i + 1, '}')
+            continue
+
+        if ch == '"':
+            in_string = True
+            string_is_key = stack[-1] == '}' and last_sig in '{,'
+        elif ch in '{[':
+            stack.append('}' if ch == '{' else ']')
+            last_sig = ch
+        elif ch in '}]':
+            stack.pop()
+            last_sig = ch
+            if not stack:
+                try:
+                    obj, _ = _decoder.raw_decode(text, start)
+                except ValueError:
+                    continue
+                if isinstance(obj, dict):
+                    return obj, "embedded"
+            elif len(stack) == 1:
+                cut_point = (i + 1, '}')
+        elif ch == ',':
+            if len(stack) == 1:
+                cut_point = (i, '}')
+            last_sig = ch
+        elif ch not in _WHITESPACE:
+            last_sig = ch
+
+    if not stack:
+        return None, "embedded"
+    return _close_truncated(text, start, cut_point), "truncated"
+
+
+def _close_truncated(text: str, start: int, cut_point) -> Optional[Dict]:
+    """Close an object cut off mid-stream after its last complete member.
+
+    Partial strings, numbers, literals and nested objects are dropped rather
+    than closed, since closing them would invent values ("valid" for
+    "validation", {} for "tru", half of collected_data).
+    """
+    if cut_point is None:
+        return None
+    position, closers = cut_point
+    body = text[start:position].rstrip(_WHITESPACE)
+    if body.endswith(','):
+        body = body[:-1]
+    try:
+        obj = json.loads(body + closers)
+    except ValueError:
+        return None
+    return obj if isinstance(obj, dict) else None
@@ -0,0 +1,44 @@
+"""Recording of NVIDIA NIM chat completions for replay.
+
+With LLM_RECORD_PATH set, the NIM clients append every request/response
+pair to a JSONL corpus, keyed by prompt_key(). llm_replay.py serves the
+corpus back. This module only needs the standard library, so the clients
+can import it without pulling in the replay server.
+"""
+import hashlib
+import json
+import threading
+from typing import Dict, List
+
+
+def prompt_key(messages: List[Dict]) -> str:
+    """Hash of the prompt messages; model and sampling settings are ignored"""
+    payload = json.dumps([{"role": m.get("role"), "content": m.get("content")} for m in messages],
+                         sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMRecorder:
+    """Appends request/response pairs to a JSONL corpus; safe across threads"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def record(self, messages: List[Dict], response: str, model: str, duration: float,
+               ttft: float = None, usage=None, stream: bool = False):
+        record = {
+            "key": prompt_key(messages),
+            "model": model,
+            "prompt": (messages[-1].get("content") or "")[-200:] if messages else "",
+            "response": response,
+            "stream": stream,
+            "ttft": round(ttft if ttft is not None else duration, 4),
+            "duration": round(duration, 4),
+            "prompt_tokens": getattr(usage, "prompt_tokens", None),
+            "completion_tokens": getattr(usage, "completion_tokens", None),
+        }
+        line = json.dumps(record, separators=(',', ':'), ensure_ascii=False) + "\n"
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line)
@@ -0,0 +1,307 @@
+"""Record/replay stand-in for the NVIDIA NIM chat completions API.
+
+Recording: with LLM_RECORD_PATH set, NVIDIAAIClient appends every
+request/response pair to a JSONL corpus (llm_recorder.py). Each record holds the prompt hash,
+the reply text, token usage and the observed timing (time to first token and
+total duration).
+
+Replaying: ReplayServer speaks the OpenAI-compatible /v1/chat/completions
+protocol, streaming (SSE) and non-streaming. It replays recorded replies with
+their recorded timing, delivered token by token. Prompts that are not in the
+corpus get a turn synthesized from the fast-path and fallback rules, with
+modelled timing. Timing is deterministic, so runs can be compared.
+
+    LLM_RECORD_PATH=llm_corpus.jsonl python app.py
+    python llm_replay.py serve --corpus llm_corpus.jsonl --port 8090
+    NVIDIA_BASE_URL=http://127.0.0.1:8090/v1 NVIDIA_API_KEY=replay python app.py
+    python llm_replay.py compact llm_corpus.jsonl
+"""
+import argparse
+import json
+import os
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from engine import new_collected_data
+from fast_path import FastPathParser, fallback_response
+from llm_recorder import prompt_key
+from rules import validate_field
+
+DEFAULT_TTFT = 0.35
+DEFAULT_TOKENS_PER_SEC = 60.0
+CHARS_PER_TOKEN = 4
+
+# Where the collected data and user input sit in the "full" and "compact" prompts
+_FULL_PROMPT = re.compile(r"Current collected data: (\{.*\})\n\nUser says: (.*)\Z", re.DOTALL)
+_COMPACT_PROMPT = re.compile(r"State:(\{.*\})\nMissing:[^\n]*\nUser says: (.*)\Z", re.DOTALL)
+
+# The step that asks for a field again, where it isn't the field name
+_FIELD_STEPS = {"music_option": "music", "music_id": "ask_music_id"}
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, len(text or "") // CHARS_PER_TOKEN)
+
+
+def load_corpus(path: str) -> Dict[str, Dict]:
+    """Records by prompt key; the latest recording of a prompt wins"""
+    corpus = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                corpus[record["key"]] = record
+    return corpus
+
+
+def compact_corpus(path: str, output: str = None) -> Tuple[int, int]:
+    """Rewrite a corpus keeping one record per prompt; returns (lines read, records kept)"""
+    with open(path, encoding="utf-8") as f:
+        lines = sum(1 for line in f if line.strip())
+    corpus = load_corpus(path)
+    output = output or path
+    tmp_path = output + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        for record in corpus.values():
+            f.write(json.dumps(record, separators=(',', ':'), ensure_ascii=False) + "\n")
+    os.replace(tmp_path, output)
+    return lines, len(corpus)
+
+
+def synthesize_turn(messages: List[Dict]) -> str:
+    """Turn JSON for an unrecorded prompt, from the fast-path and fallback rules"""
+    content = next((m.get("content") or "" for m in reversed(messages) if m.get("role") == "user"), "")
+    collected_data = new_collected_data()
+    user_input = content
+    match = _FULL_PROMPT.search(content) or _COMPACT_PROMPT.search(content)
+    if match:
+        try:
+            collected_data.update(json.loads(match.group(1)))
+        except ValueError:
+            pass
+        user_input = match.group(2)
+    user_input = user_input.strip()
+    turn = FastPathParser().resolve(user_input, collected_data) or fallback_response(user_input, collected_data)
+    return json.dumps(_check_turn(turn, collected_data), ensure_ascii=False)
+
+
+def _check_turn(turn: Dict, collected_data: Dict) -> Dict:
+    """Keep the current step if the turn stores a value that breaks its field's rules"""
+    data = {**collected_data, **turn["collected_data"]}
+    for field, validate in validate_field.items():
+        if data.get(field) == collected_data.get(field):
+            continue
+        is_valid, errors = validate(data)
+        if not is_valid:
+            message = next(iter(errors.values()))
+            return {
+                "user_message": f"{message}. Please try again.",
+                "internal_reasoning": f"Synthesized: rejected {field} {data.get(field)!r}",
+                "collected_data": collected_data,
+                "next_step": _FIELD_STEPS.get(field, field),
+            }
+    return turn
+
+
+class ReplayServer:
+    """Threaded OpenAI-compatible chat completions server replaying a corpus.
+
+    ``speed`` divides every delay (0 disables them). Unrecorded prompts use
+    ``ttft`` and ``tokens_per_sec``.
+    """
+
+    def __init__(self, corpus: Dict[str, Dict] = None, host: str = "127.0.0.1", port: int = 0,
+                 speed: float = 1.0, ttft: float = DEFAULT_TTFT, tokens_per_sec: float = DEFAULT_TOKENS_PER_SEC):
+        self.corpus = corpus or {}
+        self.speed = speed
+        self.ttft = ttft
+        self.tokens_per_sec = tokens_per_sec
+        self.stats = {"replayed": 0, "synthesized": 0}
+        self._stats_lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer((host, port), _make_handler(self))
+        self.httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> str:
+        """Serve in a background thread and return the OpenAI base URL"""
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self.base_url
+
+    def serve_forever(self):
+        self.httpd.serve_forever()
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def reply(self, messages: List[Dict]) -> Tuple[str, float, float, int]:
+        """(text, time to first token, total duration, prompt tokens) for a request"""
+        record = self.corpus.get(prompt_key(messages))
+        if record is not None:
+            outcome = "replayed"
+            text = record["response"]
+            ttft, duration = record["ttft"], record["duration"]
+            prompt_tokens = record.get("prompt_tokens")
+        else:
+            outcome = "synthesized"
+            text = synthesize_turn(messages)
+            ttft = self.ttft
+            duration = ttft + estimate_tokens(text) / self.tokens_per_sec
+            prompt_tokens = None
+        with self._stats_lock:
+            self.stats[outcome] += 1
+        if prompt_tokens is None:
+            prompt_tokens = sum(estimate_tokens(m.get("content")) for m in messages)
+        return text, ttft, duration, prompt_tokens
+
+    def scaled(self, seconds: float) -> float:
+        return seconds / self.speed if self.speed > 0 else 0.0
+
+
+def _split_tokens(text: str) -> List[str]:
+    return [text[i:i + CHARS_PER_TOKEN] for i in range(0, len(text), CHARS_PER_TOKEN)] or [""]
+
+
+def _make_handler(server: ReplayServer):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def do_GET(self):
+            if self.path.rstrip("/").endswith("/stats"):
+                self._send_json(200, server.stats)
+            else:
+                self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            raw = self.rfile.read(length) if length else b""
+            if not self.path.rstrip("/").endswith("/chat/completions"):
+                self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+                return
+            try:
+                body = json.loads(raw)
+                messages = body["messages"]
+            except (ValueError, KeyError, TypeError):
+                self._send_json(400, {"error": {"message": "Expected a chat completions request"}})
+                return
+
+            started = time.monotonic()
+            text, ttft, duration, prompt_tokens = server.reply(messages)
+            completion_tokens = estimate_tokens(text)
+            usage = {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                     "total_tokens": prompt_tokens + completion_tokens}
+            completion_id = f"chatcmpl-replay-{time.time_ns()}"
+            model = body.get("model", "replay")
+
+            if body.get("stream"):
+                include_usage = (body.get("stream_options") or {}).get("include_usage", False)
+                self._stream(completion_id, model, text, ttft, duration, started, usage if include_usage else None)
+                return
+
+            _sleep_until(started + server.scaled(duration))
+            self._send_json(200, {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": text},
+                             "finish_reason": "stop"}],
+                "usage": usage,
+            })
+
+        def _stream(self, completion_id: str, model: str, text: str, ttft: float, duration: float,
+                    started: float, usage: Optional[Dict]):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-cache")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+
+            tokens = _split_tokens(text)
+            interval = max(duration - ttft, 0.0) / len(tokens)
+            for i, token in enumerate(tokens):
+                _sleep_until(started + server.scaled(ttft + i * interval))
+                delta = {"role": "assistant", "content": token} if i == 0 else {"content": token}
+                self._event(_chunk(completion_id, model, [{"index": 0, "delta": delta, "finish_reason": None}]))
+            _sleep_until(started + server.scaled(duration))
+            self._event(_chunk(completion_id, model, [{"index": 0, "delta": {}, "finish_reason": "stop"}]))
+            if usage is not None:
+                self._event(_chunk(completion_id, model, [], usage))
+            self._write_chunk(b"data: [DONE]\n\n")
+            self._write_chunk(b"")
+
+        def _event(self, payload: Dict):
+            self._write_chunk(b"data: " + json.dumps(payload, ensure_ascii=False).encode() + b"\n\n")
+
+        def _write_chunk(self, data: bytes):
+            self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+            self.wfile.flush()
+
+        def _send_json(self, status: int, payload: Dict):
+            data = json.dumps(payload, ensure_ascii=False).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+def _chunk(completion_id: str, model: str, choices: List[Dict], usage: Dict = None) -> Dict:
+    chunk = {"id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()),
+             "model": model, "choices": choices}
+    if usage is not None:
+        chunk["usage"] = usage
+    return chunk
+
+
+def _sleep_until(deadline: float):
+    remaining = deadline - time.monotonic()
+    if remaining > 0:
+        time.sleep(remaining)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded LLM responses behind an OpenAI-compatible API")
+    commands = parser.add_subparsers(dest="command", required=True)
+    serve = commands.add_parser("serve", help="Run the replay server")
+    serve.add_argument("--corpus", help="JSONL recorded with LLM_RECORD_PATH (optional)")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=8090)
+    serve.add_argument("--speed", type=float, default=1.0, help="divide recorded delays by this (0 = no delay)")
+    serve.add_argument("--ttft", type=float, default=DEFAULT_TTFT, help="first-token seconds for unseen prompts")
+    serve.add_argument("--tokens-per-sec", type=float, default=DEFAULT_TOKENS_PER_SEC)
+    compact = commands.add_parser("compact", help="Keep only the latest record per prompt")
+    compact.add_argument("corpus")
+    compact.add_argument("-o", "--output", help="default: rewrite in place")
+    args = parser.parse_args()
+
+    if args.command == "compact":
+        lines, kept = compact_corpus(args.corpus, args.output)
+        print(f"{lines} records -> {kept} unique prompts")
+        return
+
+    corpus = load_corpus(args.corpus) if args.corpus else {}
+    server = ReplayServer(corpus, args.host, args.port, args.speed, args.ttft, args.tokens_per_sec)
+    print(f"Replaying {len(corpus)} recorded prompts on {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
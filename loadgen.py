@@ -0,0 +1,365 @@
+"""Virtual-user load generator for end-to-end conversation throughput.
+
+Each virtual user arrives (Poisson at --rate users/s, or all at once),
+waits for one of --concurrency session slots, authenticates, talks through
+the scripted conversation with think times, handles music, validates and
+submits. This is the same shape as server.py: one event loop, async LLM
+turns, and blocking TikTok calls on a pool of --workers threads. Turns go
+through the agent's own LLM path (prompt, JSON parse, error fallback) with
+its fast path and cache off. The LLM client is a stub with lognormal latency
+that answers from the fast-path rules, or fails at --llm-error-rate. The
+TikTok API is the in-process mock, its delays scaled like everything else,
+and submissions share one rate limiter (--submit-qps).
+
+--time-scale compresses every modelled latency (LLM, think time, API,
+limiter). Reported times and rates are converted back to unscaled seconds.
+At small scales fixed CPU costs weigh more, so estimates err on the side of
+caution.
+
+    python loadgen.py --users 500 --rate 20 --concurrency 200 --workers 64
+    python loadgen.py --find-saturation --start-rate 5 --time-scale 0.05
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import math
+import os
+import random
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+from config import config
+from app import TikTokAdAgent
+from auth import TikTokAuth
+from engine import ConversationEngine, OUTCOME_READY, STAGE_DONE
+from llm_replay import synthesize_turn
+from metrics import Histogram
+from retry import RateLimiter, submission_scheduler
+from simulation import MAX_TURNS, SESSION_MIX, ScaledClock, SystemClock, pick_weighted, scripted_reply, session_script
+from tiktok_api import MusicMetadataCache, TikTokAPI
+
+DEFAULT_LLM_LATENCY = 0.8
+DEFAULT_LLM_SIGMA = 0.5
+DEFAULT_THINK_TIME = 3.0
+
+
+class StubLLM:
+    """Async stand-in for the NIM client, used by a real TikTokAdAgent.
+
+    Latency is lognormal around ``median``. Replies are synthesized from the
+    fast-path rules; an injected failure raises, so the agent takes its own
+    error fallback.
+    """
+
+    model = "stub"
+
+    def __init__(self, median: float, sigma: float, error_rate: float, rng: random.Random, errors: Counter,
+                 deadline: float = None):
+        self.median = median
+        self.sigma = sigma
+        self.error_rate = error_rate
+        self.rng = rng
+        self.errors = errors
+        self.deadline = deadline or config.LLM_CALL_DEADLINE
+
+    async def chat_completion(self, messages: list, **kwargs) -> str:
+        if self.median > 0:
+            await asyncio.sleep(self.rng.lognormvariate(math.log(self.median), self.sigma))
+        if self.rng.random() < self.error_rate:
+            self.errors["llm:error"] += 1
+            raise RuntimeError("Injected LLM error")
+        return synthesize_turn(messages)
+
+
+class LoadRun:
+    """Shared state of one load run: slots, worker pool, stubs and measurements"""
+
+    def __init__(self, concurrency: int, workers: int, time_scale: float, seed: int,
+                 llm_latency: float, llm_sigma: float, llm_error_rate: float,
+                 think_time: float, submit_qps: float, auth_error_rate: float):
+        self.time_scale = time_scale
+        self.think_time = think_time * time_scale
+        self.auth_error_rate = auth_error_rate
+        self.rng = random.Random(seed)
+        self.slots = asyncio.Semaphore(concurrency)
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.clock = ScaledClock(time_scale)
+        self.music_cache = MusicMetadataCache()
+        self.limiter = RateLimiter(submit_qps / time_scale if submit_qps > 0 else 0, clock=SystemClock())
+        self.stages = Histogram("loadgen_stage_seconds")
+        self.outcomes = Counter()
+        self.submission_codes = Counter()
+        self.errors = Counter()
+        self.turns = 0
+        self.llm = StubLLM(llm_latency * time_scale, llm_sigma, llm_error_rate, self.rng, self.errors)
+        self.agent = TikTokAdAgent(client=self.llm, async_client=self.llm)
+        # Every turn pays for an LLM call, as the slowest (unscripted) users would
+        self.agent.fast_path = None
+        self.agent.response_cache = None
+
+    def observe(self, stage: str, started: float):
+        # Back to unscaled seconds
+        self.stages.observe((time.perf_counter() - started) / self.time_scale, stage=stage)
+
+    async def blocking(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+
+    async def user(self, arrival_delay: float):
+        await asyncio.sleep(arrival_delay)
+        arrived = time.perf_counter()
+        try:
+            async with self.slots:
+                self.observe("queue", arrived)
+                outcome = await self._session()
+        except Exception as e:
+            self.errors[f"exception:{type(e).__name__}"] += 1
+            outcome = "error"
+        self.outcomes[outcome] += 1
+        self.observe("session", arrived)
+
+    async def _session(self) -> str:
+        started = time.perf_counter()
+        auth = TikTokAuth(auto_refresh=False)
+        code = "invalid_client" if self.rng.random() < self.auth_error_rate else "valid_code"
+        success, _ = await self.blocking(auth.handle_oauth_callback, code)
+        self.observe("auth", started)
+        if not success:
+            self.errors["auth:invalid_client"] += 1
+            return "auth_failed"
+
+        api = TikTokAPI(music_cache=self.music_cache, clock=self.clock, rng=self.rng, auth=auth)
+        engine = ConversationEngine(None, api, self.agent.aget_llm_response)
+        objective, music = pick_weighted(self.rng, SESSION_MIX)
+        script = session_script(objective, music)
+        state, _ = engine.new_session()
+
+        for _ in range(MAX_TURNS):
+            if state["stage"] == STAGE_DONE:
+                break
+            if self.think_time > 0:
+                await asyncio.sleep(self.rng.expovariate(1 / self.think_time))
+            stage = state["stage"]
+            started = time.perf_counter()
+            state, _ = await engine.astep(state, scripted_reply(state, script), executor=self.executor)
+            self.observe(f"turn:{stage}", started)
+            self.turns += 1
+
+        if state.get("outcome") != OUTCOME_READY:
+            return state.get("outcome") or "stalled"
+
+        scheduler = submission_scheduler(auth, limiter=self.limiter, clock=self.clock, rng=self.rng)
+
+        def on_retry(attempt, response, interpretation, delay):
+            self.errors[f"retry:{response.get('code')}"] += 1
+
+        started = time.perf_counter()
+        success, response, _ = await self.blocking(scheduler.submit, api, state["ad_payload"], on_retry)
+        self.observe("submit", started)
+        self.submission_codes[str(response.get("code"))] += 1
+        return "submitted" if success else "submit_failed"
+
+    def report(self, users: int, rate: float, wall_seconds: float) -> Dict:
+        wall = wall_seconds / self.time_scale
+        stages = {}
+        for key, stats in sorted(self.stages.snapshot().items()):
+            stages[dict(key)["stage"]] = {
+                "count": stats["count"],
+                "mean": round(stats["sum"] / stats["count"], 4),
+                "p50": round(stats["p50"], 4),
+                "p95": round(stats["p95"], 4),
+                "p99": round(stats["p99"], 4),
+            }
+        return {
+            "users": users,
+            "arrival_rate": rate,
+            "wall_seconds": round(wall, 3),
+            "throughput": {
+                "sessions_per_sec": round(users / wall, 3),
+                "turns_per_sec": round(self.turns / wall, 3),
+                "submissions_per_sec": round(self.outcomes["submitted"] / wall, 3),
+            },
+            "stages": stages,
+            "outcomes": dict(sorted(self.outcomes.items())),
+            "submission_codes": dict(sorted(self.submission_codes.items())),
+            "errors": dict(sorted(self.errors.items())),
+        }
+
+
+async def run_load(users: int, rate: float = 0.0, concurrency: int = None, workers: int = None,
+                   time_scale: float = 1.0, seed: int = 0, llm_latency: float = DEFAULT_LLM_LATENCY,
+                   llm_sigma: float = DEFAULT_LLM_SIGMA, llm_error_rate: float = 0.0,
+                   think_time: float = DEFAULT_THINK_TIME, submit_qps: float = None,
+                   auth_error_rate: float = 0.0) -> Dict:
+    """Run ``users`` virtual users; rate is arrivals per (unscaled) second, 0 = all at once"""
+    # The agent's warnings (LLM errors, fallbacks) would flood the terminal
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        return await _run_load(users, rate, concurrency, workers, time_scale, seed, llm_latency, llm_sigma,
+                               llm_error_rate, think_time, submit_qps, auth_error_rate)
+
+
+async def _run_load(users: int, rate: float, concurrency: Optional[int], workers: Optional[int],
+                    time_scale: float, seed: int, llm_latency: float, llm_sigma: float, llm_error_rate: float,
+                    think_time: float, submit_qps: Optional[float], auth_error_rate: float) -> Dict:
+    run = LoadRun(concurrency or config.SERVER_MAX_SESSIONS, workers or config.SERVER_WORKER_THREADS,
+                  time_scale, seed, llm_latency, llm_sigma, llm_error_rate, think_time,
+                  config.SUBMIT_QPS if submit_qps is None else submit_qps, auth_error_rate)
+    delays = []
+    at = 0.0
+    for _ in range(users):
+        delays.append(at)
+        if rate > 0:
+            at += run.rng.expovariate(rate) * time_scale
+
+    started = time.perf_counter()
+    try:
+        await asyncio.gather(*(run.user(delay) for delay in delays))
+    finally:
+        run.executor.shutdown(wait=False)
+    report = run.report(users, rate, time.perf_counter() - started)
+    report["config"] = {"concurrency": concurrency or config.SERVER_MAX_SESSIONS,
+                        "workers": workers or config.SERVER_WORKER_THREADS, "time_scale": time_scale,
+                        "llm_latency": llm_latency, "think_time": think_time,
+                        "submit_qps": config.SUBMIT_QPS if submit_qps is None else submit_qps}
+    return report
+
+
+def find_saturation(start_rate: float, growth: float, step_seconds: float, max_steps: int,
+                    max_queue_wait: float, slo: Optional[float], tolerance: float = 0.05, **options) -> Dict:
+    """Search for the highest arrival rate that doesn't queue sessions for slots or miss the SLO.
+
+    A step is saturated when the p95 wait for a session slot exceeds
+    max_queue_wait, or the p95 session time exceeds slo. The rate is
+    multiplied by growth until a step saturates, or divided by it while the
+    first one does. The search then bisects between the last good and first
+    saturated rates until they are within tolerance, or max_steps runs in all.
+    """
+    steps = []
+
+    def measure(rate: float) -> Dict:
+        users = max(1, int(rate * step_seconds))
+        report = asyncio.run(run_load(users, rate, **options))
+        stages = report["stages"]
+        queue_p95 = stages.get("queue", {}).get("p95", 0.0)
+        session_p95 = stages.get("session", {}).get("p95", 0.0)
+        steps.append({
+            "rate": round(rate, 3),
+            "users": users,
+            "sessions_per_sec": report["throughput"]["sessions_per_sec"],
+            "queue_p95": queue_p95,
+            "session_p95": session_p95,
+            "saturated": queue_p95 > max_queue_wait or (slo is not None and session_p95 > slo),
+        })
+        return steps[-1]
+
+    good, bad = None, None
+    rate = start_rate
+    while len(steps) < max_steps and (good is None or bad is None):
+        step = measure(rate)
+        if step["saturated"]:
+            bad = rate
+            if good is not None:
+                break
+            rate /= growth
+        else:
+            good = rate
+            if bad is not None:
+                break
+            rate *= growth
+
+    while good is not None and bad is not None and len(steps) < max_steps and bad / good > 1 + tolerance:
+        rate = math.sqrt(good * bad)
+        if measure(rate)["saturated"]:
+            bad = rate
+        else:
+            good = rate
+
+    last_good = max((s for s in steps if not s["saturated"]), key=lambda s: s["rate"], default=None)
+    return {
+        "saturation_rate": round(good, 3) if good is not None else None,
+        "first_saturated": round(bad, 3) if bad is not None else None,
+        "last_good": last_good,
+        "steps": steps,
+    }
+
+
+def print_report(report: Dict):
+    t = report["throughput"]
+    print(f"{report['users']} users in {report['wall_seconds']}s: {t['sessions_per_sec']} sessions/s, "
+          f"{t['turns_per_sec']} turns/s, {t['submissions_per_sec']} submissions/s")
+    print(f"\n{'stage':<32}{'count':>8}{'p50 s':>10}{'p95 s':>10}{'p99 s':>10}")
+    for stage, s in report["stages"].items():
+        print(f"{stage:<32}{s['count']:>8}{s['p50']:>10.3f}{s['p95']:>10.3f}{s['p99']:>10.3f}")
+    for title in ("outcomes", "submission_codes", "errors"):
+        if report[title]:
+            print(f"\n{title}: " + ", ".join(f"{k}={v}" for k, v in report[title].items()))
+
+
+def positive_float(value: str) -> float:
+    """argparse type for a float greater than zero"""
+    number = float(value)
+    if not number > 0:
+        raise argparse.ArgumentTypeError(f"must be greater than 0, got {value}")
+    return number
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Drive scripted virtual users through the full ad-creation flow")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--rate", type=float, default=10.0, help="arrivals per second (0 = all at once)")
+    parser.add_argument("--concurrency", type=int, default=config.SERVER_MAX_SESSIONS, help="active session slots")
+    parser.add_argument("--workers", type=int, default=config.SERVER_WORKER_THREADS, help="threads for blocking calls")
+    parser.add_argument("--think-time", type=float, default=DEFAULT_THINK_TIME, help="mean seconds between turns")
+    parser.add_argument("--llm-latency", type=float, default=DEFAULT_LLM_LATENCY, help="median stub LLM seconds")
+    parser.add_argument("--llm-sigma", type=float, default=DEFAULT_LLM_SIGMA)
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--auth-error-rate", type=float, default=0.0)
+    parser.add_argument("--submit-qps", type=float, default=config.SUBMIT_QPS)
+    parser.add_argument("--time-scale", type=positive_float, default=1.0, help="multiply all modelled latency by this")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--find-saturation", action="store_true")
+    parser.add_argument("--start-rate", type=float, default=2.0)
+    parser.add_argument("--growth", type=float, default=1.5)
+    parser.add_argument("--step-seconds", type=float, default=60.0, help="arrival window per step")
+    parser.add_argument("--max-steps", type=int, default=12, help="load runs in the whole search")
+    parser.add_argument("--tolerance", type=float, default=0.05, help="stop bisecting within this ratio")
+    parser.add_argument("--max-queue-wait", type=float, default=1.0, help="p95 slot wait that marks saturation")
+    parser.add_argument("--slo", type=float, default=None, help="p95 session seconds that marks saturation")
+    parser.add_argument("--json", action="store_true", help="print the full report as JSON")
+    args = parser.parse_args()
+
+    options = dict(concurrency=args.concurrency, workers=args.workers, time_scale=args.time_scale,
+                   seed=args.seed, llm_latency=args.llm_latency, llm_sigma=args.llm_sigma,
+                   llm_error_rate=args.llm_error_rate, think_time=args.think_time,
+                   submit_qps=args.submit_qps, auth_error_rate=args.auth_error_rate)
+
+    if args.find_saturation:
+        result = find_saturation(args.start_rate, args.growth, args.step_seconds, args.max_steps,
+                                 args.max_queue_wait, args.slo, args.tolerance, **options)
+        if args.json:
+            print(json.dumps(result, indent=2))
+            return
+        print(f"{'rate/s':>8}{'users':>7}{'sessions/s':>12}{'queue p95':>11}{'session p95':>13}")
+        for step in result["steps"]:
+            print(f"{step['rate']:>8}{step['users']:>7}{step['sessions_per_sec']:>12}{step['queue_p95']:>11.3f}"
+                  f"{step['session_p95']:>13.3f}{'  saturated' if step['saturated'] else ''}")
+        if result["saturation_rate"] is None:
+            print(f"\nSaturated at every rate tried, down to {result['first_saturated']} arrivals/s")
+        elif result["first_saturated"] is None:
+            print(f"\nNot saturated at up to {result['saturation_rate']} arrivals/s; raise --max-steps or --start-rate")
+        else:
+            print(f"\nSaturation point: {result['saturation_rate']} arrivals/s "
+                  f"(saturated at {result['first_saturated']}) with {args.concurrency} slots "
+                  f"and {args.workers} workers")
+        return
+
+    report = asyncio.run(run_load(args.users, args.rate, **options))
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,284 @@
+"""Lightweight latency histograms and counters with Prometheus text export.
+
+    with timer("tiktok_api_seconds", method="create_ad_campaign"):
+        ...
+
+    @timed("llm_call_seconds")
+    def chat_completion(...): ...
+
+Histograms use fixed log-spaced buckets (four per power of two, about 19%
+wide), so observing is a bisect and an increment under a lock, and p50/p95/
+p99 are estimated to within one bucket. Everything lives in the
+process-wide REGISTRY. render() produces Prometheus text; write_file() and
+serve() export it.
+"""
+import bisect
+import functools
+import inspect
+import math
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from config import config
+
+# Bucket upper bounds in seconds: 2**-17 (~7.6us) to 2**9 (512s), 4 per octave
+BUCKETS_PER_OCTAVE = 4
+MIN_EXPONENT = -17
+MAX_EXPONENT = 9
+BOUNDS = [2 ** (i / BUCKETS_PER_OCTAVE)
+          for i in range(MIN_EXPONENT * BUCKETS_PER_OCTAVE, MAX_EXPONENT * BUCKETS_PER_OCTAVE + 1)]
+QUANTILES = (0.5, 0.95, 0.99)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(key: LabelKey, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+    pairs = key + extra
+    if not pairs:
+        return ""
+    escaped = (v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+class _Series:
+    __slots__ = ("counts", "total", "count", "min", "max")
+
+    def __init__(self):
+        self.counts = [0] * (len(BOUNDS) + 1)  # last slot is +Inf
+        self.total = 0.0
+        self.count = 0
+        self.min = math.inf
+        self.max = 0.0
+
+
+class Histogram:
+    """Log-bucketed latency histogram, one series per label set"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str = ""):
+        self.name = name
+        self.help = help_text
+        self.series: Dict[LabelKey, _Series] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = _label_key(labels)
+        index = bisect.bisect_left(BOUNDS, value)
+        with self._lock:
+            series = self.series.get(key)
+            if series is None:
+                series = self.series[key] = _Series()
+            series.counts[index] += 1
+            series.total += value
+            series.count += 1
+            if value < series.min:
+                series.min = value
+            if value > series.max:
+                series.max = value
+
+    def percentile(self, q: float, **labels) -> Optional[float]:
+        """Estimated q-quantile (0..1), interpolated within its bucket"""
+        with self._lock:
+            series = self.series.get(_label_key(labels))
+            if series is None or not series.count:
+                return None
+            return _percentile(series, q)
+
+    def snapshot(self) -> Dict[LabelKey, Dict]:
+        with self._lock:
+            return {
+                key: {
+                    "count": s.count,
+                    "sum": s.total,
+                    **{f"p{int(q * 100)}": _percentile(s, q) for q in QUANTILES},
+                }
+                for key, s in self.series.items() if s.count
+            }
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        quantile_lines = []
+        with self._lock:
+            for key, series in sorted(self.series.items()):
+                cumulative = 0
+                for i, bound in enumerate(BOUNDS):
+                    cumulative += series.counts[i]
+                    if i % BUCKETS_PER_OCTAVE == 0:  # exact power-of-two bounds only
+                        lines.append(f"{self.name}_bucket{_format_labels(key, (('le', repr(bound)),))} {cumulative}")
+                lines.append(f"{self.name}_bucket{_format_labels(key, (('le', '+Inf'),))} {series.count}")
+                lines.append(f"{self.name}_sum{_format_labels(key)} {series.total!r}")
+                lines.append(f"{self.name}_count{_format_labels(key)} {series.count}")
+                for q in QUANTILES:
+                    value = _percentile(series, q) if series.count else 0.0
+                    quantile_lines.append(f"{self.name}_quantile{_format_labels(key, (('quantile', str(q)),))} {value!r}")
+        if quantile_lines:
+            lines += [f"# HELP {self.name}_quantile Estimated quantiles of {self.name}",
+                      f"# TYPE {self.name}_quantile gauge"] + quantile_lines
+        return lines
+
+
+def _percentile(series: _Series, q: float) -> float:
+    rank = q * series.count
+    cumulative = 0
+    for i, count in enumerate(series.counts):
+        if count and cumulative + count >= rank:
+            lower = BOUNDS[i - 1] if i > 0 else 0.0
+            upper = BOUNDS[i] if i < len(BOUNDS) else series.max
+            estimate = lower + (upper - lower) * (rank - cumulative) / count
+            return min(max(estimate, series.min), series.max)
+        cumulative += count
+    return series.max
+
+
+class Counter:
+    """Monotonic counter, one value per label set"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str = ""):
+        self.name = name
+        self.help = help_text
+        self.values: Dict[LabelKey, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def get(self, **labels) -> float:
+        return self.values.get(_label_key(labels), 0)
+
+    def snapshot(self) -> Dict[LabelKey, float]:
+        with self._lock:
+            return dict(self.values)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            lines += [f"{self.name}{_format_labels(key)} {value!r}" for key, value in sorted(self.values.items())]
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def _get(self, cls, name: str, help_text: str):
+        with self._lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = self.metrics[name] = cls(name, help_text)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"Metric '{name}' is already registered as a {metric.kind}")
+            return metric
+
+    def histogram(self, name: str, help_text: str = "") -> Histogram:
+        return self._get(Histogram, name, help_text)
+
+    def counter(self, name: str, help_text: str = "") -> Counter:
+        return self._get(Counter, name, help_text)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = [self.metrics[name] for name in sorted(self.metrics)]
+        return "\n".join(line for metric in metrics for line in metric.render()) + "\n"
+
+    def snapshot(self) -> Dict[str, Dict]:
+        with self._lock:
+            metrics = dict(self.metrics)
+        return {name: metric.snapshot() for name, metric in metrics.items()}
+
+
+REGISTRY = Registry()
+
+
+def histogram(name: str, help_text: str = "") -> Histogram:
+    return REGISTRY.histogram(name, help_text)
+
+
+def counter(name: str, help_text: str = "") -> Counter:
+    return REGISTRY.counter(name, help_text)
+
+
+class timer:
+    """Context manager timing a block into a histogram.
+
+    ``labels`` may be updated inside the block (e.g. with the outcome) and
+    are applied when the block exits.
+    """
+
+    __slots__ = ("histogram", "labels", "started")
+
+    def __init__(self, name: str, **labels):
+        self.histogram = REGISTRY.histogram(name)
+        self.labels = labels
+
+    def __enter__(self) -> "timer":
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.labels.setdefault("error", exc_type.__name__)
+        self.histogram.observe(time.perf_counter() - self.started, **self.labels)
+        return False
+
+
+def timed(name: str, **labels):
+    """Decorator form of timer; async functions are timed until they finish"""
+    def decorate(fn):
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with timer(name, **labels):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with timer(name, **labels):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def write_file(path: str = None) -> str:
+    """Write the Prometheus text exposition atomically; returns the path"""
+    path = path or config.METRICS_FILE
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        f.write(REGISTRY.render())
+    os.replace(tmp_path, path)
+    return path
+
+
+def serve(port: int = None, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """Serve GET /metrics from a background thread"""
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = REGISTRY.render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    httpd = ThreadingHTTPServer((host, port or config.METRICS_PORT), Handler)
+    httpd.daemon_threads = True
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    return httpd
@@ -0,0 +1,346 @@
+"""Local mock of the TikTok Ads endpoints the agent uses.
+
+Serves music validation, music upload, campaign creation and the OAuth
+token endpoints over real HTTP, with pluggable latency distributions,
+seeded error profiles and token-bucket rate limiting. Point the agent at it
+with:
+
+    python mock_tiktok_server.py --port 8080 --seed 42
+    TIKTOK_API_MODE=http TIKTOK_API_BASE_URL=http://127.0.0.1:8080/open_api/v1.3 python app.py
+"""
+import argparse
+import json
+import math
+import random
+import string
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+from config import config
+
+# Simulated latency per endpoint (seconds), matching the in-process mocks
+DEFAULT_LATENCIES = {
+    "music_get": 0.5,
+    "music_upload": 1.0,
+    "campaign_create": 0.8,
+    "access_token": 0.2,
+    "refresh_token": 0.2,
+}
+
+# Random failure mix per endpoint. "readme" reproduces the documented rates.
+ERROR_PROFILES = {
+    "readme": {
+        "campaign_create": [(40003, 0.15), (40002, 0.10), (40004, 0.05), (40001, 0.10)],
+        "music_get": [(50000, 0.10)],
+        "music_upload": [(50000, 0.05)],
+    },
+    "healthy": {
+        "campaign_create": [],
+        "music_get": [],
+        "music_upload": [],
+    },
+    "degraded": {
+        "campaign_create": [(50000, 0.20), (40003, 0.05)],
+        "music_get": [(50000, 0.20)],
+        "music_upload": [(50000, 0.20)],
+    },
+}
+
+ERROR_MESSAGES = {
+    40001: "Invalid music ID",
+    40002: "Missing ads.manage permission",
+    40003: "Invalid OAuth token",
+    40004: "Service not available in your region",
+    40100: "Too many requests, rate limit exceeded",
+    50000: "TikTok API service temporarily unavailable",
+}
+
+
+class LatencyModel:
+    """Samples simulated response latency for an endpoint.
+
+    Specs: "fixed" (per-endpoint defaults), "fixed:SECONDS", "none",
+    "lognormal:MEDIAN:SIGMA" or "recorded:PATH" (one duration per line,
+    sampled with replacement).
+    """
+
+    def __init__(self, kind: str, params: Tuple = (), samples: List[float] = None):
+        self.kind = kind
+        self.params = params
+        self.samples = samples or []
+
+    @classmethod
+    def parse(cls, spec: str) -> "LatencyModel":
+        kind, _, rest = spec.partition(":")
+        if kind in ("fixed", "none") and not rest:
+            return cls(kind)
+        if kind == "fixed":
+            return cls(kind, (float(rest),))
+        if kind == "lognormal":
+            median, sigma = rest.split(":")
+            return cls(kind, (float(median), float(sigma)))
+        if kind == "recorded":
+            with open(rest) as f:
+                samples = [float(line) for line in f if line.strip()]
+            if not samples:
+                raise ValueError(f"No latency samples in {rest}")
+            return cls(kind, samples=samples)
+        raise ValueError(f"Unknown latency spec '{spec}'")
+
+    def sample(self, endpoint: str, rng: random.Random) -> float:
+        if self.kind == "none":
+            return 0.0
+        if self.kind == "fixed":
+            return self.params[0] if self.params else DEFAULT_LATENCIES[endpoint]
+        if self.kind == "lognormal":
+            median, sigma = self.params
+            return rng.lognormvariate(math.log(median), sigma)
+        return rng.choice(self.samples)
+
+
+class TokenBucket:
+    """Thread-safe token bucket; qps <= 0 disables limiting"""
+
+    def __init__(self, qps: float, burst: float = None):
+        self.qps = qps
+        self.capacity = burst or max(qps, 1.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def try_acquire(self) -> bool:
+        if self.qps <= 0:
+            return True
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.qps)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+
+class MockTikTokServer:
+    """Threaded HTTP server hosting the mock endpoints"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: str = "fixed",
+                 profile: str = "readme", seed: Optional[int] = None, qps: float = 0):
+        if profile not in ERROR_PROFILES:
+            raise ValueError(f"Unknown error profile '{profile}', expected one of: {', '.join(ERROR_PROFILES)}")
+        self.latency = LatencyModel.parse(latency)
+        self.profile = ERROR_PROFILES[profile]
+        self.rng = random.Random(seed)
+        self.rng_lock = threading.Lock()
+        self.limiter = TokenBucket(qps)
+        self.request_counts: Dict[str, int] = {}
+        self.httpd = ThreadingHTTPServer((host, port), _make_handler(self))
+        self.httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/open_api/v1.3"
+
+    def start(self) -> str:
+        """Serve in a background thread and return the API base URL"""
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self.base_url
+
+    def serve_forever(self):
+        self.httpd.serve_forever()
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    # ----- endpoint logic -------------------------------------------------
+
+    def handle(self, endpoint: str, params: Dict, body: Dict, access_token: str) -> Dict:
+        with self.rng_lock:
+            self.request_counts[endpoint] = self.request_counts.get(endpoint, 0) + 1
+            delay = self.latency.sample(endpoint, self.rng)
+            roll = self.rng.random()
+            suffix = ''.join(self.rng.choices(string.digits, k=10))
+
+        if delay:
+            time.sleep(delay)
+
+        if not self.limiter.try_acquire():
+            return _error(40100)
+
+        if endpoint == "access_token":
+            return self._access_token(body, suffix)
+        if endpoint == "refresh_token":
+            return self._refresh_token(body, suffix)
+
+        if not access_token:
+            return _error(40003)
+        if endpoint == "music_get":
+            return self._music_get(params.get("music_id", ""), roll)
+        if endpoint == "music_upload":
+            return self._music_upload(roll, suffix)
+        return self._campaign_create(body, roll, suffix)
+
+    def _failure(self, endpoint: str, roll: float, skip: Tuple[int, ...] = ()) -> Optional[int]:
+        """Pick an error code from the profile for this roll, if any"""
+        threshold = 0.0
+        for code, probability in self.profile[endpoint]:
+            threshold += probability
+            if roll < threshold:
+                return None if code in skip else code
+        return None
+
+    def _music_get(self, music_id: str, roll: float) -> Dict:
+        if music_id in config.INVALID_MUSIC_IDS:
+            return _error(40001, "Music ID not found or not accessible")
+        if music_id in config.MOCK_MUSIC_IDS:
+            return _ok({
+                "music_id": music_id,
+                "title": "Mock Music Track",
+                "artist": "Mock Artist",
+                "duration": 30,
+                "is_usable": True
+            })
+        code = self._failure("music_get", roll)
+        if code:
+            return _error(code)
+        return _error(40002, "Invalid music ID format")
+
+    def _music_upload(self, roll: float, suffix: str) -> Dict:
+        code = self._failure("music_upload", roll)
+        if code:
+            return _error(code)
+        return _ok({"music_id": "M" + suffix[:9]})
+
+    def _campaign_create(self, body: Dict, roll: float, suffix: str) -> Dict:
+        # Invalid music only applies to payloads that carry a music ID
+        skip = () if body.get("music_id") else (40001,)
+        code = self._failure("campaign_create", roll, skip)
+        if code:
+            return _error(code)
+        return _ok({
+            "campaign_id": "CMP" + suffix,
+            "ad_id": "AD" + suffix,
+            "status": "UNDER_REVIEW",
+            "estimated_review_time": "24 hours"
+        })
+
+    def _access_token(self, body: Dict, suffix: str) -> Dict:
+        auth_code = body.get("auth_code")
+        if auth_code == "invalid_client":
+            return _error(40001, "Invalid client ID or secret")
+        if auth_code == "no_permission":
+            return _error(40002, "Missing ads.manage scope")
+        if auth_code != "valid_code":
+            return _error(40010, "Invalid authorization code")
+        return _ok(_token_data(suffix))
+
+    def _refresh_token(self, body: Dict, suffix: str) -> Dict:
+        if not body.get("refresh_token"):
+            return _error(40003, "Invalid refresh token")
+        return _ok(_token_data(suffix))
+
+
+# Endpoint name for each path suffix (the base path is free-form)
+ROUTES = {
+    ("GET", "/music/get/"): "music_get",
+    ("POST", "/file/music/upload/"): "music_upload",
+    ("POST", "/campaign/create/"): "campaign_create",
+    ("POST", "/oauth2/access_token/"): "access_token",
+    ("POST", "/oauth2/refresh_token/"): "refresh_token",
+}
+
+
+def _make_handler(server: MockTikTokServer):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def _dispatch(self):
+            url = urlparse(self.path)
+            endpoint = next(
+                (name for (method, suffix), name in ROUTES.items()
+                 if method == self.command and url.path.endswith(suffix)),
+                None
+            )
+            length = int(self.headers.get("Content-Length") or 0)
+            raw = self.rfile.read(length) if length else b""
+
+            if endpoint is None:
+                self._send(404, {"code": 40400, "message": f"Unknown endpoint {self.command} {url.path}"})
+                return
+            try:
+                body = json.loads(raw) if raw else {}
+            except ValueError:
+                self._send(400, {"code": 40000, "message": "Request body is not valid JSON"})
+                return
+
+            params = {k: v[0] for k, v in parse_qs(url.query).items()}
+            response = server.handle(endpoint, params, body, self.headers.get("Access-Token"))
+            self._send(200, response)
+
+        def _send(self, status: int, payload: Dict):
+            data = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        do_GET = _dispatch
+        do_POST = _dispatch
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+def _ok(data: Dict) -> Dict:
+    return {"code": 0, "message": "OK", "data": data, "request_id": "mock_req_" + str(time.time_ns())}
+
+
+def _error(code: int, message: str = None) -> Dict:
+    return {
+        "code": code,
+        "message": message or ERROR_MESSAGES.get(code, "Error"),
+        "log_id": f"mock_log_{code}",
+        "request_id": "mock_req_" + str(time.time_ns())
+    }
+
+
+def _token_data(suffix: str) -> Dict:
+    return {
+        "access_token": "mock_access_token_" + suffix,
+        "refresh_token": "mock_refresh_token_" + suffix,
+        "expires_in": 86400,
+        "scope": ["ads.manage"]
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local mock TikTok Ads API server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--latency", default="fixed",
+                        help="fixed | fixed:SECONDS | none | lognormal:MEDIAN:SIGMA | recorded:PATH")
+    parser.add_argument("--profile", default="readme", choices=sorted(ERROR_PROFILES))
+    parser.add_argument("--seed", type=int, default=None, help="seed for latency and error sampling")
+    parser.add_argument("--qps", type=float, default=0, help="rate limit (0 = unlimited)")
+    args = parser.parse_args()
+
+    server = MockTikTokServer(args.host, args.port, args.latency, args.profile, args.seed, args.qps)
+    print(f"Mock TikTok Ads API listening on {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
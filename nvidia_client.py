@@ -1,28 +1,152 @@
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI, DefaultAsyncHttpxClient
+import asyncio
+import httpx
 import json
+import threading
+import time
 from config import config
+from json_utils import extract_json_object
+from llm_recorder import LLMRecorder
+from metrics import histogram, timer
+
+histogram("llm_call_seconds", "NVIDIA NIM chat completion latency")
+
+def guided_json_body(json_schema: dict = None) -> dict:
+    """extra_body asking NIM to constrain decoding to a JSON schema"""
+    if json_schema is None:
+        return None
+    return {"nvext": {"guided_json": json_schema}}
+
+
+class TokenUsageTracker:
+    """Running prompt/completion token counts, in total and per model"""
+    
+    def __init__(self):
+        self.turns = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.by_model = {}
+        # Shared by the worker threads of server.py
+        self._lock = threading.Lock()
+    
+    def record(self, model: str, usage) -> dict:
+        """Record a completion.usage object (None when the server omits it)"""
+        turn = {
+            "model": model,
+            "prompt_tokens": getattr(usage, "prompt_tokens", 0) or 0,
+            "completion_tokens": getattr(usage, "completion_tokens", 0) or 0,
+        }
+        with self._lock:
+            self.turns += 1
+            self.prompt_tokens += turn["prompt_tokens"]
+            self.completion_tokens += turn["completion_tokens"]
+            totals = self.by_model.setdefault(model, {"turns": 0, "prompt_tokens": 0, "completion_tokens": 0})
+            totals["turns"] += 1
+            totals["prompt_tokens"] += turn["prompt_tokens"]
+            totals["completion_tokens"] += turn["completion_tokens"]
+        return turn
+    
+    def totals(self) -> dict:
+        with self._lock:
+            return {
+                "turns": self.turns,
+                "prompt_tokens": self.prompt_tokens,
+                "completion_tokens": self.completion_tokens,
+                "by_model": {model: dict(totals) for model, totals in self.by_model.items()},
+            }
+
 
 class NVIDIAAIClient:
     def __init__(self):
         self.client = OpenAI(
             base_url=config.NVIDIA_BASE_URL,
-            api_key=config.NVIDIA_API_KEY
+            api_key=config.NVIDIA_API_KEY,
+            timeout=config.LLM_CALL_DEADLINE
         )
         self.model = config.NVIDIA_MODEL
+        # Process-wide token usage; callers may pass their own tracker per session
+        self.usage = TokenUsageTracker()
+        self.recorder = LLMRecorder(config.LLM_RECORD_PATH) if config.LLM_RECORD_PATH else None
         
-    def chat_completion(self, messages: list, temperature: float = None, max_tokens: int = None) -> dict:
-        """Call NVIDIA NIM API using OpenAI-compatible interface"""
+    def chat_completion(self, messages: list, temperature: float = None, max_tokens: int = None,
+                        stream: bool = False, on_delta=None, usage_tracker: TokenUsageTracker = None,
+                        json_schema: dict = None) -> dict:
+        """Call NVIDIA NIM API using OpenAI-compatible interface
         
+        With stream=True, on_delta(text) is called for every content delta as
+        it arrives and the assembled text is returned at the end. A json_schema
+        is enforced server-side through NIM guided decoding.
+        """
+        with timer("llm_call_seconds", mode="stream" if stream else "complete"):
+            if stream:
+                return self._stream_completion(messages, temperature, max_tokens, on_delta, usage_tracker,
+                                               json_schema)
+            
+            try:
+                started = time.perf_counter()
+                completion = self.client.chat.completions.create(
+                    model=self.model,
+                    messages=messages,
+                    temperature=temperature or config.LLM_TEMPERATURE,
+                    max_tokens=max_tokens or config.LLM_MAX_TOKENS,
+                    response_format={"type": "json_object"},  # Force JSON output
+                    extra_body=guided_json_body(json_schema)
+                )
+                
+                self._record_usage(completion.usage, usage_tracker)
+                content = completion.choices[0].message.content
+                if self.recorder is not None:
+                    self.recorder.record(messages, content, self.model, time.perf_counter() - started,
+                                         usage=completion.usage)
+                return content
+                
+            except Exception as e:
+                print(f"NVIDIA API Error: {e}")
+                raise
+    
+    def _record_usage(self, usage, usage_tracker: TokenUsageTracker = None):
+        self.usage.record(self.model, usage)
+        if usage_tracker is not None:
+            usage_tracker.record(self.model, usage)
+    
+    def _stream_completion(self, messages: list, temperature: float, max_tokens: int, on_delta,
+                           usage_tracker: TokenUsageTracker = None, json_schema: dict = None) -> str:
         try:
-            completion = self.client.chat.completions.create(
+            started = time.perf_counter()
+            chunks = self.client.chat.completions.create(
                 model=self.model,
                 messages=messages,
                 temperature=temperature or config.LLM_TEMPERATURE,
                 max_tokens=max_tokens or config.LLM_MAX_TOKENS,
-                response_format={"type": "json_object"}  # Force JSON output
+                response_format={"type": "json_object"},
+                extra_body=guided_json_body(json_schema),
+                stream=True,
+                stream_options={"include_usage": True}
             )
             
-            return completion.choices[0].message.content
+            parts = []
+            usage = None
+            ttft = None
+            for chunk in chunks:
+                # Usage arrives on the final chunk, which has no choices
+                if getattr(chunk, "usage", None):
+                    usage = chunk.usage
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    if ttft is None:
+                        ttft = time.perf_counter() - started
+                    parts.append(delta)
+                    if on_delta:
+                        on_delta(delta)
+            
+            self._record_usage(usage, usage_tracker)
+            content = "".join(parts)
+            if self.recorder is not None:
+                self.recorder.record(messages, content, self.model, time.perf_counter() - started,
+                                     ttft=ttft, usage=usage, stream=True)
+            return content
             
         except Exception as e:
             print(f"NVIDIA API Error: {e}")
@@ -39,29 +163,20 @@ class NVIDIAAIClient:
         try:
             response_text = self.chat_completion(messages)
             
-            # Parse JSON response
-            try:
-                return json.loads(response_text)
-            except json.JSONDecodeError as e:
-                print(f"JSON Parse Error: {e}")
-                print(f"Raw response: {response_text[:200]}...")
-                
-                # Try to extract JSON from text if it's wrapped
-                import re
-                json_match = re.search(r'\{.*\}', response_text, re.DOTALL)
-                if json_match:
-                    try:
-                        return json.loads(json_match.group())
-                    except:
-                        pass
+            # Parse JSON response, recovering objects wrapped in prose or truncated
+            parsed = extract_json_object(response_text)
+            if parsed is None:
+                print(f"JSON Parse Error: no JSON object in response")
+                print(f"Raw response: {(response_text or '')[:200]}...")
                 
                 # Fallback response
                 return {
                     "user_message": "I need help creating your TikTok ad. Let me guide you through the steps.",
-                    "internal_reasoning": f"LLM returned non-JSON: {response_text[:100]}...",
+                    "internal_reasoning": f"LLM returned non-JSON: {(response_text or '')[:100]}...",
                     "collected_data": {},
                     "next_step": "continue"
                 }
+            return parsed
                 
         except Exception as e:
             print(f"Error in create_structured_response: {e}")
@@ -71,3 +186,68 @@ class NVIDIAAIClient:
                 "collected_data": {},
                 "next_step": "continue"
             }
+
+
+class AsyncNVIDIAAIClient:
+    """Asyncio NVIDIA NIM client for serving many sessions from one event loop.
+
+    All calls share a single HTTP connection pool, at most ``max_concurrency``
+    requests are in flight at once, and every call (including time spent
+    waiting for a slot) is bounded by ``deadline`` seconds. A missed deadline
+    raises ``asyncio.TimeoutError`` so the caller can use its fallback.
+    """
+
+    def __init__(self, max_concurrency: int = None, deadline: float = None):
+        self.max_concurrency = max_concurrency or config.LLM_MAX_CONCURRENCY
+        self.deadline = deadline or config.LLM_CALL_DEADLINE
+        self.client = AsyncOpenAI(
+            base_url=config.NVIDIA_BASE_URL,
+            api_key=config.NVIDIA_API_KEY,
+            timeout=self.deadline,
+            max_retries=0,  # retries would blow through the deadline
+            http_client=DefaultAsyncHttpxClient(
+                limits=httpx.Limits(
+                    max_connections=self.max_concurrency,
+                    max_keepalive_connections=self.max_concurrency
+                )
+            )
+        )
+        self.model = config.NVIDIA_MODEL
+        self.usage = TokenUsageTracker()
+        self.recorder = LLMRecorder(config.LLM_RECORD_PATH) if config.LLM_RECORD_PATH else None
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+    async def chat_completion(self, messages: list, temperature: float = None, max_tokens: int = None,
+                              deadline: float = None, usage_tracker: TokenUsageTracker = None,
+                              json_schema: dict = None) -> str:
+        """Call NVIDIA NIM API, raising asyncio.TimeoutError past the deadline"""
+        with timer("llm_call_seconds", mode="async"):
+            return await asyncio.wait_for(
+                self._limited_completion(messages, temperature, max_tokens, usage_tracker, json_schema),
+                timeout=deadline or self.deadline
+            )
+
+    async def _limited_completion(self, messages: list, temperature: float, max_tokens: int,
+                                  usage_tracker: TokenUsageTracker = None, json_schema: dict = None) -> str:
+        async with self._semaphore:
+            started = time.perf_counter()
+            completion = await self.client.chat.completions.create(
+                model=self.model,
+                messages=messages,
+                temperature=temperature or config.LLM_TEMPERATURE,
+                max_tokens=max_tokens or config.LLM_MAX_TOKENS,
+                response_format={"type": "json_object"},
+                extra_body=guided_json_body(json_schema)
+            )
+            self.usage.record(self.model, completion.usage)
+            if usage_tracker is not None:
+                usage_tracker.record(self.model, completion.usage)
+            content = completion.choices[0].message.content
+            if self.recorder is not None:
+                self.recorder.record(messages, content, self.model, time.perf_counter() - started,
+                                     usage=completion.usage)
+            return content
+
+    async def close(self):
+        """Release the shared connection pool"""
+        await self.client.close()
@@ -0,0 +1,70 @@
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from typing import Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+from config import config
+
+SUCCESS_PAGE = b"<html><body><h3>TikTok authorization received.</h3>You can close this window.</body></html>"
+ERROR_PAGE = b"<html><body><h3>TikTok authorization failed.</h3>Return to the terminal for details.</body></html>"
+
+
+class OAuthCallbackServer:
+    """One-shot listener for the OAuth redirect on config.REDIRECT_URI.
+
+    Captures the ``code`` (or ``error``) query parameter from the first
+    request to the callback path whose ``state`` matches, then stops.
+    """
+
+    def __init__(self, redirect_uri: str = None, state: str = None):
+        url = urlparse(redirect_uri or config.REDIRECT_URI)
+        self.path = url.path or "/"
+        self.state = state
+        self.code: Optional[str] = None
+        self.error: Optional[str] = None
+        self._received = threading.Event()
+        self.httpd = HTTPServer((url.hostname or "localhost", url.port or 80), _make_handler(self))
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+
+    def wait(self, timeout: float = None) -> Tuple[Optional[str], Optional[str]]:
+        """Block until the redirect arrives; returns (code, error), both None on timeout"""
+        self._received.wait(timeout)
+        return self.code, self.error
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def _receive(self, params: dict) -> bool:
+        if self.state is not None and params.get("state") != self.state:
+            return False
+        self.code = params.get("code") or params.get("auth_code")
+        self.error = params.get("error_description") or params.get("error")
+        if not self.code and not self.error:
+            self.error = "Callback did not include an authorization code"
+        self._received.set()
+        return self.error is None
+
+
+def _make_handler(server: OAuthCallbackServer):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path != server.path:
+                self.send_error(404)
+                return
+            params = {k: v[0] for k, v in parse_qs(url.query).items()}
+            page = SUCCESS_PAGE if server._receive(params) else ERROR_PAGE
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html")
+            self.send_header("Content-Length", str(len(page)))
+            self.end_headers()
+            self.wfile.write(page)
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
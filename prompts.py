@@ -1,20 +1,18 @@
+import json
+from config import config
+from rules import prompt_rules
+
 class PromptTemplates:
     SYSTEM_PROMPT = """You are a helpful TikTok Ads creation assistant. Your role is to guide users through creating a TikTok ad campaign by collecting specific information.
 
 CRITICAL INSTRUCTION: You MUST output ONLY a valid JSON object. No additional text, explanations, or markdown. ONLY the JSON.
 
 You MUST follow these business rules:
-1. Campaign name must be at least 3 characters
-2. Objective must be either "TRAFFIC" or "CONVERSIONS"
-3. Ad text cannot exceed 100 characters
-4. Music selection rules:
-   - If objective is "CONVERSIONS", music is REQUIRED
-   - If objective is "TRAFFIC", music is optional
-   - Users can choose existing music, upload custom music, or select no music
+""" + prompt_rules() + """
 
 COLLECTION ORDER (follow this strictly):
 1. Campaign name (ask first)
-2. Objective (TRAFFIC or CONVERSIONS)
+2. Objective
 3. Ad text
 4. Call-to-action (CTA)
 5. Music option
@@ -22,7 +20,7 @@ COLLECTION ORDER (follow this strictly):
 MUSIC OPTIONS (handle exactly as described):
 A. Existing Music ID: When user chooses this, set next_step to "ask_music_id"
 B. Custom Music: When user chooses this, set next_step to "ask_custom_music"  
-C. No Music: Only allowed if Objective = TRAFFIC
+C. No Music: When user chooses this, set music_option to "NO_MUSIC" if the business rules allow it
 
 OUTPUT FORMAT (EXACT JSON STRUCTURE):
 {
@@ -123,6 +121,25 @@ EXAMPLE 5 - All fields collected, ready for validation:
 
 REMEMBER: Always output ONLY JSON. No other text."""
 
+    # Compact variant: same rules and output contract, one minified example.
+    # Kept as a constant so the system prefix is byte-identical across turns
+    # and server-side prefix/KV caching can hit.
+    COMPACT_SYSTEM_PROMPT = """You are a TikTok Ads creation assistant. Output ONLY one valid JSON object, no other text.
+
+Business rules:
+""" + prompt_rules() + """
+
+Collect in order: campaign_name, objective, ad_text, cta, music.
+Music options: existing Music ID -> next_step "ask_music_id"; custom upload -> next_step "ask_custom_music"; no music -> music_option "NO_MUSIC" if the business rules allow it.
+
+Output keys: user_message, internal_reasoning, collected_data (all six keys: campaign_name, objective, ad_text, cta, music_option, music_id; "" if unknown), next_step.
+next_step is one of: campaign_name, objective, ad_text, cta, music, ask_music_id, ask_custom_music, validation. Use "validation" once all required fields are collected.
+
+The user message gives State (fields already collected), Missing (fields still needed) and what the user said.
+
+Example:
+{"user_message":"Great! Now what's your campaign objective? (Choose: TRAFFIC or CONVERSIONS)","internal_reasoning":"User provided 'Summer Sale' as campaign name. Need objective.","collected_data":{"campaign_name":"Summer Sale","objective":"","ad_text":"","cta":"","music_option":"","music_id":""},"next_step":"objective"}"""
+
     CONVERSATION_START = {
         "user_message": "Hello! I'll help you create a TikTok ad campaign. Let's start with the campaign name. What would you like to name your campaign?",
         "internal_reasoning": "Starting fresh conversation. Need to collect campaign name first.",
@@ -143,13 +160,7 @@ DATA TO VALIDATE:
 {campaign_name_data}
 
 VALIDATION RULES:
-1. Campaign name: Must be at least 3 characters
-2. Objective: Must be "TRAFFIC" or "CONVERSIONS"
-3. Ad text: Must not exceed 100 characters, required field
-4. CTA: Required field
-5. Music logic:
-   - If objective = "CONVERSIONS": Music is REQUIRED (music_option cannot be "NO_MUSIC")
-   - If objective = "TRAFFIC": Music is optional
+""" + prompt_rules() + """
 
 OUTPUT ONLY JSON in this exact format:
 {
@@ -217,3 +228,38 @@ EXAMPLE OUTPUT for geo-restriction:
     def format_validation_data(collected_data):
         """Format collected data for validation prompt"""
         return json.dumps(collected_data, indent=2)
+
+
+class PromptBuilder:
+    """Builds the chat messages for one conversation turn.
+    
+    "full" mode sends SYSTEM_PROMPT plus the indented collected data.
+    "compact" mode sends COMPACT_SYSTEM_PROMPT, the collected fields as
+    minified JSON and only the names of the fields still missing.
+    """
+    
+    MODES = ("full", "compact")
+    
+    def __init__(self, mode: str = None):
+        self.mode = mode or config.PROMPT_MODE
+        if self.mode not in self.MODES:
+            raise ValueError(f"Unknown prompt mode '{self.mode}', expected one of: {', '.join(self.MODES)}")
+    
+    def build_messages(self, user_input: str, collected_data: dict) -> list:
+        if self.mode == "compact":
+            return self._compact_messages(user_input, collected_data)
+        
+        context = f"Current collected data: {json.dumps(collected_data, indent=2)}"
+        return [
+            {"role": "system", "content": PromptTemplates.SYSTEM_PROMPT},
+            {"role": "user", "content": f"{context}\n\nUser says: {user_input}"}
+        ]
+    
+    def _compact_messages(self, user_input: str, collected_data: dict) -> list:
+        collected = {k: v for k, v in collected_data.items() if v}
+        missing = [k for k, v in collected_data.items() if not v]
+        state = json.dumps(collected, separators=(',', ':'), ensure_ascii=False)
+        return [
+            {"role": "system", "content": PromptTemplates.COMPACT_SYSTEM_PROMPT},
+            {"role": "user", "content": f"State:{state}\nMissing:{','.join(missing)}\nUser says: {user_input}"}
+        ]
@@ -0,0 +1,153 @@
+"""Retry scheduling and rate limiting for TikTok campaign submissions.
+
+RetryScheduler retries in a loop (never recursively), but only errors that
+TikTokAPI.interpret_api_error marks as transient (auto_retry: expired token,
+rate limit, server error). Errors the user has to act on are returned at
+once. Delays use
+exponential backoff with full jitter, capped by a maximum elapsed budget.
+Per-code hooks run before a retry; the 40003 hook refreshes the OAuth
+token. Every attempt from every session first takes a token from one
+process-wide RateLimiter, which keeps the process under the TikTok QPS
+quota.
+"""
+import random
+import threading
+from typing import Callable, Dict, Optional, Tuple
+from config import config
+from metrics import counter, histogram
+from simulation import shared_clock, shared_rng
+
+# A hook gets the API and the failed response and returns False to stop retrying
+RetryHook = Callable[[object, Dict], bool]
+
+SUBMIT_RESPONSES = counter("campaign_responses_total", "Campaign submission responses, by TikTok code")
+SUBMIT_RETRIES = counter("campaign_retries_total", "Campaign submission retries, by the code retried")
+RATE_LIMIT_WAIT = histogram("rate_limit_wait_seconds", "Time submissions waited on the rate limiter")
+
+
+class RateLimiter:
+    """Blocking token bucket; qps <= 0 disables limiting.
+
+    Tokens are reserved under the lock and waited for outside it, so callers
+    queue up fairly rather than spinning.
+    """
+
+    def __init__(self, qps: float, burst: float = None, clock=None):
+        self.qps = qps
+        self.capacity = burst or max(qps, 1.0)
+        self.clock = clock or shared_clock()
+        self.tokens = self.capacity
+        self.updated = self.clock.now()
+        self.waited = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """Take one token, sleeping until it is available; returns the wait"""
+        if self.qps <= 0:
+            return 0.0
+        with self._lock:
+            now = self.clock.now()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.qps)
+            self.updated = now
+            self.tokens -= 1
+            wait = -self.tokens / self.qps if self.tokens < 0 else 0.0
+            self.waited += wait
+        if wait:
+            self.clock.sleep(wait, "rate_limit_wait")
+        return wait
+
+
+class RetryPolicy:
+    """Exponential backoff with full jitter and a maximum elapsed budget"""
+
+    def __init__(self, max_attempts: int = None, base_delay: float = None,
+                 max_delay: float = None, max_elapsed: float = None):
+        self.max_attempts = max_attempts or config.RETRY_MAX_ATTEMPTS
+        self.base_delay = base_delay if base_delay is not None else config.RETRY_BASE_DELAY
+        self.max_delay = max_delay if max_delay is not None else config.RETRY_MAX_DELAY
+        self.max_elapsed = max_elapsed if max_elapsed is not None else config.RETRY_MAX_ELAPSED
+
+    def delay(self, attempt: int, rng: random.Random) -> float:
+        """Sleep before retry number ``attempt`` (1-based)"""
+        return rng.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+
+class RetryScheduler:
+    """Submits a campaign, retrying retryable errors until the policy gives up"""
+
+    def __init__(self, policy: RetryPolicy = None, limiter: RateLimiter = None,
+                 hooks: Dict[int, RetryHook] = None, clock=None, rng=None):
+        self.policy = policy or RetryPolicy()
+        self.limiter = limiter or shared_limiter()
+        self.hooks = hooks or {}
+        self.clock = clock or shared_clock()
+        self.rng = rng or shared_rng()
+
+    def submit(self, api, ad_payload: Dict, on_retry: Callable[[int, Dict, Dict, float], None] = None,
+               max_attempts: int = None) -> Tuple[bool, Dict, int]:
+        """Returns (success, last response, attempts made).
+
+        ``on_retry(attempt, response, interpretation, delay)`` is called before
+        each backoff sleep. After a hook such as a token refresh succeeds, the
+        retry goes out without backoff, because the failure was not load.
+        ``max_attempts`` overrides the policy for this submission.
+        """
+        max_attempts = max_attempts or self.policy.max_attempts
+        started = self.clock.now()
+        attempt = 0
+        while True:
+            attempt += 1
+            RATE_LIMIT_WAIT.observe(self.limiter.acquire())
+            success, response = api.create_ad_campaign(ad_payload)
+            SUBMIT_RESPONSES.inc(code=response.get("code"))
+            if success:
+                return True, response, attempt
+
+            interpretation = api.interpret_api_error(response)
+            if not interpretation["auto_retry"] or attempt >= max_attempts:
+                return False, response, attempt
+
+            hook = self.hooks.get(response.get("code"))
+            if hook is not None:
+                if not hook(api, response):
+                    return False, response, attempt
+                delay = 0.0
+            else:
+                delay = self.policy.delay(attempt, self.rng)
+
+            if self.clock.now() - started + delay > self.policy.max_elapsed:
+                return False, response, attempt
+            SUBMIT_RETRIES.inc(code=response.get("code"))
+            if on_retry:
+                on_retry(attempt, response, interpretation, delay)
+            if delay:
+                self.clock.sleep(delay, "retry_backoff")
+
+
+def token_refresh_hook(auth) -> RetryHook:
+    """40003 hook: refresh the OAuth token (single-flight across sessions)"""
+    def refresh(api, response: Dict) -> bool:
+        if not auth.refresh_access_token():
+            return False
+        if api.auth is None:
+            api.access_token = auth.access_token
+        return True
+    return refresh
+
+
+def submission_scheduler(auth, **kwargs) -> RetryScheduler:
+    """Scheduler with the standard hooks for submissions made with ``auth``"""
+    return RetryScheduler(hooks={40003: token_refresh_hook(auth)}, **kwargs)
+
+
+_shared_limiter: Optional[RateLimiter] = None
+_shared_lock = threading.Lock()
+
+
+def shared_limiter() -> RateLimiter:
+    """Process-wide submission limiter, created on first use"""
+    global _shared_limiter
+    with _shared_lock:
+        if _shared_limiter is None:
+            _shared_limiter = RateLimiter(config.SUBMIT_QPS, config.SUBMIT_BURST or None)
+        return _shared_limiter
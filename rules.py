@@ -0,0 +1,160 @@
+"""Declarative business rules for ad campaigns.
+
+RULES is the single source for the validator and for the rules sections of
+the LLM prompts, so the model is never told something the validator does
+not enforce (or the reverse). compile_validator() turns the table into one
+generated function that normalises each field once and checks every rule
+in a single pass; compile_key_validators() does the same per error key,
+for the single-field checks used while a conversation collects the ad, and
+compile_field_validators() per checked field.
+
+Each rule checks one field, optionally only when another field has a given
+value ("when"), and reports under its "key" in the validate_all_fields
+error dict. The first failing rule per key wins; a rule's 1-based position
+within its key is its validate_batch error code.
+"""
+from typing import Callable, Dict, List, Tuple
+from config import config
+
+MUSIC_OPTIONS = ("EXISTING", "CUSTOM", "NO_MUSIC")
+
+# Display label and normalisation for every validated field
+FIELDS = {
+    "campaign_name": {"label": "Campaign name"},
+    "objective": {"label": "Objective", "upper": True},
+    "ad_text": {"label": "Ad text"},
+    "cta": {"label": "CTA"},
+    "music_option": {"label": "Music option", "upper": True},
+    "music_id": {"label": "Music ID"},
+}
+
+# Checks: required (non-empty), min_length (after trimming whitespace),
+# max_length, one_of and not_one_of (against the normalised value)
+RULES = [
+    {"key": "campaign_name", "field": "campaign_name", "check": "min_length",
+     "value": config.MIN_CAMPAIGN_NAME_LENGTH,
+     "message": f"Campaign name must be at least {config.MIN_CAMPAIGN_NAME_LENGTH} characters"},
+    {"key": "objective", "field": "objective", "check": "one_of",
+     "value": tuple(config.ALLOWED_OBJECTIVES),
+     "message": f"Objective must be one of: {', '.join(config.ALLOWED_OBJECTIVES)}"},
+    {"key": "ad_text", "field": "ad_text", "check": "required",
+     "message": "Ad text is required"},
+    {"key": "ad_text", "field": "ad_text", "check": "max_length",
+     "value": config.MAX_AD_TEXT_LENGTH,
+     "message": f"Ad text must be {config.MAX_AD_TEXT_LENGTH} characters or less"},
+    {"key": "cta", "field": "cta", "check": "required",
+     "message": "Call-to-action is required"},
+    {"key": "music_logic", "field": "music_option", "check": "not_one_of",
+     "value": ("NO_MUSIC",), "when": ("objective", "CONVERSIONS"),
+     "message": "Music is required for Conversions objective",
+     "prompt": 'Music is REQUIRED when Objective is "CONVERSIONS" (Music option cannot be "NO_MUSIC"); '
+               'optional otherwise'},
+    {"key": "music_logic", "field": "music_id", "check": "required",
+     "when": ("music_option", "EXISTING"),
+     "message": "Music ID is required for existing music"},
+    {"key": "music_logic", "field": "music_option", "check": "one_of",
+     "value": MUSIC_OPTIONS,
+     "message": "Invalid music option"},
+]
+
+
+def group_rules(rules: List[Dict] = None, by: str = "key") -> Dict[str, List[Dict]]:
+    """Rules by error key (or by ``by``, e.g. "field"), in table order"""
+    groups = {}
+    for rule in rules or RULES:
+        groups.setdefault(rule[by], []).append(rule)
+    return groups
+
+
+def error_messages(rules: List[Dict] = None) -> Dict[str, Dict[int, str]]:
+    """Message for every (key, code) pair validate_batch can report"""
+    return {
+        key: {code: rule["message"] for code, rule in enumerate(group, start=1)}
+        for key, group in group_rules(rules).items()
+    }
+
+
+def describe_rule(rule: Dict) -> str:
+    """Prompt wording for one rule"""
+    if "prompt" in rule:
+        return rule["prompt"]
+    label = FIELDS[rule["field"]]["label"]
+    check = rule["check"]
+    if check == "required":
+        text = f"{label} is required"
+    elif check == "min_length":
+        text = f"{label} must be at least {rule['value']} characters"
+    elif check == "max_length":
+        text = f"{label} must not exceed {rule['value']} characters"
+    elif check == "one_of":
+        text = f"{label} must be one of: " + ", ".join(f'"{value}"' for value in rule["value"])
+    else:
+        text = f"{label} cannot be " + " or ".join(f'"{value}"' for value in rule["value"])
+    if "when" in rule:
+        field, value = rule["when"]
+        text += f' when {FIELDS[field]["label"]} is "{value}"'
+    return text
+
+
+def prompt_rules(rules: List[Dict] = None) -> str:
+    """Numbered rules section for the LLM prompts"""
+    return "\n".join(f"{number}. {describe_rule(rule)}" for number, rule in enumerate(rules or RULES, start=1))
+
+
+def compile_validator(rules: List[Dict] = None) -> Callable[[Dict], Tuple[bool, Dict[str, str]]]:
+    """Generate the fused validate(ad_data) -> (is_valid, errors) function"""
+    namespace = {}
+    lines = ["def validate(ad_data):", "    errors = {}"]
+    for field, spec in FIELDS.items():
+        normalise = ".upper()" if spec.get("upper") else ""
+        lines.append(f"    v_{field} = (ad_data.get({field!r}) or ''){normalise}")
+
+    index = 0
+    for key, group in group_rules(rules).items():
+        keyword = "if"
+        for rule in group:
+            namespace[f"_message_{index}"] = rule["message"]
+            condition = _condition(rule, index, namespace)
+            if "when" in rule:
+                field, value = rule["when"]
+                condition = f"v_{field} == {value!r} and {condition}"
+            lines.append(f"    {keyword} {condition}:")
+            lines.append(f"        errors[{key!r}] = _message_{index}")
+            keyword = "elif"
+            index += 1
+    lines.append("    return not errors, errors")
+
+    exec(compile("\n".join(lines), "<rules>", "exec"), namespace)
+    return namespace["validate"]
+
+
+def _condition(rule: Dict, index: int, namespace: Dict) -> str:
+    """Python expression that is true when the rule fails"""
+    value = f"v_{rule['field']}"
+    check = rule["check"]
+    if check == "required":
+        return f"not {value}"
+    if check == "min_length":
+        return f"len({value}.strip()) < {int(rule['value'])}"
+    if check == "max_length":
+        return f"len({value}) > {int(rule['value'])}"
+    if check in ("one_of", "not_one_of"):
+        namespace[f"_values_{index}"] = frozenset(rule["value"])
+        operator = "not in" if check == "one_of" else "in"
+        return f"{value} {operator} _values_{index}"
+    raise ValueError(f"Unknown rule check '{check}'")
+
+
+def compile_key_validators(rules: List[Dict] = None) -> Dict[str, Callable[[Dict], Tuple[bool, Dict[str, str]]]]:
+    """One generated validator per error key, for checking a field as it is collected"""
+    return {key: compile_validator(group) for key, group in group_rules(rules).items()}
+
+
+def compile_field_validators(rules: List[Dict] = None) -> Dict[str, Callable[[Dict], Tuple[bool, Dict[str, str]]]]:
+    """One generated validator per field, checking only the rules on that field"""
+    return {field: compile_validator(group) for field, group in group_rules(rules, by="field").items()}
+
+
+validate_ad = compile_validator()
+validate_key = compile_key_validators()
+validate_field = compile_field_validators()
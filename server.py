@@ -0,0 +1,464 @@
+"""Multi-session HTTP/WebSocket server for the ad-creation agent.
+
+    python server.py --port 8081
+
+    POST   /sessions                 {"auth_code": "valid_code"}  -> 201 active, 202 queued
+                                     add "resume": id to continue a checkpointed session (409 while it is open)
+    GET    /sessions/{id}            status, queue position, stage, collected data, token usage, last output
+    POST   /sessions/{id}/messages   {"text": "..."}              -> engine output, 409 unless active
+    GET    /sessions/{id}/ws         WebSocket: send {"text"}, receive "token" then "output" frames
+    DELETE /sessions/{id}
+    GET    /health, /metrics
+
+Every session has its own conversation state, TikTokAuth and TikTokAPI. The
+LLM clients, response cache, fast path, HTTP transport, music cache and
+submission rate limiter are shared. At most SERVER_MAX_SESSIONS sessions are
+active; later ones wait in a FIFO queue of up to SERVER_MAX_QUEUED and are
+admitted as slots free up. Sessions idle for SERVER_IDLE_TIMEOUT are evicted.
+With the session store enabled every turn is checkpointed, so evicted
+sessions, or sessions from before a restart, can be resumed by id.
+"""
+import argparse
+import asyncio
+import functools
+import json
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+from aiohttp import WSMsgType, web
+from config import config
+from app import TikTokAdAgent
+from auth import TikTokAuth
+from engine import ConversationEngine, OUTCOME_READY, STAGE_DONE
+from metrics import REGISTRY, counter, histogram, timer
+from nvidia_client import TokenUsageTracker
+from retry import submission_scheduler
+from session_store import SessionStore
+from tiktok_api import TikTokAPI
+
+STATUS_QUEUED = "queued"
+STATUS_ACTIVE = "active"
+STATUS_FINISHED = "finished"
+STATUS_CLOSED = "closed"
+
+SESSION_EVENTS = counter("server_sessions_total", "Server sessions, by lifecycle event")
+histogram("server_step_seconds", "Time to handle one session message")
+
+
+class ServerBusy(Exception):
+    """Raised when both the active sessions and the waiting queue are full"""
+
+
+class AuthFailed(Exception):
+    """Raised when the session's authorization code is rejected"""
+
+
+class UnknownSession(Exception):
+    """Raised when resuming a session id that has no checkpoint"""
+
+
+class SessionConflict(Exception):
+    """Raised when resuming a session that is still open or already being resumed"""
+
+
+class SessionInactive(Exception):
+    """Raised when a message arrives for a session that is queued, finished or closed"""
+
+
+class Session:
+    def __init__(self, session_id: str, auth: TikTokAuth, engine: ConversationEngine, usage: TokenUsageTracker):
+        self.id = session_id
+        self.auth = auth
+        self.engine = engine
+        self.usage = usage
+        self.status = STATUS_QUEUED
+        self.state: Optional[Dict] = None
+        self.output: Optional[Dict] = None
+        self.submission: Optional[Dict] = None
+        self.last_seen = time.monotonic()
+        self.lock = asyncio.Lock()
+        self.admitted = asyncio.Event()
+
+    @property
+    def api(self) -> TikTokAPI:
+        return self.engine.api
+
+    def touch(self):
+        self.last_seen = time.monotonic()
+
+
+class SessionManager:
+    """Admission, stepping and eviction of concurrent sessions"""
+
+    def __init__(self, agent: TikTokAdAgent, max_active: int = None, max_queued: int = None,
+                 idle_timeout: float = None, executor: ThreadPoolExecutor = None,
+                 store: SessionStore = None):
+        self.agent = agent
+        self.store = store
+        self.max_active = max_active or config.SERVER_MAX_SESSIONS
+        self.max_queued = config.SERVER_MAX_QUEUED if max_queued is None else max_queued
+        self.idle_timeout = idle_timeout or config.SERVER_IDLE_TIMEOUT
+        self.executor = executor or ThreadPoolExecutor(max_workers=config.SERVER_WORKER_THREADS)
+        self.sessions: Dict[str, Session] = {}
+        self.queue: deque = deque()
+        self.active = 0
+        # Ids with a resume in progress (loaded but not yet registered in sessions)
+        self._resuming = set()
+
+    async def create(self, auth_code: str, resume_id: str = None) -> Session:
+        if resume_id is None:
+            return await self._create(auth_code)
+        # An open session may be mid-step or mid-submit; resuming it again could submit twice
+        if resume_id in self.sessions or resume_id in self._resuming:
+            raise SessionConflict(resume_id)
+        self._resuming.add(resume_id)
+        try:
+            return await self._create(auth_code, resume_id)
+        finally:
+            self._resuming.discard(resume_id)
+
+    async def _create(self, auth_code: str, resume_id: str = None) -> Session:
+        restored = None
+        if resume_id:
+            restored = self.store.load(resume_id) if self.store else None
+            if restored is None:
+                raise UnknownSession(resume_id)
+
+        finished = restored is not None and restored["stage"] == STAGE_DONE
+        if not finished and self.active >= self.max_active and len(self.queue) >= self.max_queued:
+            SESSION_EVENTS.inc(event="rejected")
+            raise ServerBusy()
+
+        # Sessions refresh lazily on use, so idle ones don't each hold a timer thread
+        auth = TikTokAuth(auto_refresh=False)
+        loop = asyncio.get_running_loop()
+        success, message = await loop.run_in_executor(self.executor, auth.handle_oauth_callback, auth_code)
+        if not success:
+            SESSION_EVENTS.inc(event="auth_failed")
+            raise AuthFailed(message)
+
+        # The agent is shared, so LLM tokens are counted per session
+        usage = TokenUsageTracker()
+        engine = ConversationEngine(functools.partial(self.agent.get_llm_response, usage_tracker=usage),
+                                    TikTokAPI(auth=auth),
+                                    functools.partial(self.agent.aget_llm_response, usage_tracker=usage))
+        session = Session(resume_id or uuid.uuid4().hex, auth, engine, usage)
+        session.state = restored
+        self.sessions[session.id] = session
+        SESSION_EVENTS.inc(event="resumed" if restored else "created")
+
+        if finished:
+            # Completed sessions need no slot; submit if the process died before it did
+            session.status = STATUS_FINISHED
+            session.output = engine.resume_session(restored)
+            if restored["outcome"] == OUTCOME_READY and not restored.get("submitted"):
+                # Held so the idle sweep can't close the session mid-submit
+                async with session.lock:
+                    if restored.get("submitting"):
+                        session.submission = _interrupted_submission()
+                    else:
+                        await self._submit_async(session)
+            session.admitted.set()
+        elif self.active < self.max_active:
+            self._admit(session)
+        else:
+            self.queue.append(session)
+        return session
+
+    def get(self, session_id: str) -> Optional[Session]:
+        session = self.sessions.get(session_id)
+        if session is not None:
+            session.touch()
+        return session
+
+    def position(self, session: Session) -> Optional[int]:
+        """1-based place in the waiting queue, or None once admitted"""
+        if session.status != STATUS_QUEUED:
+            return None
+        return self.queue.index(session) + 1
+
+    def describe(self, session: Session) -> Dict:
+        state = session.state or {}
+        return {
+            "session_id": session.id,
+            "status": session.status,
+            "position": self.position(session),
+            "stage": state.get("stage"),
+            "outcome": state.get("outcome"),
+            "collected_data": state.get("collected_data"),
+            "output": session.output,
+            "submission": session.submission,
+            "token_usage": session.usage.totals(),
+        }
+
+    async def step(self, session: Session, text: str, on_token=None) -> Dict:
+        """Advance an active session; submits the campaign once it is confirmed"""
+        async with session.lock:
+            # Checked under the lock: a message queued behind the final step must not run again
+            if session.status != STATUS_ACTIVE:
+                raise SessionInactive(session.status)
+            with timer("server_step_seconds"):
+                state, output = await session.engine.astep(session.state, text, on_token, self.executor)
+                session.state = state
+                self._checkpoint(session)
+                if output["finished"]:
+                    if (state["outcome"] == OUTCOME_READY and not state.get("submitted")
+                            and not state.get("submitting")):
+                        output["submission"] = await self._submit_async(session)
+                    self._release(session, STATUS_FINISHED)
+                session.output = output
+                session.touch()
+                return output
+
+    def close(self, session: Session, event: str = "closed"):
+        self.sessions.pop(session.id, None)
+        if session.status == STATUS_QUEUED:
+            self.queue.remove(session)
+        self._release(session, STATUS_CLOSED)
+        session.admitted.set()  # wake any WebSocket still waiting for a slot
+        session.auth.close()
+        if self.store:
+            self.store.release(session.id)
+        SESSION_EVENTS.inc(event=event)
+
+    def evict_idle(self) -> int:
+        cutoff = time.monotonic() - self.idle_timeout
+        idle = [s for s in self.sessions.values() if s.last_seen < cutoff and not s.lock.locked()]
+        for session in idle:
+            self.close(session, "evicted")
+        return len(idle)
+
+    async def sweep(self, interval: float = None):
+        while True:
+            await asyncio.sleep(interval or config.SERVER_SWEEP_INTERVAL)
+            self.evict_idle()
+
+    def stats(self) -> Dict:
+        return {"active": self.active, "queued": len(self.queue), "sessions": len(self.sessions),
+                "max_active": self.max_active, "max_queued": self.max_queued}
+
+    def _admit(self, session: Session):
+        self.active += 1
+        session.status = STATUS_ACTIVE
+        if session.state is not None:
+            session.output = session.engine.resume_session(session.state)
+        else:
+            session.state, session.output = session.engine.new_session()
+            if self.store:
+                self.store.create(session.state, session.id)
+        session.touch()  # queue time doesn't count towards idleness
+        session.admitted.set()
+
+    def _release(self, session: Session, status: str):
+        """Free the session's slot (if it holds one) and admit the next in line"""
+        if session.status == STATUS_ACTIVE:
+            self.active -= 1
+        session.status = status
+        while self.queue and self.active < self.max_active:
+            self._admit(self.queue.popleft())
+
+    def _checkpoint(self, session: Session):
+        if self.store:
+            self.store.checkpoint(session.id, session.state)
+
+    async def _submit_async(self, session: Session) -> Dict:
+        # Marked in flight first: a session resumed after a crash mid-submit is not resubmitted
+        session.state = {**session.state, "submitting": True}
+        self._checkpoint(session)
+        loop = asyncio.get_running_loop()
+        session.submission = await loop.run_in_executor(self.executor, self._submit, session)
+        session.state = {**session.state, "submitting": False}
+        if session.submission["success"]:
+            # Resuming a submitted session must not create the campaign twice
+            session.state["submitted"] = session.submission["response"]["data"]["campaign_id"]
+        self._checkpoint(session)
+        return session.submission
+
+    def _submit(self, session: Session) -> Dict:
+        scheduler = submission_scheduler(session.auth)
+        success, response, attempts = scheduler.submit(session.api, session.state["ad_payload"])
+        result = {"success": success, "attempts": attempts, "response": response}
+        if not success:
+            result["error"] = session.api.interpret_api_error(response)
+        return result
+
+
+def _interrupted_submission() -> Dict:
+    """Submission result for a session that stopped while its submit was in flight"""
+    return {
+        "success": False,
+        "attempts": None,
+        "response": None,
+        "error": {
+            "explanation": "The submission was interrupted, so the campaign may or may not have been created.",
+            "action": "Check TikTok Ads Manager before creating this campaign again.",
+            "can_retry": False,
+            "auto_retry": False,
+        },
+    }
+
+
+# ----- HTTP handlers ----------------------------------------------------------
+
+def _session_or_404(request: web.Request) -> Session:
+    session = request.app["manager"].get(request.match_info["session_id"])
+    if session is None:
+        raise web.HTTPNotFound(text=json.dumps({"error": "Unknown session"}), content_type="application/json")
+    return session
+
+
+async def _read_json(request: web.Request) -> Dict:
+    try:
+        body = await request.json()
+    except ValueError:
+        body = None
+    if not isinstance(body, dict):
+        raise web.HTTPBadRequest(text=json.dumps({"error": "Expected a JSON object"}),
+                                 content_type="application/json")
+    return body
+
+
+async def create_session(request: web.Request) -> web.Response:
+    manager: SessionManager = request.app["manager"]
+    body = await _read_json(request)
+    try:
+        session = await manager.create(str(body.get("auth_code", "")), body.get("resume"))
+    except UnknownSession:
+        return web.json_response({"error": "Unknown session"}, status=404)
+    except SessionConflict:
+        return web.json_response({"error": "Session is already open; use it or delete it first"}, status=409)
+    except ServerBusy:
+        return web.json_response({"error": "Server is at capacity, try again later"}, status=503,
+                                 headers={"Retry-After": str(int(config.SERVER_SWEEP_INTERVAL))})
+    except AuthFailed as e:
+        return web.json_response({"error": str(e)}, status=401)
+    status = 201 if session.status == STATUS_ACTIVE else 202
+    return web.json_response(manager.describe(session), status=status)
+
+
+async def get_session(request: web.Request) -> web.Response:
+    session = _session_or_404(request)
+    return web.json_response(request.app["manager"].describe(session))
+
+
+async def post_message(request: web.Request) -> web.Response:
+    manager: SessionManager = request.app["manager"]
+    session = _session_or_404(request)
+    body = await _read_json(request)
+    try:
+        output = await manager.step(session, str(body.get("text", "")))
+    except SessionInactive:
+        return web.json_response(manager.describe(session), status=409)
+    return web.json_response(output)
+
+
+async def delete_session(request: web.Request) -> web.Response:
+    request.app["manager"].close(_session_or_404(request))
+    return web.Response(status=204)
+
+
+async def session_ws(request: web.Request) -> web.WebSocketResponse:
+    manager: SessionManager = request.app["manager"]
+    session = _session_or_404(request)
+    ws = web.WebSocketResponse(heartbeat=30)
+    await ws.prepare(request)
+
+    if session.status == STATUS_QUEUED:
+        await ws.send_json({"type": "queued", "position": manager.position(session)})
+        await session.admitted.wait()
+    await ws.send_json({"type": "session", **manager.describe(session)})
+
+    loop = asyncio.get_running_loop()
+    async for msg in ws:
+        if msg.type != WSMsgType.TEXT:
+            continue
+        try:
+            text = json.loads(msg.data).get("text", "")
+        except (ValueError, AttributeError):
+            text = msg.data
+
+        # Tokens arrive on a worker thread; forward them in order from the loop
+        tokens: asyncio.Queue = asyncio.Queue()
+        forwarder = asyncio.ensure_future(_forward_tokens(ws, tokens))
+        try:
+            output = await manager.step(session, str(text),
+                                        on_token=lambda t: loop.call_soon_threadsafe(tokens.put_nowait, t))
+        except SessionInactive:
+            output = None
+        finally:
+            loop.call_soon(tokens.put_nowait, None)
+            await forwarder
+        if output is None:
+            await ws.send_json({"type": "error", "error": f"Session is {session.status}"})
+            continue
+        await ws.send_json({"type": "output", **output})
+    return ws
+
+
+async def _forward_tokens(ws: web.WebSocketResponse, tokens: asyncio.Queue):
+    while True:
+        text = await tokens.get()
+        if text is None:
+            return
+        if not ws.closed:
+            await ws.send_json({"type": "token", "text": text})
+
+
+async def health(request: web.Request) -> web.Response:
+    return web.json_response(request.app["manager"].stats())
+
+
+async def metrics_endpoint(request: web.Request) -> web.Response:
+    return web.Response(text=REGISTRY.render(), content_type="text/plain")
+
+
+def create_app(agent: TikTokAdAgent = None, **manager_options) -> web.Application:
+    app = web.Application()
+    if "store" not in manager_options and config.SESSION_STORE_ENABLED:
+        manager_options["store"] = SessionStore()
+    app["manager"] = SessionManager(agent or TikTokAdAgent(), **manager_options)
+    app.router.add_post("/sessions", create_session)
+    app.router.add_get("/sessions/{session_id}", get_session)
+    app.router.add_delete("/sessions/{session_id}", delete_session)
+    app.router.add_post("/sessions/{session_id}/messages", post_message)
+    app.router.add_get("/sessions/{session_id}/ws", session_ws)
+    app.router.add_get("/health", health)
+    app.router.add_get("/metrics", metrics_endpoint)
+    app.on_startup.append(_start_sweeper)
+    app.on_cleanup.append(_shutdown)
+    return app
+
+
+async def _start_sweeper(app: web.Application):
+    app["sweeper"] = asyncio.ensure_future(app["manager"].sweep())
+    if app["manager"].store:
+        app["manager"].store.start_compactor()
+
+
+async def _shutdown(app: web.Application):
+    manager: SessionManager = app["manager"]
+    app["sweeper"].cancel()
+    for session in list(manager.sessions.values()):
+        manager.close(session, "shutdown")
+    if manager.agent.async_client is not None:
+        await manager.agent.async_client.close()
+    manager.executor.shutdown(wait=False)
+    if manager.store:
+        manager.store.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve many concurrent ad-creation sessions over HTTP/WebSocket")
+    parser.add_argument("--host", default=config.SERVER_HOST)
+    parser.add_argument("--port", type=int, default=config.SERVER_PORT)
+    parser.add_argument("--max-sessions", type=int, default=config.SERVER_MAX_SESSIONS)
+    parser.add_argument("--max-queued", type=int, default=config.SERVER_MAX_QUEUED)
+    args = parser.parse_args()
+    app = create_app(max_active=args.max_sessions, max_queued=args.max_queued)
+    web.run_app(app, host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
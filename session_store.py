@@ -0,0 +1,258 @@
+"""Durable conversation checkpoints, so sessions survive a crash or restart.
+
+Each session has a base snapshot plus an append-only log of per-turn
+diffs. A diff is a nested merge patch of the keys that changed, so the
+usual checkpoint is a row of a few dozen bytes. The database runs in WAL mode
+with synchronous=NORMAL, which keeps a checkpoint well under a millisecond.
+A background compactor folds the logs back into their snapshots and deletes
+sessions past SESSION_RETENTION.
+
+    python session_store.py list
+    python session_store.py show SESSION_ID
+    python session_store.py compact
+"""
+import argparse
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional
+from config import config
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    session_id TEXT PRIMARY KEY,
+    base TEXT NOT NULL,
+    base_seq INTEGER NOT NULL DEFAULT 0,
+    seq INTEGER NOT NULL DEFAULT 0,
+    created REAL NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS events (
+    session_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    diff TEXT NOT NULL,
+    PRIMARY KEY (session_id, seq)
+) WITHOUT ROWID;
+"""
+
+
+def diff_state(old: Dict, new: Dict) -> Dict:
+    """Merge patch turning old into new (session state keys are never removed)"""
+    patch = {}
+    for key, value in new.items():
+        previous = old.get(key)
+        if isinstance(value, dict) and isinstance(previous, dict):
+            nested = diff_state(previous, value)
+            if nested:
+                patch[key] = nested
+        elif key not in old or previous != value:
+            patch[key] = value
+    return patch
+
+
+def apply_diff(state: Dict, patch: Dict) -> Dict:
+    for key, value in patch.items():
+        if isinstance(value, dict) and isinstance(state.get(key), dict):
+            apply_diff(state[key], value)
+        else:
+            state[key] = value
+    return state
+
+
+def _dumps(value) -> str:
+    return json.dumps(value, separators=(',', ':'), ensure_ascii=False)
+
+
+class SessionStore:
+    """Append-only checkpoint log of conversation states, keyed by session id.
+
+    The last state written for each open session is kept in memory, so a
+    checkpoint only has to diff and append. One connection is shared behind
+    a lock.
+    """
+
+    def __init__(self, db_path: str = None):
+        self.db_path = os.path.expanduser(db_path or config.SESSION_STORE_PATH)
+        directory = os.path.dirname(self.db_path)
+        if directory:
+            os.makedirs(directory, mode=0o700, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.db_path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+        # session id -> (seq, last state as JSON text)
+        self._last: Dict[str, tuple] = {}
+        self._compactor: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def create(self, state: Dict, session_id: str = None) -> str:
+        session_id = session_id or uuid.uuid4().hex
+        raw = _dumps(state)
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO sessions (session_id, base, base_seq, seq, created, updated) "
+                "VALUES (?, ?, 0, 0, ?, ?)",
+                (session_id, raw, now, now)
+            )
+            self._db.execute("DELETE FROM events WHERE session_id = ?", (session_id,))
+            self._last[session_id] = (0, raw)
+        return session_id
+
+    def checkpoint(self, session_id: str, state: Dict) -> bool:
+        """Append the diff since the last checkpoint; returns False if nothing changed"""
+        raw = _dumps(state)
+        with self._lock:
+            last = self._last.get(session_id)
+            if last is None:
+                last = self._read(session_id)
+                if last is None:
+                    raise KeyError(session_id)
+            seq, last_raw = last
+            if raw == last_raw:
+                return False
+            patch = diff_state(json.loads(last_raw), state)
+            seq += 1
+            self._db.execute("BEGIN")
+            try:
+                self._db.execute("INSERT INTO events (session_id, seq, diff) VALUES (?, ?, ?)",
+                                 (session_id, seq, _dumps(patch)))
+                self._db.execute("UPDATE sessions SET seq = ?, updated = ? WHERE session_id = ?",
+                                 (seq, time.time(), session_id))
+                self._db.execute("COMMIT")
+            except sqlite3.Error:
+                self._db.execute("ROLLBACK")
+                raise
+            self._last[session_id] = (seq, raw)
+        return True
+
+    def load(self, session_id: str) -> Optional[Dict]:
+        """Latest checkpointed state, or None for an unknown (or deleted) session"""
+        with self._lock:
+            last = self._read(session_id)
+            if last is None:
+                return None
+            self._last[session_id] = last
+            return json.loads(last[1])
+
+    def release(self, session_id: str):
+        """Forget the in-memory copy of a session that is no longer active"""
+        with self._lock:
+            self._last.pop(session_id, None)
+
+    def delete(self, session_id: str):
+        with self._lock:
+            self._db.execute("DELETE FROM events WHERE session_id = ?", (session_id,))
+            self._db.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+            self._last.pop(session_id, None)
+
+    def list_sessions(self, limit: int = 50) -> List[Dict]:
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT session_id, seq, created, updated FROM sessions ORDER BY updated DESC LIMIT ?",
+                (limit,)
+            ).fetchall()
+        return [{"session_id": r[0], "turns": r[1], "created": r[2], "updated": r[3]} for r in rows]
+
+    def compact(self, retention: float = None) -> Dict[str, int]:
+        """Fold event logs into snapshots and delete sessions idle past retention"""
+        retention = config.SESSION_RETENTION if retention is None else retention
+        cutoff = time.time() - retention
+        with self._lock:
+            expired = [r[0] for r in self._db.execute(
+                "SELECT session_id FROM sessions WHERE updated < ?", (cutoff,))]
+            pending = [r[0] for r in self._db.execute(
+                "SELECT session_id FROM sessions WHERE seq > base_seq AND updated >= ?", (cutoff,))]
+
+        # One short transaction per session, so checkpoints interleave with compaction
+        for session_id in expired:
+            self.delete(session_id)
+        for session_id in pending:
+            with self._lock:
+                last = self._read(session_id)
+                if last is None:
+                    continue
+                seq, raw = last
+                self._db.execute("BEGIN")
+                self._db.execute("UPDATE sessions SET base = ?, base_seq = ? WHERE session_id = ?",
+                                 (raw, seq, session_id))
+                self._db.execute("DELETE FROM events WHERE session_id = ? AND seq <= ?", (session_id, seq))
+                self._db.execute("COMMIT")
+        return {"expired": len(expired), "compacted": len(pending)}
+
+    def start_compactor(self, interval: float = None):
+        """Run compact() every interval seconds on a daemon thread"""
+        if self._compactor is not None:
+            return
+        interval = interval or config.SESSION_COMPACT_INTERVAL
+
+        def loop():
+            while not self._stop.wait(interval):
+                try:
+                    self.compact()
+                except sqlite3.Error as e:
+                    print(f"Session compaction failed: {e}")
+
+        self._compactor = threading.Thread(target=loop, name="session-compactor", daemon=True)
+        self._compactor.start()
+
+    def close(self):
+        self._stop.set()
+        if self._compactor is not None:
+            self._compactor.join()
+            self._compactor = None
+        with self._lock:
+            self._db.close()
+
+    def _read(self, session_id: str) -> Optional[tuple]:
+        """(seq, state JSON) rebuilt from the snapshot and its event log; caller holds the lock"""
+        row = self._db.execute(
+            "SELECT base, base_seq FROM sessions WHERE session_id = ?", (session_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        base, seq = row
+        events = self._db.execute(
+            "SELECT seq, diff FROM events WHERE session_id = ? AND seq > ? ORDER BY seq", (session_id, seq)
+        ).fetchall()
+        if not events:
+            return seq, base
+        state = json.loads(base)
+        for seq, diff in events:
+            apply_diff(state, json.loads(diff))
+        return seq, _dumps(state)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect and compact the session checkpoint store")
+    parser.add_argument("--db", default=None, help="Store path (default: SESSION_STORE_PATH)")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("list", help="Most recently updated sessions")
+    show = commands.add_parser("show", help="Print a session's latest state")
+    show.add_argument("session_id")
+    compact = commands.add_parser("compact", help="Fold event logs and delete expired sessions")
+    compact.add_argument("--retention", type=float, default=None, help="Seconds (default: SESSION_RETENTION)")
+    args = parser.parse_args()
+
+    store = SessionStore(args.db)
+    try:
+        if args.command == "list":
+            for s in store.list_sessions():
+                print(f"{s['session_id']}  turns={s['turns']}  updated={time.ctime(s['updated'])}")
+        elif args.command == "show":
+            state = store.load(args.session_id)
+            if state is None:
+                raise SystemExit(f"Unknown session: {args.session_id}")
+            print(json.dumps(state, indent=2, ensure_ascii=False))
+        else:
+            print(json.dumps(store.compact(args.retention)))
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
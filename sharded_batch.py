@@ -0,0 +1,395 @@
+"""Multi-process batch campaign creation over a durable sqlite work queue.
+
+Specs are enqueued once into a sqlite table. Any number of worker processes
+on this machine claim items under a time-limited lease and keep it alive
+with heartbeats. When a worker crashes, its lease runs out and the items are
+reclaimed by the others.
+A worker renews an item's lease just before submitting it, and skips the
+submit if the lease was lost. Results are committed only while the lease is
+still held, and go into a table keyed by item. A submission whose lease ran
+out during the submit is kept in a lost_leases table, so every campaign that
+was created is recorded.
+
+All workers must run on the host that holds the database file. SQLite's WAL
+mode and file locks don't work reliably on network filesystems, so workers
+on other nodes could claim the same item and submit it twice.
+
+    python sharded_batch.py run campaigns.jsonl --workers 8 -o results.jsonl
+    python sharded_batch.py enqueue campaigns.jsonl --db queue.db
+    python sharded_batch.py work --db queue.db          # in each extra process
+    python sharded_batch.py report --db queue.db -o results.jsonl
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import socket
+import sqlite3
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional, TextIO, Tuple
+from batch import iter_specs, process_spec
+
+DEFAULT_DB_PATH = "batch_queue.db"
+DEFAULT_WORKERS = 4
+DEFAULT_THREADS = 8
+LEASE_SECONDS = 30.0
+CLAIM_SIZE = 32
+MAX_ATTEMPTS = 3
+ENQUEUE_CHUNK = 1000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS items (
+    id INTEGER PRIMARY KEY,
+    spec TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    worker TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS items_claim ON items (status, lease_expires);
+CREATE TABLE IF NOT EXISTS results (
+    item_id INTEGER PRIMARY KEY,
+    worker TEXT NOT NULL,
+    status TEXT NOT NULL,
+    record TEXT NOT NULL,
+    recorded_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS lost_leases (
+    item_id INTEGER NOT NULL,
+    worker TEXT NOT NULL,
+    status TEXT NOT NULL,
+    record TEXT NOT NULL,
+    recorded_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS workers (
+    worker_id TEXT PRIMARY KEY,
+    started REAL NOT NULL,
+    last_heartbeat REAL NOT NULL,
+    finished REAL
+);
+"""
+
+
+class LeaseQueue:
+    """Durable work queue with leases, heartbeats and exactly-once results.
+
+    Item ids are the input line numbers, so enqueueing the same file twice
+    is a no-op. One connection is shared by a worker's threads behind a lock.
+    """
+
+    def __init__(self, db_path: str = DEFAULT_DB_PATH, lease_seconds: float = LEASE_SECONDS):
+        self.db_path = db_path
+        self.lease_seconds = lease_seconds
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(db_path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+
+    def enqueue(self, specs: Iterator[Tuple[int, Dict]]) -> int:
+        """Insert (line number, spec) pairs in chunks; returns the number added"""
+        added = 0
+        chunk = []
+        for line_no, spec in specs:
+            chunk.append((line_no, json.dumps(spec)))
+            if len(chunk) >= ENQUEUE_CHUNK:
+                added += self._insert(chunk)
+                chunk = []
+        if chunk:
+            added += self._insert(chunk)
+        return added
+
+    def _insert(self, rows: List[Tuple[int, str]]) -> int:
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            before = self._db.total_changes
+            self._db.executemany("INSERT OR IGNORE INTO items (id, spec) VALUES (?, ?)", rows)
+            self._db.execute("COMMIT")
+            return self._db.total_changes - before
+
+    def claim(self, worker: str, limit: int = CLAIM_SIZE) -> List[Tuple[int, Dict]]:
+        """Lease up to ``limit`` pending or expired items to ``worker``.
+
+        Items whose lease already expired MAX_ATTEMPTS times are recorded as
+        errors instead of being handed out again.
+        """
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._db.execute(
+                    "SELECT id, spec, attempts FROM items "
+                    "WHERE status = 'pending' OR (status = 'leased' AND lease_expires < ?) "
+                    "ORDER BY id LIMIT ?",
+                    (now, limit)
+                ).fetchall()
+                claimed = []
+                for item_id, spec, attempts in rows:
+                    if attempts >= MAX_ATTEMPTS:
+                        record = {"line": item_id, "status": "error",
+                                  "error": f"Abandoned after {attempts} expired leases"}
+                        self._record(item_id, worker, record, now)
+                        continue
+                    claimed.append((item_id, json.loads(spec)))
+                self._db.executemany(
+                    "UPDATE items SET status = 'leased', worker = ?, lease_expires = ?, attempts = attempts + 1 "
+                    "WHERE id = ?",
+                    [(worker, now + self.lease_seconds, item_id) for item_id, _ in claimed]
+                )
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+        return claimed
+
+    def heartbeat(self, worker: str) -> int:
+        """Extend every lease ``worker`` holds; returns how many were extended"""
+        now = time.time()
+        with self._lock:
+            cursor = self._db.execute(
+                "UPDATE items SET lease_expires = ? WHERE worker = ? AND status = 'leased'",
+                (now + self.lease_seconds, worker)
+            )
+            self._db.execute("UPDATE workers SET last_heartbeat = ? WHERE worker_id = ?", (now, worker))
+            return cursor.rowcount
+
+    def renew(self, item_id: int, worker: str) -> bool:
+        """Extend one item's lease; False if ``worker`` no longer holds it"""
+        with self._lock:
+            cursor = self._db.execute(
+                "UPDATE items SET lease_expires = ? WHERE id = ? AND worker = ? AND status = 'leased'",
+                (time.time() + self.lease_seconds, item_id, worker)
+            )
+            return cursor.rowcount == 1
+
+    def complete(self, item_id: int, worker: str, record: Dict) -> bool:
+        """Record the result if ``worker`` still holds the lease.
+
+        Returns False when the lease was lost (the item belongs to another
+        worker now). The result then goes into lost_leases instead, since its
+        campaign may already exist.
+        """
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                cursor = self._db.execute(
+                    "UPDATE items SET status = 'done', lease_expires = NULL "
+                    "WHERE id = ? AND worker = ? AND status = 'leased'",
+                    (item_id, worker)
+                )
+                owned = cursor.rowcount == 1
+                if owned:
+                    self._record(item_id, worker, record, now)
+                else:
+                    self._db.execute(
+                        "INSERT INTO lost_leases (item_id, worker, status, record, recorded_at) VALUES (?, ?, ?, ?, ?)",
+                        (item_id, worker, record["status"], json.dumps(record), now)
+                    )
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+        return owned
+
+    def _record(self, item_id: int, worker: str, record: Dict, now: float):
+        self._db.execute(
+            "UPDATE items SET status = 'done', lease_expires = NULL WHERE id = ?", (item_id,)
+        )
+        self._db.execute(
+            "INSERT OR IGNORE INTO results (item_id, worker, status, record, recorded_at) VALUES (?, ?, ?, ?, ?)",
+            (item_id, worker, record["status"], json.dumps(record), now)
+        )
+
+    def register_worker(self, worker: str):
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO workers (worker_id, started, last_heartbeat) VALUES (?, ?, ?)",
+                (worker, now, now)
+            )
+
+    def finish_worker(self, worker: str):
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "UPDATE workers SET last_heartbeat = ?, finished = ? WHERE worker_id = ?", (now, now, worker)
+            )
+
+    def remaining(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM items WHERE status != 'done'").fetchone()[0]
+
+    def export(self, output: TextIO) -> int:
+        """Write every recorded result as JSONL in input order"""
+        with self._lock:
+            rows = self._db.execute("SELECT record FROM results ORDER BY item_id")
+            count = 0
+            for (record,) in rows:
+                output.write(record + "\n")
+                count += 1
+        return count
+
+    def report(self) -> Dict:
+        """Aggregate and per-worker throughput from the recorded results"""
+        with self._lock:
+            by_status = dict(self._db.execute("SELECT status, COUNT(*) FROM results GROUP BY status").fetchall())
+            per_worker = self._db.execute(
+                "SELECT w.worker_id, w.started, COALESCE(w.finished, w.last_heartbeat), COUNT(r.item_id) "
+                "FROM workers w LEFT JOIN results r ON r.worker = w.worker_id "
+                "GROUP BY w.worker_id ORDER BY w.worker_id"
+            ).fetchall()
+            pending = self._db.execute("SELECT COUNT(*) FROM items WHERE status != 'done'").fetchone()[0]
+            lost = dict(self._db.execute("SELECT status, COUNT(*) FROM lost_leases GROUP BY status").fetchall())
+
+        workers = {}
+        for worker, started, ended, processed in per_worker:
+            seconds = max(ended - started, 1e-9)
+            workers[worker] = {
+                "processed": processed,
+                "seconds": round(seconds, 3),
+                "specs_per_sec": round(processed / seconds, 2),
+            }
+        total = sum(by_status.values())
+        span = (max(w[2] for w in per_worker) - min(w[1] for w in per_worker)) if per_worker else 0.0
+        return {
+            "total": total,
+            "pending": pending,
+            "by_status": by_status,
+            "lost_leases": lost,
+            "seconds": round(span, 3),
+            "specs_per_sec": round(total / span, 2) if span else 0.0,
+            "workers": workers,
+        }
+
+    def close(self):
+        self._db.close()
+
+
+def run_worker(db_path: str, worker: Optional[str] = None, threads: int = DEFAULT_THREADS,
+               auth_code: str = "valid_code", lease_seconds: float = LEASE_SECONDS) -> str:
+    """Claim and process items until the queue is drained; returns the worker id"""
+    from auth import TikTokAuth
+    from retry import submission_scheduler
+    from tiktok_api import TikTokAPI
+
+    worker = worker or f"{socket.gethostname()}-{os.getpid()}"
+    queue = LeaseQueue(db_path, lease_seconds)
+    auth = TikTokAuth()
+    success, message = auth.handle_oauth_callback(auth_code)
+    if not success:
+        raise RuntimeError(f"Authentication failed: {message}")
+    api = TikTokAPI(auth=auth)
+    scheduler = submission_scheduler(auth)
+
+    queue.register_worker(worker)
+    stop = threading.Event()
+
+    def heartbeat():
+        while not stop.wait(lease_seconds / 3):
+            queue.heartbeat(worker)
+
+    beat = threading.Thread(target=heartbeat, daemon=True)
+    beat.start()
+
+    def handle(item: Tuple[int, Dict]):
+        item_id, spec = item
+        record = process_spec(api, item_id, spec, scheduler, before_submit=lambda: queue.renew(item_id, worker))
+        if record["status"] == "skipped":
+            return
+        if not queue.complete(item_id, worker, record):
+            print(f"Lease on item {item_id} lost during processing; result kept in lost_leases "
+                  f"({record['status']})", file=sys.stderr)
+
+    try:
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            while True:
+                items = queue.claim(worker, max(CLAIM_SIZE, threads))
+                if not items:
+                    if queue.remaining() == 0:
+                        break
+                    # Other workers still hold leases; wait to reclaim any that expire
+                    time.sleep(min(1.0, lease_seconds / 3))
+                    continue
+                list(pool.map(handle, items))
+    finally:
+        stop.set()
+        queue.finish_worker(worker)
+        queue.close()
+    return worker
+
+
+def run_sharded(input_path: str, db_path: str, workers: int = DEFAULT_WORKERS,
+                threads: int = DEFAULT_THREADS, auth_code: str = "valid_code") -> Dict:
+    """Enqueue a file and drain it with ``workers`` local processes"""
+    queue = LeaseQueue(db_path)
+    with open(input_path) as f:
+        queue.enqueue(iter_specs(f))
+
+    processes = [
+        multiprocessing.Process(target=run_worker, args=(db_path, f"local-{i}", threads, auth_code))
+        for i in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+    report = queue.report()
+    queue.close()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sharded TikTok ad campaign batch runner")
+    parser.add_argument("--db", default=DEFAULT_DB_PATH, help="sqlite queue database, on a local disk")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="enqueue a JSONL file and process it with local workers")
+    run.add_argument("input")
+    run.add_argument("-o", "--output", help="write JSONL results here when done")
+    run.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    run.add_argument("--threads", type=int, default=DEFAULT_THREADS, help="concurrent submissions per worker")
+    run.add_argument("--auth-code", default="valid_code")
+
+    enqueue = commands.add_parser("enqueue", help="load a JSONL file into the queue")
+    enqueue.add_argument("input")
+
+    work = commands.add_parser("work", help="run one worker against the queue")
+    work.add_argument("--worker-id")
+    work.add_argument("--threads", type=int, default=DEFAULT_THREADS)
+    work.add_argument("--auth-code", default="valid_code")
+
+    report = commands.add_parser("report", help="print throughput and optionally export results")
+    report.add_argument("-o", "--output")
+
+    args = parser.parse_args()
+
+    if args.command == "run":
+        print(json.dumps(run_sharded(args.input, args.db, args.workers, args.threads, args.auth_code), indent=2),
+              file=sys.stderr)
+    elif args.command == "enqueue":
+        queue = LeaseQueue(args.db)
+        with open(args.input) as f:
+            print(f"Enqueued {queue.enqueue(iter_specs(f))} specs", file=sys.stderr)
+        queue.close()
+    elif args.command == "work":
+        print(f"Worker {run_worker(args.db, args.worker_id, args.threads, args.auth_code)} finished",
+              file=sys.stderr)
+    else:
+        queue = LeaseQueue(args.db)
+        print(json.dumps(queue.report(), indent=2), file=sys.stderr)
+        queue.close()
+
+    if getattr(args, "output", None):
+        queue = LeaseQueue(args.db)
+        with open(args.output, "w") as f:
+            queue.export(f)
+        queue.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+"""Simulation mode for the mocked TikTok API.
+
+A VirtualClock advances simulated time instead of sleeping, and a seeded
+RNG makes every mocked outcome reproducible. ``run_simulation`` drives
+complete scripted sessions (conversation, music handling, validation and
+submission) through the real engine in seconds:
+
+    python simulation.py --sessions 5000 --seed 7
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from collections import Counter
+from typing import Dict
+from config import config
+
+
+class SystemClock:
+    """Wall-clock time; sleep really sleeps"""
+
+    def now(self) -> float:
+        return time.monotonic()
+
+    def sleep(self, seconds: float, operation: str = None):
+        time.sleep(seconds)
+
+
+class ScaledClock(SystemClock):
+    """Wall-clock time with every sleep multiplied by scale (load tests run faster)"""
+
+    def __init__(self, scale: float = 1.0):
+        self.scale = scale
+
+    def sleep(self, seconds: float, operation: str = None):
+        time.sleep(seconds * self.scale)
+
+
+class VirtualClock:
+    """Simulated time that advances on sleep without blocking.
+
+    Simulated durations are reported per operation. Concurrent callers share
+    one timeline, so elapsed time is the sum of all simulated latency.
+    """
+
+    def __init__(self, start: float = 0.0):
+        self.time = start
+        self.durations: Dict[str, float] = Counter()
+        self.calls: Dict[str, int] = Counter()
+        self._lock = threading.Lock()
+
+    def now(self) -> float:
+        return self.time
+
+    def sleep(self, seconds: float, operation: str = None):
+        with self._lock:
+            self.time += seconds
+            if operation:
+                self.durations[operation] += seconds
+                self.calls[operation] += 1
+
+    def report(self) -> Dict:
+        return {
+            "elapsed": round(self.time, 3),
+            "operations": {
+                op: {"calls": self.calls[op], "seconds": round(self.durations[op], 3)}
+                for op in sorted(self.calls)
+            },
+        }
+
+
+_shared_clock = None
+_shared_rng = None
+
+
+def shared_clock():
+    """Process default clock: virtual in SIMULATION_MODE, else the wall clock"""
+    global _shared_clock
+    if _shared_clock is None:
+        _shared_clock = VirtualClock() if config.SIMULATION_MODE else SystemClock()
+    return _shared_clock
+
+
+def shared_rng():
+    """Process default RNG: seeded in SIMULATION_MODE, else the global random module"""
+    global _shared_rng
+    if _shared_rng is None:
+        _shared_rng = random.Random(config.SIMULATION_SEED) if config.SIMULATION_MODE else random
+    return _shared_rng
+
+
+# Scripted session mix: (objective, music choice) with weights
+SESSION_MIX = [
+    (("TRAFFIC", "none"), 0.3),
+    (("TRAFFIC", "existing"), 0.2),
+    (("CONVERSIONS", "existing"), 0.25),
+    (("CONVERSIONS", "invalid_then_custom"), 0.1),
+    (("CONVERSIONS", "custom"), 0.15),
+]
+
+MAX_TURNS = 40
+
+
+def run_simulation(sessions: int, seed: int = 0, verbose: bool = False) -> Dict:
+    """Run scripted end-to-end sessions against the mocks on a virtual clock"""
+    from auth import TikTokAuth
+    from engine import ConversationEngine, STAGE_DONE, OUTCOME_READY
+    from fast_path import FastPathParser
+    from retry import RateLimiter, submission_scheduler
+    from tiktok_api import TikTokAPI, MusicMetadataCache
+
+    rng = random.Random(seed)
+    clock = VirtualClock()
+    auth = TikTokAuth(auto_refresh=False)
+    auth.handle_oauth_callback("valid_code")
+    api = TikTokAPI(music_cache=MusicMetadataCache(), clock=clock, rng=rng, auth=auth)
+    fast_path = FastPathParser()
+    scheduler = submission_scheduler(auth, limiter=RateLimiter(config.SUBMIT_QPS, clock=clock), clock=clock, rng=rng)
+
+    def responder(user_input: str, collected_data: Dict) -> Dict:
+        response = fast_path.resolve(user_input, collected_data)
+        if response is None:
+            raise RuntimeError(f"Scripted input needs the LLM: {user_input!r}")
+        return response
+
+    engine = ConversationEngine(responder, api)
+    outcomes = Counter()
+    error_codes = Counter()
+    turns = 0
+    wall_start = time.perf_counter()
+
+    for _ in range(sessions):
+        objective, music = pick_weighted(rng, SESSION_MIX)
+        script = session_script(objective, music)
+        state, _ = engine.new_session()
+
+        for _ in range(MAX_TURNS):
+            if state["stage"] == STAGE_DONE:
+                break
+            state, _ = engine.step(state, scripted_reply(state, script))
+            turns += 1
+
+        if state.get("outcome") != OUTCOME_READY:
+            outcomes[state.get("outcome") or "stalled"] += 1
+            continue
+
+        success, response, _ = scheduler.submit(api, state["ad_payload"])
+        error_codes[response.get("code")] += 1
+        outcomes["submitted" if success else "submit_failed"] += 1
+
+    report = {
+        "sessions": sessions,
+        "seed": seed,
+        "turns": turns,
+        "outcomes": dict(sorted(outcomes.items())),
+        "submission_codes": {str(k): v for k, v in sorted(error_codes.items())},
+        "simulated": clock.report(),
+        "wall_seconds": round(time.perf_counter() - wall_start, 3),
+    }
+    if verbose:
+        report["fast_path"] = fast_path.stats()
+    return report
+
+
+def pick_weighted(rng: random.Random, weighted: list):
+    roll = rng.random()
+    threshold = 0.0
+    for value, weight in weighted:
+        threshold += weight
+        if roll < threshold:
+            return value
+    return weighted[-1][0]
+
+
+def session_script(objective: str, music: str) -> Dict:
+    music_choice = {
+        "none": "3",
+        "existing": config.MOCK_MUSIC_IDS[0],
+        "invalid_then_custom": config.INVALID_MUSIC_IDS[0],
+        "custom": "2",
+    }[music]
+    return {
+        "campaign_name": "Summer Sale",
+        "objective": objective.lower(),
+        "ad_text": "Get 50% off summer collection!",
+        "cta": "Shop Now",
+        "music": music_choice,
+    }
+
+
+def scripted_reply(state: Dict, script: Dict) -> str:
+    """Scripted user input for the stage the session is waiting in"""
+    stage = state["stage"]
+    collected_data = state["collected_data"]
+    if stage == "collect":
+        for field in ("campaign_name", "objective", "ad_text", "cta"):
+            if not collected_data.get(field):
+                return script[field]
+        if not collected_data.get("music_option"):
+            return script["music"]
+        return "done"
+    if stage == "music_id":
+        return config.MOCK_MUSIC_IDS[0]
+    if stage in ("music_id_recovery", "custom_music_recovery"):
+        return "3" if collected_data.get("objective") == "TRAFFIC" else "2"
+    if stage == "custom_music_confirm":
+        return "yes"
+    if stage == "custom_music_path":
+        return "track.mp3"
+    return "yes"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run simulated end-to-end ad-creation sessions")
+    parser.add_argument("--sessions", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    print(json.dumps(run_simulation(args.sessions, args.seed, verbose=True), indent=2))
+
+
+if __name__ == "__main__":
+    main()
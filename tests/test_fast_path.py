@@ -0,0 +1,26 @@
+"""FastPathParser cases: what resolves locally and what is left to the LLM"""
+import pytest
+from engine import new_collected_data
+from fast_path import FastPathParser
+
+
+@pytest.mark.parametrize("text", [
+    "hello there", "hi there", "Hey!", "Hello!", "good morning", "Good morning, team",
+    "thanks", "Thank you!", "ok", "okay let's go", "yo", "cheers mate",
+])
+def test_greetings_are_not_campaign_names(text):
+    assert FastPathParser().resolve(text, new_collected_data()) is None
+
+
+@pytest.mark.parametrize("text", ["Summer Sale 2026", "Black Friday Deals", "Holiday Promo"])
+def test_plain_campaign_names_resolve(text):
+    turn = FastPathParser().resolve(text, new_collected_data())
+    assert turn["collected_data"]["campaign_name"] == text
+    assert turn["next_step"] == "objective"
+
+
+def test_no_music_still_resolves():
+    collected_data = {**new_collected_data(), "campaign_name": "Summer Sale", "objective": "TRAFFIC",
+                      "ad_text": "Get 50% off!", "cta": "Shop Now"}
+    turn = FastPathParser().resolve("no music", collected_data)
+    assert turn["collected_data"]["music_option"] == "NO_MUSIC"
@@ -0,0 +1,66 @@
+"""SessionManager regression tests, run against the in-process TikTok mock"""
+import asyncio
+from fast_path import FastPathParser
+from server import SessionInactive, SessionManager, STATUS_FINISHED
+
+SCRIPT = {
+    "campaign_name": "Summer Sale",
+    "objective": "traffic",
+    "ad_text": "Get 50% off summer collection!",
+    "cta": "Shop Now",
+}
+
+
+class StubAgent:
+    """Answers every turn from the fast-path rules, without an LLM"""
+
+    def __init__(self):
+        self.fast_path = FastPathParser()
+
+    def get_llm_response(self, user_input, collected_data, on_token=None, usage_tracker=None):
+        return self.fast_path.resolve(user_input, collected_data)
+
+    async def aget_llm_response(self, user_input, collected_data, usage_tracker=None):
+        return self.fast_path.resolve(user_input, collected_data)
+
+
+def _reply(state):
+    collected_data = state["collected_data"]
+    if state["stage"] == "collect":
+        for field, text in SCRIPT.items():
+            if not collected_data.get(field):
+                return text
+        return "3" if not collected_data.get("music_option") else "done"
+    return "yes"
+
+
+async def _confirming_session(manager):
+    session = await manager.create("valid_code")
+    for _ in range(20):
+        if session.state["stage"] == "confirm_submit":
+            return session
+        await manager.step(session, _reply(session.state))
+    raise AssertionError(f"stuck in stage {session.state['stage']}")
+
+
+def test_concurrent_confirm_submits_once():
+    async def run():
+        manager = SessionManager(StubAgent(), store=None)
+        session = await _confirming_session(manager)
+        calls = []
+
+        def create_ad_campaign(ad_payload):
+            calls.append(ad_payload)
+            return True, {"code": 0, "data": {"campaign_id": f"C{len(calls)}"}}
+
+        session.api.create_ad_campaign = create_ad_campaign
+        results = await asyncio.gather(manager.step(session, "yes"), manager.step(session, "yes"),
+                                       return_exceptions=True)
+        manager.executor.shutdown(wait=False)
+        return session, calls, results
+
+    session, calls, results = asyncio.run(run())
+    assert len(calls) == 1
+    assert session.status == STATUS_FINISHED
+    assert session.state["submitted"] == "C1"
+    assert sum(isinstance(r, SessionInactive) for r in results) == 1
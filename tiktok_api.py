@@ -1,19 +1,142 @@
 import requests
 import json
 import time
-from typing import Dict, Tuple, Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Tuple, Optional
 from config import config
+from cache import LRUCache
+from metrics import histogram, timed
+from transport import HTTPTransport, get_transport
+from simulation import shared_clock, shared_rng
 import string  
 
+histogram("tiktok_api_seconds", "TikTok API call latency, by method")
+
+# Codes that are an answer about the music ID itself. Only these are
+# negative-cached: the cache is shared, and any other failure (expired token,
+# rate limit, outage, unknown code) is specific to the caller or the moment.
+DEFINITIVE_MUSIC_CODES = {40001, 40002}
+
+# validate_music_id status for each TikTok response code (http mode)
+MUSIC_STATUS_BY_CODE = {
+    0: "SUCCESS",
+    40001: "MUSIC_NOT_FOUND",
+    40002: "INVALID_FORMAT",
+    40100: "RATE_LIMITED",
+    50000: "API_UNAVAILABLE",
+    50001: "API_UNAVAILABLE",
+}
+
+
+class MusicMetadataCache:
+    """validate_music_id results with separate TTLs for found and not-found IDs"""
+    
+    def __init__(self, positive_ttl: float = None, negative_ttl: float = None, max_entries: int = None):
+        self.positive_ttl = positive_ttl or config.MUSIC_CACHE_POSITIVE_TTL
+        self.negative_ttl = negative_ttl or config.MUSIC_CACHE_NEGATIVE_TTL
+        self.entries = LRUCache(max_entries or config.MUSIC_CACHE_MAX_ENTRIES)
+    
+    def get(self, music_id: str) -> Optional[Tuple[bool, str, Optional[Dict]]]:
+        result = self.entries.get(music_id)
+        if result is None:
+            return None
+        is_valid, status, details = result
+        return is_valid, status, dict(details) if details else details
+    
+    def put(self, music_id: str, result: Tuple[bool, str, Optional[Dict]]):
+        is_valid, status, details = result
+        if is_valid:
+            self.entries.set(music_id, result, ttl=self.positive_ttl)
+        elif (details or {}).get("code") in DEFINITIVE_MUSIC_CODES:
+            self.entries.set(music_id, result, ttl=self.negative_ttl)
+    
+    def stats(self) -> Dict:
+        return self.entries.stats()
+
+
+# Shared by every TikTokAPI instance, so results survive token refreshes
+shared_music_cache = MusicMetadataCache()
+
+
 class TikTokAPI:
-    def __init__(self, access_token: str):
-        self.access_token = access_token
+    # Endpoint paths relative to TIKTOK_API_BASE_URL, used in "http" mode
+    MUSIC_GET_PATH = "/music/get/"
+    MUSIC_UPLOAD_PATH = "/file/music/upload/"
+    CAMPAIGN_CREATE_PATH = "/campaign/create/"
+    
+    def __init__(self, access_token: str = None, music_cache: MusicMetadataCache = None,
+                 transport: HTTPTransport = None, clock=None, rng=None, auth=None):
+        # With an auth object the token is read from it on every request, so
+        # refreshes (background or on 40003) apply without rebuilding the client
+        self.auth = auth
+        self._access_token = access_token
         self.base_url = config.TIKTOK_API_BASE_URL
+        self.music_cache = music_cache or shared_music_cache
+        # "mock" simulates responses in-process, "http" calls base_url over the shared pool
+        self.mode = config.TIKTOK_API_MODE
+        self.transport = transport or get_transport()
+        # Mock latency and outcomes; a VirtualClock and seeded RNG make runs fast and reproducible
+        self.clock = clock or shared_clock()
+        self.rng = rng or shared_rng()
+    
+    @property
+    def access_token(self) -> Optional[str]:
+        if self.auth is not None:
+            return self.auth.ensure_fresh()
+        return self._access_token
+    
+    @access_token.setter
+    def access_token(self, token: str):
+        self._access_token = token
         
+    @timed("tiktok_api_seconds", method="validate_music_id")
     def validate_music_id(self, music_id: str) -> Tuple[bool, str, Optional[Dict]]:
         """Validate if a music ID exists and is usable"""
+        cached = self.music_cache.get(music_id)
+        if cached is not None:
+            return cached
+        
+        if self.mode == "http":
+            result = self._validate_music_id_http(music_id)
+        else:
+            result = self._validate_music_id(music_id)
+        self.music_cache.put(music_id, result)
+        return result
+    
+    def validate_music_ids(self, music_ids: Iterable[str]) -> Dict[str, Tuple[bool, str, Optional[Dict]]]:
+        """Validate many music IDs concurrently, checking each distinct ID once"""
+        unique_ids = list(dict.fromkeys(music_ids))
+        results = {}
+        pending = []
+        for music_id in unique_ids:
+            cached = self.music_cache.get(music_id)
+            if cached is not None:
+                results[music_id] = cached
+            else:
+                pending.append(music_id)
+        
+        if pending:
+            workers = min(config.MUSIC_BATCH_MAX_WORKERS, len(pending))
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                for music_id, result in zip(pending, pool.map(self.validate_music_id, pending)):
+                    results[music_id] = result
+        
+        return {music_id: results[music_id] for music_id in unique_ids}
+    
+    def _validate_music_id_http(self, music_id: str) -> Tuple[bool, str, Optional[Dict]]:
+        body = self.transport.get(
+            self.base_url + self.MUSIC_GET_PATH,
+            access_token=self.access_token,
+            params={"music_id": music_id}
+        )
+        code = body.get("code")
+        if code == 0:
+            return True, "SUCCESS", body.get("data", {})
+        return False, MUSIC_STATUS_BY_CODE.get(code, "API_ERROR"), body
+    
+    def _validate_music_id(self, music_id: str) -> Tuple[bool, str, Optional[Dict]]:
         # Mock validation logic
-        time.sleep(0.5)  # Simulate API delay
+        self.clock.sleep(0.5, "validate_music_id")  # Simulate API delay
         
         if music_id in config.INVALID_MUSIC_IDS:
             return False, "MUSIC_NOT_FOUND", {
@@ -32,8 +155,7 @@ class TikTokAPI:
             }
         
         # Simulate random API failure (10% chance)
-        import random
-        if random.random() < 0.1:
+        if self.rng.random() < 0.1:
             return False, "API_UNAVAILABLE", {
                 "code": 50000,
                 "message": "TikTok API service temporarily unavailable",
@@ -46,29 +168,48 @@ class TikTokAPI:
             "log_id": "mock_log_456"
         }
     
+    @timed("tiktok_api_seconds", method="upload_custom_music")
     def upload_custom_music(self, music_file_path: str) -> Tuple[bool, str, Optional[str]]:
         """Simulate custom music upload"""
-        time.sleep(1.0)  # Simulate upload time
+        if self.mode == "http":
+            return self._upload_custom_music_http(music_file_path)
         
-        # Mock upload - generate a mock music ID
-        import random
-        import string
+        self.clock.sleep(1.0, "upload_custom_music")  # Simulate upload time
         
-        mock_id = "M" + ''.join(random.choices(string.digits, k=9))
+        # Mock upload - generate a mock music ID
+        mock_id = "M" + ''.join(self.rng.choices(string.digits, k=9))
         
         # Simulate 5% chance of upload failure
-        if random.random() < 0.05:
+        if self.rng.random() < 0.05:
             return False, "UPLOAD_FAILED", None
         
         return True, "UPLOAD_SUCCESS", mock_id
     
+    def _upload_custom_music_http(self, music_file_path: str) -> Tuple[bool, str, Optional[str]]:
+        body = self.transport.post(
+            self.base_url + self.MUSIC_UPLOAD_PATH,
+            access_token=self.access_token,
+            json_body={"file_name": music_file_path}
+        )
+        if body.get("code") == 0:
+            return True, "UPLOAD_SUCCESS", body.get("data", {}).get("music_id")
+        return False, "UPLOAD_FAILED", None
+    
+    @timed("tiktok_api_seconds", method="create_ad_campaign")
     def create_ad_campaign(self, ad_payload: Dict) -> Tuple[bool, Optional[Dict]]:
         """Submit ad campaign to TikTok API"""
-        time.sleep(0.8)  # Simulate API delay
+        if self.mode == "http":
+            body = self.transport.post(
+                self.base_url + self.CAMPAIGN_CREATE_PATH,
+                access_token=self.access_token,
+                json_body=ad_payload
+            )
+            return body.get("code") == 0, body
+        
+        self.clock.sleep(0.8, "create_ad_campaign")  # Simulate API delay
         
         # Mock various API failure scenarios
-        import random
-        scenario = random.random()
+        scenario = self.rng.random()
         
         # Scenario 1: Invalid OAuth token (15% chance)
         if scenario < 0.15:
@@ -112,8 +253,8 @@ class TikTokAPI:
                 "code": 0,
                 "message": "SUCCESS",
                 "data": {
-                    "campaign_id": "CMP" + ''.join(random.choices(string.digits, k=10)),
-                    "ad_id": "AD" + ''.join(random.choices(string.digits, k=10)),
+                    "campaign_id": "CMP" + ''.join(self.rng.choices(string.digits, k=10)),
+                    "ad_id": "AD" + ''.join(self.rng.choices(string.digits, k=10)),
                     "status": "UNDER_REVIEW",
                     "estimated_review_time": "24 hours"
                 },
@@ -122,7 +263,11 @@ class TikTokAPI:
             }
     
     def interpret_api_error(self, error_response: Dict) -> Dict:
-        """Interpret API errors for user-friendly messages"""
+        """Interpret API errors for user-friendly messages
+        
+        can_retry means resubmitting may succeed; auto_retry means the error is
+        transient and the same payload can be resent without asking the user.
+        """
         error_code = error_response.get('code', 'UNKNOWN')
         
         interpretations = {
@@ -130,31 +275,50 @@ class TikTokAPI:
                 'explanation': 'The music ID you provided is invalid or not accessible.',
                 'action': 'Please check the music ID or choose different music.',
                 'can_retry': True,
+                'auto_retry': False,
                 'retry_suggestion': 'Retry with a valid music ID after verification'
             },
             '40002': {
                 'explanation': 'Your TikTok App does not have the required permissions.',
                 'action': 'Contact your TikTok Ads administrator to grant ads.manage scope.',
                 'can_retry': False,
+                'auto_retry': False,
                 'retry_suggestion': 'Cannot retry until permissions are fixed'
             },
             '40003': {
                 'explanation': 'Your access token has expired or is invalid.',
                 'action': 'Please re-authenticate your TikTok Ads account.',
                 'can_retry': True,
+                'auto_retry': True,
                 'retry_suggestion': 'Retry after refreshing your access token'
             },
             '40004': {
                 'explanation': 'TikTok Ads API is not available in your region.',
                 'action': 'Use a VPN or contact TikTok support for regional access.',
                 'can_retry': False,
+                'auto_retry': False,
                 'retry_suggestion': 'Cannot retry from this geographic location'
             },
+            '40100': {
+                'explanation': 'Too many requests were sent to the TikTok Ads API.',
+                'action': 'Wait a moment before submitting again.',
+                'can_retry': True,
+                'auto_retry': True,
+                'retry_suggestion': 'Retry after a short backoff'
+            },
             '50000': {
                 'explanation': 'TikTok Ads API is experiencing temporary issues.',
                 'action': 'Please try again in a few minutes.',
                 'can_retry': True,
+                'auto_retry': True,
                 'retry_suggestion': 'Retry after 5-10 minutes'
+            },
+            '50001': {
+                'explanation': 'TikTok Ads API did not answer after receiving the request, so the campaign may or may not have been created.',
+                'action': 'Check TikTok Ads Manager before creating this campaign again.',
+                'can_retry': False,
+                'auto_retry': False,
+                'retry_suggestion': 'Do not resubmit until you have checked the campaign list'
             }
         }
         
@@ -162,6 +326,7 @@ class TikTokAPI:
             'explanation': 'An unknown error occurred with the TikTok API.',
             'action': 'Please check your input and try again. Contact support if issue persists.',
             'can_retry': True,
+            'auto_retry': False,
             'retry_suggestion': 'Retry with the same parameters'
         }
         
@@ -0,0 +1,81 @@
+import json
+import os
+from typing import Dict, Optional
+from config import config
+
+try:
+    from cryptography.fernet import Fernet, InvalidToken
+except ImportError:  # encryption is optional; plain files are still owner-only
+    Fernet = None
+    InvalidToken = ValueError
+
+
+class TokenStore:
+    """OAuth tokens persisted between runs.
+
+    The file is written atomically with 0600 permissions inside a 0700
+    directory. When a Fernet key is configured (TOKEN_STORE_KEY, requires the
+    ``cryptography`` package) the contents are encrypted as well. Unreadable,
+    corrupt or undecryptable files are treated as missing.
+    """
+
+    def __init__(self, path: str = None, key: str = None):
+        self.path = os.path.expanduser(path or config.TOKEN_STORE_PATH)
+        key = key if key is not None else config.TOKEN_STORE_KEY
+        if key and Fernet is None:
+            raise RuntimeError("TOKEN_STORE_KEY is set but the 'cryptography' package is not installed")
+        self.fernet = Fernet(key.encode() if isinstance(key, str) else key) if key else None
+
+    def load(self) -> Optional[Dict]:
+        try:
+            with open(self.path, "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+        try:
+            if self.fernet:
+                data = self.fernet.decrypt(data)
+            record = json.loads(data)
+        except (InvalidToken, ValueError):
+            return None
+        return record if isinstance(record, dict) else None
+
+    def save(self, record: Dict):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, mode=0o700, exist_ok=True)
+            _restrict_directory(directory)
+        data = json.dumps(record).encode()
+        if self.fernet:
+            data = self.fernet.encrypt(data)
+
+        tmp_path = self.path + ".tmp"
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.chmod(tmp_path, 0o600)  # in case the file already existed with wider permissions
+            os.replace(tmp_path, self.path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def clear(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+def _restrict_directory(directory: str):
+    """chmod 700 an existing store directory (makedirs leaves its mode alone).
+
+    The home directory and directories owned by someone else are left as they are.
+    """
+    if not hasattr(os, "getuid"):  # POSIX permissions only
+        return
+    info = os.stat(directory)
+    if info.st_mode & 0o077 and info.st_uid == os.getuid() \
+            and os.path.realpath(directory) != os.path.realpath(os.path.expanduser("~")):
+        os.chmod(directory, 0o700)
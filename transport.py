@@ -0,0 +1,93 @@
+import threading
+from typing import Dict, Optional, Tuple
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+from config import config
+
+
+class HTTPTransport:
+    """Keep-alive HTTP connection pool shared by TikTokAPI and TikTokAuth.
+
+    Every request goes through one ``requests.Session`` so TCP/TLS
+    connections to the TikTok API host are reused. Responses are always
+    returned as a TikTok-style body dict. Failures before the request went
+    out (connect errors and timeouts) are reported as code 50000, which is
+    safe to resend. Failures after it went out (read timeouts, connections
+    dropped mid-response, non-JSON replies) are reported as code 50001: the
+    server may have acted on the request, so it must not be resent blindly.
+    """
+
+    def __init__(self, pool_connections: int = None, pool_maxsize: int = None,
+                 timeout: Tuple[float, float] = None):
+        self.timeout = timeout or (config.HTTP_CONNECT_TIMEOUT, config.HTTP_READ_TIMEOUT)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=pool_connections or config.HTTP_POOL_CONNECTIONS,
+            pool_maxsize=pool_maxsize or config.HTTP_POOL_MAXSIZE,
+            max_retries=0  # retry policy belongs to the caller
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({
+            "Accept": "application/json",
+            "Accept-Encoding": "gzip, deflate",
+        })
+
+    def request(self, method: str, url: str, access_token: str = None, params: Dict = None,
+                json_body: Dict = None, timeout: Tuple[float, float] = None) -> Dict:
+        """Send a request and return the decoded TikTok response body"""
+        headers = {"Access-Token": access_token} if access_token else None
+        try:
+            response = self.session.request(
+                method, url,
+                params=params,
+                json=json_body,
+                headers=headers,
+                timeout=timeout or self.timeout
+            )
+        except requests.RequestException as e:
+            if _request_sent(e):
+                return {"code": 50001, "message": f"No response from TikTok API: {e}"}
+            return {"code": 50000, "message": f"TikTok API request failed: {e}"}
+
+        try:
+            return response.json()
+        except ValueError:
+            return {
+                "code": 50001,
+                "message": f"Unexpected non-JSON response (HTTP {response.status_code})",
+            }
+
+    def get(self, url: str, **kwargs) -> Dict:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> Dict:
+        return self.request("POST", url, **kwargs)
+
+    def close(self):
+        self.session.close()
+
+
+def _request_sent(error: requests.RequestException) -> bool:
+    """Whether the request may have reached the server before ``error``"""
+    if isinstance(error, (requests.ConnectTimeout, requests.exceptions.SSLError)):
+        return False
+    if isinstance(error, requests.ConnectionError):
+        reason = getattr(error.args[0], "reason", None) if error.args else None
+        return not isinstance(reason, NewConnectionError)
+    return isinstance(error, (requests.ReadTimeout, requests.exceptions.ChunkedEncodingError,
+                              requests.exceptions.ContentDecodingError))
+
+
+_shared_transport: Optional[HTTPTransport] = None
+_shared_lock = threading.Lock()
+
+
+def get_transport() -> HTTPTransport:
+    """Process-wide transport, created on first use"""
+    global _shared_transport
+    with _shared_lock:
+        if _shared_transport is None:
+            _shared_transport = HTTPTransport()
+        return _shared_transport
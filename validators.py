@@ -1,78 +1,293 @@
-from typing import Dict, Tuple, Optional
+import re
+from typing import Dict, List, Optional, Sequence, Tuple
 from config import config
+from metrics import histogram, timed
+from rules import FIELDS, MUSIC_OPTIONS, error_messages, group_rules, validate_ad, validate_key
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional; validate_batch falls back to list passes
+    np = None
+
+_MUSIC_ID_RE = re.compile(config.MUSIC_ID_PATTERN)
+
+histogram("validation_seconds", "Ad and turn validation time, by kind")
+
+# Structured LLM turn contract, shared by validate_turn and guided decoding
+TURN_FIELDS = ("user_message", "internal_reasoning", "collected_data", "next_step")
+COLLECTED_DATA_FIELDS = ("campaign_name", "objective", "ad_text", "cta", "music_option", "music_id")
+NEXT_STEPS = ("campaign_name", "objective", "ad_text", "cta", "music",
+              "ask_music_id", "ask_custom_music", "validation", "submission")
+
+# Columns of the validate_batch error-code matrix, in validate_all_fields order.
+# Code 0 means the rule passed; other codes index BATCH_ERROR_MESSAGES.
+BATCH_RULES = tuple(group_rules())
+BATCH_ERROR_MESSAGES = error_messages()
+
+
+class BatchValidationResult:
+    """Error codes from AdValidator.validate_batch, one column per rule.
+
+    Columns are numpy uint8 arrays when numpy is available, else bytes.
+    Messages are only built when errors() is called.
+    """
+
+    def __init__(self, columns: Dict[str, Sequence[int]], size: int):
+        self.columns = columns
+        self.size = size
+
+    def __len__(self) -> int:
+        return self.size
+
+    @property
+    def matrix(self):
+        """(rows x rules) error-code matrix"""
+        if np is not None and isinstance(self.columns[BATCH_RULES[0]], np.ndarray):
+            return np.column_stack([self.columns[rule] for rule in BATCH_RULES])
+        return list(zip(*(self.columns[rule] for rule in BATCH_RULES)))
+
+    def valid_mask(self) -> List[bool]:
+        codes = [self.columns[rule] for rule in BATCH_RULES]
+        if np is not None and isinstance(codes[0], np.ndarray):
+            return ~np.logical_or.reduce(codes)
+        return [not any(row) for row in zip(*codes)]
+
+    def invalid_rows(self) -> List[int]:
+        mask = self.valid_mask()
+        if np is not None and isinstance(mask, np.ndarray):
+            return np.flatnonzero(~mask).tolist()
+        return [row for row, is_valid in enumerate(mask) if not is_valid]
+
+    def errors(self, row: int) -> Dict[str, str]:
+        """Errors for one row, as validate_all_fields would report them"""
+        return {
+            rule: BATCH_ERROR_MESSAGES[rule][int(self.columns[rule][row])]
+            for rule in BATCH_RULES if self.columns[rule][row]
+        }
+
+    def error_counts(self) -> Dict[str, Dict[int, int]]:
+        counts = {}
+        for rule in BATCH_RULES:
+            column = self.columns[rule]
+            if np is not None and isinstance(column, np.ndarray):
+                codes, totals = np.unique(column[column > 0], return_counts=True)
+                counts[rule] = {int(c): int(t) for c, t in zip(codes, totals)}
+            else:
+                counts[rule] = {code: column.count(code) for code in BATCH_ERROR_MESSAGES[rule] if code in column}
+        return counts
+
 
 class AdValidator:
     @staticmethod
     def validate_campaign_name(name: str) -> Tuple[bool, str]:
-        if not name or len(name.strip()) < config.MIN_CAMPAIGN_NAME_LENGTH:
-            return False, f"Campaign name must be at least {config.MIN_CAMPAIGN_NAME_LENGTH} characters"
-        return True, "Valid campaign name"
+        return _check_key("campaign_name", {"campaign_name": name}, "Valid campaign name")
     
     @staticmethod
     def validate_objective(objective: str) -> Tuple[bool, str]:
-        if objective.upper() not in config.ALLOWED_OBJECTIVES:
-            return False, f"Objective must be one of: {', '.join(config.ALLOWED_OBJECTIVES)}"
-        return True, "Valid objective"
+        return _check_key("objective", {"objective": objective}, "Valid objective")
     
     @staticmethod
     def validate_ad_text(text: str) -> Tuple[bool, str]:
-        if not text:
-            return False, "Ad text is required"
-        if len(text) > config.MAX_AD_TEXT_LENGTH:
-            return False, f"Ad text must be {config.MAX_AD_TEXT_LENGTH} characters or less"
-        return True, "Valid ad text"
+        return _check_key("ad_text", {"ad_text": text}, "Valid ad text")
+    
+    @staticmethod
+    def validate_music_id_format(music_id: str) -> Tuple[bool, str]:
+        if not music_id or not _MUSIC_ID_RE.match(music_id):
+            return False, "Music ID must be 'M' followed by 9 digits"
+        return True, "Valid music ID format"
     
     @staticmethod
     def validate_music_logic(objective: str, music_option: str, music_id: Optional[str] = None) -> Tuple[bool, str]:
         """Validate music selection based on business rules"""
-        
-        # Case C: No music
-        if music_option.upper() == "NO_MUSIC":
-            if objective.upper() == "CONVERSIONS":
-                return False, "Music is required for Conversions objective"
-            elif objective.upper() == "TRAFFIC":
-                return True, "No music selected (allowed for Traffic)"
-        
-        # Case A: Existing Music ID
-        elif music_option.upper() == "EXISTING":
-            if not music_id:
-                return False, "Music ID is required for existing music"
-            # Additional validation would happen in API call
-            return True, "Existing music ID provided"
-        
-        # Case B: Custom music
-        elif music_option.upper() == "CUSTOM":
-            return True, "Custom music upload requested"
-        
-        return False, "Invalid music option"
+        ad_data = {"objective": objective, "music_option": music_option, "music_id": music_id}
+        return _check_key("music_logic", ad_data, "Valid music selection")
     
     @staticmethod
+    @timed("validation_seconds", kind="ad")
     def validate_all_fields(ad_data: Dict) -> Tuple[bool, Dict[str, str]]:
         """Validate all ad fields and return detailed errors"""
-        errors = {}
+        return validate_ad(ad_data)
+    
+    @staticmethod
+    @timed("validation_seconds", kind="batch")
+    def validate_batch(campaign_names: Sequence[str], objectives: Sequence[str], ad_texts: Sequence[str],
+                       ctas: Sequence[str], music_options: Sequence[str], music_ids: Sequence[Optional[str]],
+                       use_numpy: Optional[bool] = None) -> BatchValidationResult:
+        """Validate columnar ad data with one pass per rule.
+
+        Takes equal-length lists or numpy arrays (None counts as empty) and
+        applies the same rules as validate_all_fields. Uses numpy string
+        operations when it is installed, unless use_numpy is False.
+        """
+        columns = dict(zip(COLLECTED_DATA_FIELDS, (campaign_names, objectives, ad_texts, ctas, music_options, music_ids)))
+        size = len(campaign_names)
+        if not all(len(column) == size for column in columns.values()):
+            raise ValueError("validate_batch columns must have equal lengths")
+        if use_numpy is None:
+            use_numpy = np is not None
+        elif use_numpy and np is None:
+            raise ImportError("numpy is required for use_numpy=True")
+        validate = _validate_columns_numpy if use_numpy else _validate_columns
+        return BatchValidationResult(validate(columns), size)
+    
+    @staticmethod
+    def turn_schema() -> Dict:
+        """JSON schema for one structured LLM turn"""
+        collected_properties = {field: {"type": "string"} for field in COLLECTED_DATA_FIELDS}
+        collected_properties["objective"] = {"type": "string", "enum": [""] + list(config.ALLOWED_OBJECTIVES)}
+        collected_properties["music_option"] = {"type": "string", "enum": [""] + list(MUSIC_OPTIONS)}
+        return {
+            "type": "object",
+            "properties": {
+                "user_message": {"type": "string"},
+                "internal_reasoning": {"type": "string"},
+                "collected_data": {
+                    "type": "object",
+                    "properties": collected_properties,
+                    "required": list(COLLECTED_DATA_FIELDS),
+                    "additionalProperties": False
+                },
+                "next_step": {"type": "string", "enum": list(NEXT_STEPS)}
+            },
+            "required": list(TURN_FIELDS),
+            "additionalProperties": False
+        }
+    
+    @staticmethod
+    @timed("validation_seconds", kind="turn")
+    def validate_turn(response: Optional[Dict], strict: bool = False) -> Tuple[bool, str]:
+        """Check a parsed LLM turn against the turn contract.
         
-        # Campaign Name
-        is_valid, message = AdValidator.validate_campaign_name(ad_data.get('campaign_name', ''))
-        if not is_valid:
-            errors['campaign_name'] = message
+        The default check needs the four turn fields, a collected_data object
+        of strings or nulls and a known next_step. strict=True applies the
+        full turn_schema (only the six collected_data keys, strings only),
+        for use with guided decoding.
+        """
+        if not isinstance(response, dict):
+            return False, "Response is not a JSON object"
         
-        # Objective
-        is_valid, message = AdValidator.validate_objective(ad_data.get('objective', ''))
-        if not is_valid:
-            errors['objective'] = message
+        missing = [field for field in TURN_FIELDS if field not in response]
+        if missing:
+            return False, f"Missing fields: {', '.join(missing)}"
         
-        # Ad Text
-        is_valid, message = AdValidator.validate_ad_text(ad_data.get('ad_text', ''))
-        if not is_valid:
-            errors['ad_text'] = message
+        collected_data = response["collected_data"]
+        if not isinstance(collected_data, dict):
+            return False, "collected_data must be an object"
+        if strict:
+            unknown = [key for key in collected_data if key not in COLLECTED_DATA_FIELDS]
+            if unknown:
+                return False, f"Unknown collected_data fields: {', '.join(unknown)}"
+            if not all(isinstance(value, str) for value in collected_data.values()):
+                return False, "collected_data values must be strings"
+        elif not all(value is None or isinstance(value, str) for value in collected_data.values()):
+            return False, "collected_data values must be strings or null"
         
-        # Music Logic
-        is_valid, message = AdValidator.validate_music_logic(
-            ad_data.get('objective', ''),
-            ad_data.get('music_option', ''),
-            ad_data.get('music_id')
-        )
-        if not is_valid:
-            errors['music_logic'] = message
+        if not isinstance(response["next_step"], str) or response["next_step"].lower() not in NEXT_STEPS:
+            return False, f"next_step must be one of: {', '.join(NEXT_STEPS)}"
         
-        return len(errors) == 0, errors
+        return True, "Valid turn"
+
+
+def _check_key(key: str, ad_data: Dict, valid_message: str) -> Tuple[bool, str]:
+    """Run the RULES for one error key against a partial ad"""
+    is_valid, errors = validate_key[key](ad_data)
+    return (True, valid_message) if is_valid else (False, errors[key])
+
+
+def _text_column(values: Sequence[Optional[str]]) -> List[str]:
+    return [value or "" for value in values]
+
+
+def _validate_columns(columns: Dict[str, Sequence[Optional[str]]]) -> Dict[str, bytes]:
+    values = {}
+    for field, spec in FIELDS.items():
+        column = _text_column(columns[field])
+        values[field] = [value.upper() for value in column] if spec.get("upper") else column
+
+    codes = {}
+    for key, group in group_rules().items():
+        key_codes = None
+        for code, rule in enumerate(group, start=1):
+            failed = _rule_failures(rule, values)
+            if key_codes is None:
+                key_codes = [code if is_failed else 0 for is_failed in failed]
+            else:
+                key_codes = [current or (code if is_failed else 0) for current, is_failed in zip(key_codes, failed)]
+        codes[key] = bytes(key_codes)
+    return codes
+
+
+def _rule_failures(rule: Dict, values: Dict[str, List[str]]) -> List[bool]:
+    column = values[rule["field"]]
+    check = rule["check"]
+    if check == "required":
+        failed = [not value for value in column]
+    elif check == "min_length":
+        minimum = rule["value"]
+        failed = [len(value.strip()) < minimum for value in column]
+    elif check == "max_length":
+        maximum = rule["value"]
+        failed = [len(value) > maximum for value in column]
+    else:
+        allowed = frozenset(rule["value"])
+        if check == "one_of":
+            failed = [value not in allowed for value in column]
+        else:
+            failed = [value in allowed for value in column]
+    if "when" in rule:
+        field, expected = rule["when"]
+        failed = [is_failed and value == expected for is_failed, value in zip(failed, values[field])]
+    return failed
+
+
+def _upper_numpy(values: "np.ndarray") -> "np.ndarray":
+    """str.upper over a unicode array: ASCII arithmetic on the code points,
+    np.char.upper only for rows with non-ASCII characters"""
+    width = values.dtype.itemsize // 4
+    if width == 0:
+        return values
+    codes = np.ascontiguousarray(values).view(np.uint32).reshape(len(values), width)
+    lowercase = (codes >= 97) & (codes <= 122)
+    upper = (codes - 32 * lowercase.astype(np.uint32)).view(values.dtype).reshape(len(values))
+    non_ascii = (codes > 127).any(axis=1)
+    if non_ascii.any():
+        upper[non_ascii] = np.char.upper(values[non_ascii])
+    return upper
+
+
+def _validate_columns_numpy(columns: Dict[str, Sequence[Optional[str]]]) -> Dict[str, "np.ndarray"]:
+    values = {}
+    for field, spec in FIELDS.items():
+        column = columns[field]
+        if not (isinstance(column, np.ndarray) and column.dtype.kind == "U"):
+            column = np.array(_text_column(column), dtype=str)
+        values[field] = _upper_numpy(column) if spec.get("upper") else column
+    lengths = {}
+
+    def length(field: str) -> "np.ndarray":
+        if field not in lengths:
+            lengths[field] = np.char.str_len(values[field])
+        return lengths[field]
+
+    codes = {}
+    for key, group in group_rules().items():
+        key_codes = np.zeros(len(values["campaign_name"]), dtype=np.uint8)
+        for code, rule in enumerate(group, start=1):
+            field = rule["field"]
+            check = rule["check"]
+            if check == "required":
+                failed = length(field) == 0
+            elif check == "min_length":
+                failed = np.char.str_len(np.char.strip(values[field])) < rule["value"]
+            elif check == "max_length":
+                failed = length(field) > rule["value"]
+            else:
+                failed = np.isin(values[field], list(rule["value"]))
+                if check == "one_of":
+                    failed = ~failed
+            if "when" in rule:
+                when_field, expected = rule["when"]
+                failed &= values[when_field] == expected
+            key_codes[(key_codes == 0) & failed] = code
+        codes[key] = key_codes
+    return codes